@@ -0,0 +1,13 @@
+"""
+Benchmarks for randsik.
+
+Run them with::
+
+    python -m benchmarks                       # run everything
+    python -m benchmarks --quick               # only the small sizes
+    python -m benchmarks --save baseline.json  # store the results as a baseline
+    python -m benchmarks --compare baseline.json --threshold 0.25
+
+With `--compare` the command exits with status 1 when a benchmark got slower (or
+used more memory) than the baseline by more than the threshold.
+"""
@@ -0,0 +1,50 @@
+import argparse
+import sys
+
+from benchmarks import cases, runner
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('-k', dest='match', help='only run cases with this in their name')
+    parser.add_argument('--sizes', help='comma separated sizes in measures to run')
+    parser.add_argument('--quick', action='store_true', help='only run the small sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timing repeats')
+    parser.add_argument('--save', metavar='PATH', help='store the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='baseline to compare against')
+    parser.add_argument(
+        '--threshold', type=float, default=0.25,
+        help='allowed slowdown before failing, e.g. 0.25 for 25%%',
+    )
+    parser.add_argument(
+        '--memory-threshold', type=float, default=None,
+        help='allowed increase of peak memory, defaults to --threshold',
+    )
+    args = parser.parse_args(argv)
+
+    sizes = None
+    if args.sizes:
+        sizes = tuple(int(size) for size in args.sizes.split(','))
+    elif args.quick:
+        sizes = cases.QUICK_SIZES
+
+    results = runner.run(sizes=sizes, repeat=args.repeat, match=args.match)
+
+    if args.save:
+        runner.save(results, args.save)
+
+    if args.compare:
+        regressions = runner.compare(
+            results, runner.load(args.compare), args.threshold, args.memory_threshold
+        )
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            return 1
+        print('No regressions')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+The benchmark cases.
+
+Every case is a function that takes a size (a number of measures) and returns the
+callable that is timed, so that setting up the inputs is not part of the timing.
+"""
+import io
+import random
+import subprocess
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from mido import MidiFile
+
+from randsik import constants as const
+from randsik import generate
+from randsik import scales
+from randsik.randsik import get_mode_midi_notes
+from randsik.song_builder.drums import default_library, drums
+from randsik.song_builder.song import SongSection, create_song
+
+# Sizes in measures every case is run with, unless the case says otherwise
+SIZES = (1, 10, 100, 1000, 10000)
+
+# Sizes used with --quick
+QUICK_SIZES = (1, 10, 100)
+
+# Instruments used for the songs, every one of them gets its own track
+SONG_INSTRUMENTS = (
+    const.Piano.ACOUSTIC_GRAND_PIANO,
+    const.Bass.ACOUSTIC_BASS,
+    const.Guitar.ELECTRIC_GUITAR_CLEAN,
+    const.Strings.VIOLIN,
+    const.Organ.DRAWBAR_ORGAN,
+    const.Brass.TRUMPET,
+    const.Reed.ALTO_SAX,
+    const.Pipe.FLUTE,
+)
+SONG_SECTIONS = 4
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    setup: Callable[[int], Callable[[], object]]
+    sizes: tuple[int, ...] = SIZES
+
+
+CASES = []
+
+
+def case(name: str, sizes: tuple[int, ...] = SIZES):
+    """
+    Registers a benchmark case
+    """
+    def register(setup):
+        CASES.append(Case(name, setup, sizes))
+        return setup
+
+    return register
+
+
+def song_sections(measures: int) -> list[SongSection]:
+    """
+    Returns sections adding up to `measures` measures, every section leaving out a
+    different instrument
+    """
+    per_section = max(1, measures // SONG_SECTIONS)
+
+    return [
+        SongSection(
+            measures=per_section, mode='dorian', tempo=120, key='C3', octaves=2,
+            instruments=SONG_INSTRUMENTS[:idx] + SONG_INSTRUMENTS[idx + 1:],
+        )
+        for idx in range(SONG_SECTIONS)
+    ]
+
+
+def _generate_case(mode: str) -> None:
+    @case(f'generate[{mode}]')
+    def setup(measures):
+        return lambda: generate('C4', mode=mode, measures=measures, seed=1)
+
+
+for _mode in (scales.CHROMATIC,) + scales.SCALES.modes:
+    _generate_case(_mode)
+
+
+@case('build_midi_track')
+def build_midi_track(measures):
+    pattern = generate('C4', mode='ionian', measures=measures, seed=1)
+
+    def run():
+        pattern._track = None
+        return pattern.track
+
+    return run
+
+
+@case('get_mode_midi_notes', sizes=(1,))
+def mode_midi_notes(_):
+    modes = (scales.CHROMATIC,) + scales.SCALES.modes
+
+    def run():
+        for mode in modes:
+            for start_note in range(scales.LOWEST_NOTE, const.MIDI_NOTES):
+                get_mode_midi_notes(mode, start_note)
+
+    return run
+
+
+@case('create_song')
+def song(measures):
+    sections = song_sections(measures)
+    default_library()
+
+    return lambda: create_song(sections, seed=1)
+
+
+@case('drums')
+def drum_track(measures):
+    default_library()
+
+    return lambda: drums(measures, rng=random.Random(1))
+
+
+@case('midifile_save')
+def midifile_save(measures):
+    midi_file = MidiFile()
+    midi_file.tracks.append(generate('C4', mode='ionian', measures=measures, seed=1).track)
+
+    return lambda: midi_file.save(file=io.BytesIO())
+
+
+@case('create_song_save')
+def song_save(measures):
+    midi_file = create_song(song_sections(measures), seed=1)
+
+    return lambda: midi_file.save(file=io.BytesIO())
+
+
+@case('import_randsik', sizes=(1,))
+def import_randsik(_):
+    command = [sys.executable, '-c', 'import randsik']
+
+    return lambda: subprocess.run(command, check=True)
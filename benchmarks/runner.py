@@ -0,0 +1,170 @@
+"""
+Runs benchmark cases and compares their results against a stored baseline.
+"""
+import gc
+import json
+import platform
+import time
+import tracemalloc
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+
+import randsik
+from benchmarks.cases import CASES, Case
+
+# Every case is timed for at least this many seconds per repeat
+MIN_TIME = 0.2
+
+
+@dataclass
+class Result:
+    name: str
+    size: int
+    time: float
+    mean: float
+    runs: int
+    peak_memory: int
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}/{self.size}'
+
+
+@dataclass
+class Regression:
+    key: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float('inf')
+
+    def __str__(self) -> str:
+        return (
+            f'{self.key}: {self.metric} {self.baseline:.6g} -> {self.current:.6g} '
+            f'({self.ratio:.2f}x)'
+        )
+
+
+def measure(case: Case, size: int, repeat: int = 3) -> Result:
+    """
+    Times a case at one size and records the peak memory it allocates.
+
+    The callable is run enough times to take at least `MIN_TIME` seconds and this
+    is repeated `repeat` times. The fastest run is the time of the case.
+    """
+    func = case.setup(size)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = []
+    runs = 0
+    for _ in range(repeat):
+        number = 0
+        began = time.perf_counter()
+        elapsed = 0.0
+        while not number or elapsed < MIN_TIME:
+            func()
+            number += 1
+            elapsed = time.perf_counter() - began
+        times.append(elapsed / number)
+        runs += number
+
+    return Result(case.name, size, min(times), sum(times) / len(times), runs, peak_memory)
+
+
+def run(
+        cases: Iterable[Case] = CASES,
+        sizes: Iterable[int] = None,
+        repeat: int = 3,
+        match: str = None,
+        report=print,
+) -> list[Result]:
+    """
+    Runs the cases at every size they support
+
+    :param cases: cases to run
+    :param sizes: only run these sizes
+    :param repeat: number of times every case is timed
+    :param match: only run cases with this string in their name
+    :param report: called with a line of text for every result
+    """
+    results = []
+    for case in cases:
+        if match and match not in case.name:
+            continue
+        for size in case.sizes:
+            if sizes is not None and size not in sizes and len(case.sizes) > 1:
+                continue
+            result = measure(case, size, repeat)
+            results.append(result)
+            if report:
+                report(
+                    f'{result.key:<32} {result.time * 1000:>12.3f} ms '
+                    f'{result.peak_memory / 1024:>12.1f} KiB'
+                )
+
+    return results
+
+
+def save(results: Iterable[Result], path: str) -> None:
+    """
+    Stores results as a JSON baseline
+    """
+    data = {
+        'meta': {
+            'randsik': randsik.__version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+        },
+        'results': {result.key: asdict(result) for result in results},
+    }
+    with open(path, 'w') as fp:
+        json.dump(data, fp, indent=2, sort_keys=True)
+
+
+def load(path: str) -> dict[str, dict]:
+    """
+    Returns the results of a stored baseline by key
+    """
+    with open(path) as fp:
+        return json.load(fp)['results']
+
+
+def compare(
+        results: Iterable[Result],
+        baseline: dict[str, dict],
+        threshold: float = 0.25,
+        memory_threshold: float = None,
+) -> list[Regression]:
+    """
+    Returns the results that are worse than the baseline by more than the threshold.
+    Results without a baseline are skipped.
+
+    :param results: results of the current run
+    :param baseline: stored results, see `load`
+    :param threshold: allowed slowdown, 0.25 allows results to be 25% slower
+    :param memory_threshold: allowed increase of the peak memory, defaults to `threshold`
+    """
+    if memory_threshold is None:
+        memory_threshold = threshold
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.key)
+        if previous is None:
+            continue
+        if result.time > previous['time'] * (1 + threshold):
+            regressions.append(Regression(result.key, 'time', previous['time'], result.time))
+        if result.peak_memory > previous['peak_memory'] * (1 + memory_threshold):
+            regressions.append(Regression(
+                result.key, 'peak_memory', previous['peak_memory'], result.peak_memory
+            ))
+
+    return regressions
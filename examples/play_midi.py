@@ -1,14 +1,17 @@
 import sys
-import time
-import json
 
-import randsik
 import mido
 
+from randsik.player import Player
+
 
 def main():
     """
-    Play a random set of notes
+    Play a random set of notes.
+
+    The config file is a JSON file with the arguments to `randsik.generate` in the
+    "generate" key. It can be edited while playing; changes are picked up for the
+    next pattern.
     """
     if len(sys.argv[1]) > 1:
         config_file = sys.argv[1]
@@ -29,19 +32,16 @@ def main():
         sys.exit(1)
     print('Playing... (Ctrl-C to exit)')
 
+    player = None
     try:
         with mido.open_output(portname, autoreset=True) as port:
-            while True:
-                with open(sys.argv[1]) as f:
-                    config = json.loads(f.read())
-                    pat = randsik.generate(**config['generate'])
-                    for msg in pat.track:
-                        if isinstance(msg, mido.Message):
-                            port.send(msg)
-                            time.sleep(config['tempo'])
+            player = Player.from_config(port, config_file)
+            player.play()
 
     except KeyboardInterrupt:
-        pass
+        if player is not None:
+            player.stop()
+            print(player.stats)
 
 
 if __name__ == '__main__':
@@ -6,6 +6,13 @@ from .constants import MIDI_NOTES, WHOLE, HALF, QUARTER, EIGHTH, SIXTEENTH, THIR
 from .randsik import (  # noqa
     Note,
     Rest,
+    NoteData,
+    NoteView,
     Pattern,
     generate,
+    generate_batch,
+    generate_stream,
 )
+from .engine import Engine, Markov, Weighted  # noqa
+from .profiling import profile, stats  # noqa
+from .scales import register_mode  # noqa
@@ -0,0 +1,5 @@
+import sys
+
+from randsik.cli import main
+
+sys.exit(main())
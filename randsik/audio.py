@@ -0,0 +1,400 @@
+"""
+Renders patterns and songs to WAV files for a quick listen.
+
+This is a preview renderer, not a synthesizer: every instrument family gets a
+simple oscillator and envelope (a plucked triangle for pianos, a saw for strings, a
+soft square for organs, noise for drums on channel 9, ...). Oscillators and
+envelopes are computed with NumPy for all notes sounding in a chunk of samples at
+once, and the audio is written one chunk at a time, so even very long songs are
+rendered with bounded memory.
+
+NumPy is an optional dependency (``pip install randsik[audio]``)::
+
+    from randsik.audio import render
+
+    render(randsik.generate('C4', measures=4), 'pattern.wav')
+    render(create_song(sections), 'song.wav')
+"""
+import functools
+import os
+import wave
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, BinaryIO, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from randsik import constants as const
+from randsik.randsik import NoteData, Pattern, pulses_to_seconds
+
+if TYPE_CHECKING:
+    from mido import MidiFile
+
+SAMPLE_RATE = 22050
+
+# Number of samples rendered and written at a time
+CHUNK_SIZE = 1 << 15
+
+# Headroom so a handful of overlapping notes do not clip before the soft clipper
+GAIN = 0.25
+
+
+@dataclass(frozen=True)
+class Voice:
+    """
+    Oscillator and ADSR envelope (times in seconds, sustain as a level 0..1)
+    """
+    wave: str
+    attack: float = 0.005
+    decay: float = 0.1
+    sustain: float = 0.7
+    release: float = 0.05
+
+
+DEFAULT_VOICE = Voice('sine')
+
+DRUM_VOICE = Voice('noise', attack=0.001, decay=0.12, sustain=0.0, release=0.02)
+
+# Voices by the name of the instrument family
+VOICES = {
+    'Piano': Voice('triangle', decay=0.6, sustain=0.2, release=0.2),
+    'ChromaticPercussion': Voice('sine', attack=0.001, decay=0.5, sustain=0.0, release=0.2),
+    'Organ': Voice('square', attack=0.01, decay=0.05, sustain=0.9, release=0.05),
+    'Guitar': Voice('saw', attack=0.002, decay=0.4, sustain=0.3, release=0.1),
+    'Bass': Voice('triangle', attack=0.005, decay=0.2, sustain=0.6, release=0.05),
+    'Strings': Voice('saw', attack=0.08, decay=0.2, sustain=0.8, release=0.2),
+    'Ensemble': Voice('saw', attack=0.1, decay=0.2, sustain=0.8, release=0.3),
+    'Brass': Voice('saw', attack=0.03, decay=0.1, sustain=0.8, release=0.1),
+    'Reed': Voice('square', attack=0.02, decay=0.1, sustain=0.8, release=0.08),
+    'Pipe': Voice('sine', attack=0.03, decay=0.1, sustain=0.9, release=0.1),
+    'SynthLead': Voice('square', attack=0.005, decay=0.1, sustain=0.8, release=0.05),
+    'SynthPad': Voice('triangle', attack=0.3, decay=0.3, sustain=0.8, release=0.5),
+    'SynthEffects': Voice('saw', attack=0.1, decay=0.3, sustain=0.6, release=0.4),
+    'Ethnic': Voice('triangle', attack=0.002, decay=0.4, sustain=0.2, release=0.15),
+    'Percussive': Voice('noise', attack=0.001, decay=0.2, sustain=0.0, release=0.05),
+    'SoundEffects': Voice('noise', attack=0.05, decay=0.3, sustain=0.5, release=0.3),
+}
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise RuntimeError('Rendering audio requires the "numpy" package')
+
+
+def voice(program: int, channel: int = 0) -> Voice:
+    """
+    Returns the voice of a program number (1-128) on `channel`
+    """
+    if channel == const.DRUM_CHANNEL:
+        return DRUM_VOICE
+    instrument = const.INT_TO_INSTRUMENT.get(program)
+    if instrument is None:
+        return DEFAULT_VOICE
+
+    return VOICES.get(type(instrument).__name__, DEFAULT_VOICE)
+
+
+class Notes:
+    """
+    The notes of a pattern or song as arrays sorted by start time
+    """
+
+    def __init__(
+            self, start, end, pitch, velocity, voices: list[Voice], voice_idx,
+            length: float = 0.0,
+    ) -> None:
+        """
+        :param length: minimum length in seconds, e.g. to keep a trailing rest
+        """
+        order = np.argsort(start, kind='stable')
+        self.start = np.asarray(start, dtype=np.float64)[order]
+        self.end = np.asarray(end, dtype=np.float64)[order]
+        self.pitch = np.asarray(pitch, dtype=np.float64)[order]
+        self.velocity = np.asarray(velocity, dtype=np.float64)[order]
+        self.voices = voices
+        self.voice_idx = np.asarray(voice_idx, dtype=np.intp)[order]
+        release = np.array([v.release for v in voices] or [0.0])
+        self.stop = self.end + release[self.voice_idx]
+        self.length = length
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @property
+    def seconds(self) -> float:
+        """Length in seconds, including the release of the last note"""
+        return max(float(self.stop.max()) if len(self) else 0.0, self.length)
+
+    @classmethod
+    def from_pattern(cls, pattern: Pattern) -> 'Notes':
+        """
+        Reads the notes of a pattern straight from its note data. The rest after the
+        last note is kept as silence.
+        """
+        notes = pattern.notes
+        if not isinstance(notes, NoteData):
+            notes = notes.materialize()
+
+        duration = np.frombuffer(notes.duration, dtype=notes.duration.typecode)
+        rest = np.frombuffer(notes.rest, dtype=notes.rest.typecode)
+        end_ticks = np.cumsum(rest + duration, dtype=np.int64)
+        channel = np.frombuffer(notes.channel, dtype=np.uint8)
+        voices = [voice(int(pattern.program), pattern.channel), DRUM_VOICE]
+
+        return cls(
+            start=pulses_to_seconds(end_ticks - duration, pattern.tempo),
+            end=pulses_to_seconds(end_ticks, pattern.tempo),
+            pitch=np.frombuffer(notes.pitch, dtype=np.uint8),
+            velocity=np.frombuffer(notes.velocity, dtype=np.uint8),
+            voices=voices,
+            voice_idx=(channel == const.DRUM_CHANNEL).astype(np.intp),
+            length=pulses_to_seconds(notes.ticks, pattern.tempo),
+        )
+
+    @classmethod
+    def from_midi_file(cls, midi_file: 'MidiFile') -> 'Notes':
+        """
+        Reads the notes of all tracks of a MIDI file (e.g. the result of `create_song`),
+        following the tempo changes of every track
+        """
+        tempos = {0: const.DEFAULT_TEMPO}
+        starts, ends, pitches, velocities, programs, channels = [], [], [], [], [], []
+
+        for track in midi_file.tracks:
+            tick = 0
+            program = {}
+            held = {}
+            for msg in track:
+                tick += msg.time
+                kind = msg.type
+                if kind == 'set_tempo':
+                    tempos[tick] = msg.tempo
+                elif kind == 'program_change':
+                    program[msg.channel] = msg.program + 1
+                elif kind == 'note_on' and msg.velocity:
+                    held.setdefault((msg.channel, msg.note), []).append((tick, msg.velocity))
+                elif kind in ('note_on', 'note_off'):
+                    started = held.get((msg.channel, msg.note))
+                    if started:
+                        start, velocity = started.pop(0)
+                        starts.append(start)
+                        ends.append(tick)
+                        pitches.append(msg.note)
+                        velocities.append(velocity)
+                        programs.append(program.get(msg.channel, 1))
+                        channels.append(msg.channel)
+
+        seconds = _tempo_map(tempos, midi_file.ticks_per_beat)
+        voices = {}
+        voice_idx = [
+            voices.setdefault(voice(prog, chan), len(voices))
+            for prog, chan in zip(programs, channels)
+        ]
+
+        return cls(
+            start=seconds(np.array(starts, dtype=np.int64)),
+            end=seconds(np.array(ends, dtype=np.int64)),
+            pitch=pitches,
+            velocity=velocities,
+            voices=list(voices),
+            voice_idx=voice_idx,
+        )
+
+
+def _tempo_map(tempos: dict, ticks_per_beat: int):
+    """
+    Returns a function converting an array of ticks to seconds following `tempos`
+    (tick -> microseconds per beat)
+    """
+    ticks = np.array(sorted(tempos), dtype=np.int64)
+    rates = np.array([tempos[tick] for tick in ticks], dtype=np.float64) / 1e6 / ticks_per_beat
+    offsets = np.concatenate(([0.0], np.cumsum(np.diff(ticks) * rates[:-1])))
+
+    def seconds(values):
+        idx = np.searchsorted(ticks, values, side='right') - 1
+        return offsets[idx] + (values - ticks[idx]) * rates[idx]
+
+    return seconds
+
+
+def oscillator(kind: str, phase, seed: int = 0):
+    """
+    Returns the samples of a waveform for `phase` given in cycles
+    """
+    if kind == 'sine':
+        return np.sin(2 * np.pi * phase)
+    frac = phase - np.floor(phase)
+    if kind == 'triangle':
+        return 4 * np.abs(frac - 0.5) - 1
+    if kind == 'saw':
+        return 2 * frac - 1
+    if kind == 'square':
+        return np.where(frac < 0.5, 0.5, -0.5)
+    if kind == 'noise':
+        return np.random.default_rng(seed).uniform(-1, 1, len(phase))
+
+    raise ValueError(f'Unknown waveform "{kind}"')
+
+
+def envelope(v: Voice, t, length: float):
+    """
+    Returns the ADSR envelope at times `t` (seconds since the start of a note that is
+    released after `length` seconds)
+    """
+    return _adsr(v.attack, v.decay, v.sustain, v.release, t, length)
+
+
+def _adsr(attack, decay, sustain, release, t, length):
+    """
+    ADSR envelope where every parameter can be an array with one value per sample
+    """
+    held_t = np.minimum(t, length)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rising = np.where(attack > 0, held_t / attack, 1.0)
+        falling = np.where(decay > 0, 1 - (1 - sustain) * (held_t - attack) / decay, sustain)
+        fade = np.where(release > 0, 1 - (t - length) / release, np.where(t < length, 1.0, 0.0))
+    held = np.where(
+        held_t < attack, rising, np.where(held_t < attack + decay, falling, sustain)
+    )
+
+    return held * np.clip(fade, 0.0, 1.0)
+
+
+def render_chunks(notes: Notes, sample_rate: int = SAMPLE_RATE, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields the audio of `notes` in chunks of `chunk_size` float samples (-1..1)
+    """
+    _require_numpy()
+    total = int(np.ceil(notes.seconds * sample_rate))
+    start = np.floor(notes.start * sample_rate).astype(np.int64)
+    stop = np.ceil(notes.stop * sample_rate).astype(np.int64)
+    freq = 440.0 * 2 ** ((notes.pitch - 69) / 12)
+    gain = notes.velocity / 127 * GAIN
+    length = notes.end - notes.start
+
+    # Voice parameters per note, so envelopes of all notes are computed together
+    voices = notes.voices or [DEFAULT_VOICE]
+    params = {
+        name: np.array([getattr(v, name) for v in voices])[notes.voice_idx]
+        for name in ('attack', 'decay', 'sustain', 'release')
+    }
+    waves = np.array([v.wave for v in voices])[notes.voice_idx]
+    active = np.empty(0, dtype=np.intp)
+    added = 0
+
+    for begin in range(0, total, chunk_size):
+        end = min(begin + chunk_size, total)
+        buffer = np.zeros(end - begin)
+
+        # Notes are sorted by start: add the ones starting in this chunk and drop the
+        # ones that are over
+        upto = int(np.searchsorted(start, end, side='left'))
+        active = np.concatenate((active[stop[active] > begin], np.arange(added, upto)))
+        added = upto
+
+        first = np.maximum(start[active], begin)
+        counts = np.maximum(np.minimum(stop[active], end) - first, 0)
+        if counts.sum():
+            # One entry per sample of every sounding note: the note it belongs to and
+            # its position in the chunk
+            owner = np.repeat(active, counts)
+            offsets = np.cumsum(counts) - counts
+            pos = np.arange(counts.sum()) - np.repeat(offsets, counts) + np.repeat(first, counts)
+            t = (pos - start[owner]) / sample_rate
+
+            samples = np.empty(len(t))
+            kinds = waves[owner]
+            for kind in np.unique(kinds):
+                mask = kinds == kind
+                samples[mask] = oscillator(kind, freq[owner[mask]] * t[mask], seed=begin)
+            samples *= _adsr(
+                *(params[name][owner] for name in ('attack', 'decay', 'sustain', 'release')),
+                t, length[owner],
+            ) * gain[owner]
+            buffer += np.bincount(pos - begin, weights=samples, minlength=len(buffer))
+
+        yield np.tanh(buffer)
+
+
+def render_array(
+        source: Union[Pattern, 'MidiFile'], sample_rate: int = SAMPLE_RATE
+):
+    """
+    Returns the whole rendering of a pattern or MIDI file as one float array
+    """
+    _require_numpy()
+    chunks = list(render_chunks(_notes(source), sample_rate))
+
+    return np.concatenate(chunks) if chunks else np.zeros(0)
+
+
+def render(
+        source: Union[Pattern, 'MidiFile'],
+        file: Union[str, os.PathLike, BinaryIO],
+        sample_rate: int = SAMPLE_RATE,
+        chunk_size: int = CHUNK_SIZE,
+) -> float:
+    """
+    Renders a pattern or MIDI file to a 16 bit mono WAV file, one chunk at a time
+
+    :param source: `Pattern` or `mido.MidiFile` (e.g. from `create_song`)
+    :param file: file name or file object opened in binary mode
+    :param sample_rate: samples per second
+    :param chunk_size: number of samples rendered at a time
+
+    :return: length of the audio in seconds
+    """
+    _require_numpy()
+    notes = _notes(source)
+    samples = 0
+
+    with wave.open(os.fspath(file) if not hasattr(file, 'write') else file, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        for chunk in render_chunks(notes, sample_rate, chunk_size):
+            out.writeframes((chunk * 32767).astype('<i2').tobytes())
+            samples += len(chunk)
+
+    return samples / sample_rate
+
+
+def _render_to(item: tuple, sample_rate: int) -> float:
+    source, file = item
+
+    return render(source, file, sample_rate)
+
+
+def render_many(
+        items: Iterable[tuple[Union[Pattern, 'MidiFile'], Union[str, os.PathLike]]],
+        workers: int = None,
+        sample_rate: int = SAMPLE_RATE,
+) -> list[float]:
+    """
+    Renders (source, file name) pairs in a process pool
+
+    :param workers: number of processes, defaults to the number of CPUs. With 1 the
+                    files are rendered in this process.
+
+    :return: length in seconds of every file
+    """
+    _require_numpy()
+    render_item = functools.partial(_render_to, sample_rate=sample_rate)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        return [render_item(item) for item in items]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_item, items, chunksize=8))
+
+
+def _notes(source: Union[Pattern, 'MidiFile']) -> Notes:
+    if isinstance(source, Pattern):
+        return Notes.from_pattern(source)
+
+    return Notes.from_midi_file(source)
@@ -0,0 +1,287 @@
+"""
+Generates large numbers of MIDI files in parallel.
+
+A batch is described by a spec, either the keyword arguments of `randsik.generate`
+or a list of song sections::
+
+    {"generate": {"note": "C4", "mode": "dorian", "measures": 8}}
+
+    {"song": [{"measures": 4, "mode": "dorian", "tempo": 92, "key": "D3",
+               "octaves": 1, "instruments": ["Bass.SYNTH_BASS_1", 89]}]}
+
+Every item of the batch gets its own seed derived from the batch seed and the index
+of the item, so an item is the same no matter how many processes generate it or on
+which shard it ends up. Items are written to a directory, or straight into a zip or
+tar archive to avoid creating a file per item.
+"""
+import functools
+import io
+import json
+import os
+import pathlib
+import tarfile
+import time
+import zipfile
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Union
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+from randsik import constants as const
+from randsik.randsik import generate
+from randsik.rng import derive_seed
+from randsik.song_builder.song import SongSection, song_to_bytes
+from randsik.utils import chunked
+
+# Number of items every task of the process pool renders
+CHUNK_SIZE = 64
+
+# Seconds between two progress reports
+REPORT_INTERVAL = 5.0
+
+# tarfile modes by file extension
+TAR_MODES = {
+    '.tar': 'w',
+    '.tar.gz': 'w:gz',
+    '.tgz': 'w:gz',
+    '.tar.bz2': 'w:bz2',
+    '.tar.xz': 'w:xz',
+}
+
+
+@dataclass
+class BatchResult:
+    items: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.items} files, {self.bytes / 1e6:.2f} MB in {self.seconds:.2f}s '
+            f'({self.items_per_second:.1f} files/s, {self.bytes_per_second / 1e6:.2f} MB/s)'
+        )
+
+
+def load_spec(path: Union[str, os.PathLike]) -> dict:
+    """
+    Reads a spec from a JSON or TOML file (by extension)
+    """
+    path = pathlib.Path(path)
+
+    if path.suffix == '.toml':
+        if tomllib is None:
+            raise RuntimeError('Reading TOML specs requires Python 3.11 or the "tomli" package')
+        with open(path, 'rb') as fp:
+            spec = tomllib.load(fp)
+    else:
+        with open(path) as fp:
+            spec = json.load(fp)
+
+    validate_spec(spec)
+
+    return spec
+
+
+def validate_spec(spec: Mapping) -> None:
+    """
+    Checks that the spec either holds "generate" arguments or "song" sections
+    """
+    if ('generate' in spec) == ('song' in spec):
+        raise ValueError('A spec needs either a "generate" or a "song" key')
+    if 'song' in spec:
+        song_sections(spec['song'])
+
+
+def get_instrument(value: Union[int, str]) -> const.Instrument:
+    """
+    Returns an instrument given its program number or its name ("Bass.SYNTH_BASS_1")
+    """
+    if isinstance(value, int):
+        if value not in const.INT_TO_INSTRUMENT:
+            raise ValueError(f'Unknown instrument program {value}')
+        return const.INT_TO_INSTRUMENT[value]
+
+    family, _, name = value.rpartition('.')
+    for group in const.ALL_INSTRUMENTS:
+        if (not family or group.__name__ == family) and name in group.__members__:
+            return group[name]
+
+    raise ValueError(f'Unknown instrument "{value}"')
+
+
+def song_sections(sections: Iterable[Mapping]) -> tuple[SongSection, ...]:
+    """
+    Creates `SongSection` objects from the sections of a spec
+    """
+    return tuple(
+        SongSection(**{
+            **section,
+            'instruments': tuple(get_instrument(inst) for inst in section['instruments']),
+        })
+        for section in sections
+    )
+
+
+def item_seed(seed, index: int) -> int:
+    """
+    Returns the seed of the item at `index` of a batch
+    """
+    return derive_seed(seed, 'batch', index)
+
+
+def render_item(spec: Mapping, index: int, seed) -> bytes:
+    """
+    Returns the MIDI file of one item of a batch
+    """
+    if 'generate' in spec:
+        return generate(**spec['generate'], seed=item_seed(seed, index)).to_bytes()
+
+    return song_to_bytes(song_sections(spec['song']), seed=item_seed(seed, index))
+
+
+def render_chunk(spec: Mapping, indexes: Sequence[int], seed) -> list[tuple[int, bytes]]:
+    """
+    Renders several items at once. Runs in worker processes.
+    """
+    return [(index, render_item(spec, index, seed)) for index in indexes]
+
+
+def shard_indexes(count: int, shard: int = 0, shards: int = 1) -> range:
+    """
+    Returns the indexes of the items in one shard of a batch of `count` items
+    """
+    if not 0 <= shard < shards:
+        raise ValueError('"shard" must be between 0 and "shards" - 1')
+
+    return range(shard, count, shards)
+
+
+class Output:
+    """
+    Where the files of a batch are written to: a directory, a zip file (".zip") or a
+    tar file (".tar", ".tar.gz", ".tgz", ...)
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]) -> None:
+        self.path = pathlib.Path(path)
+        name = self.path.name
+        tar_mode = next(
+            (mode for suffix, mode in TAR_MODES.items() if name.endswith(suffix)), None
+        )
+
+        if name.endswith('.zip'):
+            self._archive = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED)
+            self._write = self._write_zip
+        elif tar_mode is not None:
+            self._archive = tarfile.open(self.path, tar_mode)
+            self._write = self._write_tar
+        else:
+            self._archive = None
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._write = self._write_file
+
+    def __enter__(self) -> 'Output':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, name: str, data: bytes) -> None:
+        self._write(name, data)
+
+    def close(self) -> None:
+        if self._archive is not None:
+            self._archive.close()
+
+    def _write_file(self, name: str, data: bytes) -> None:
+        with open(self.path / name, 'wb') as fp:
+            fp.write(data)
+
+    def _write_zip(self, name: str, data: bytes) -> None:
+        self._archive.writestr(name, data)
+
+    def _write_tar(self, name: str, data: bytes) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._archive.addfile(info, io.BytesIO(data))
+
+
+def run_batch(
+        spec: Mapping,
+        count: int,
+        output: Union[str, os.PathLike],
+        workers: int = None,
+        seed=0,
+        shard: int = 0,
+        shards: int = 1,
+        chunk_size: int = CHUNK_SIZE,
+        report: Callable[[BatchResult], None] = None,
+) -> BatchResult:
+    """
+    Generates the items of a batch and writes them to `output`
+
+    :param spec: what to generate, see `load_spec`
+    :param count: total number of items in the batch (over all shards)
+    :param output: directory or archive to write to
+    :param workers: number of processes, defaults to the number of CPUs. With 1 the
+                    items are generated in this process.
+    :param seed: batch seed the seed of every item is derived from
+    :param shard: index of the shard to generate
+    :param shards: number of shards the batch is split into
+    :param chunk_size: number of items every task of the process pool renders
+    :param report: called with the progress every `REPORT_INTERVAL` seconds
+
+    :return: number of files and bytes written and the time it took
+    """
+    validate_spec(spec)
+    indexes = shard_indexes(count, shard, shards)
+    width = len(str(max(count - 1, 0)))
+    workers = workers or os.cpu_count() or 1
+    result = BatchResult()
+    began = last_report = time.perf_counter()
+
+    with Output(output) as out:
+        chunks = chunked(indexes, chunk_size)
+        if workers == 1:
+            rendered = (render_chunk(spec, chunk, seed) for chunk in chunks)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            rendered = pool.map(functools.partial(render_chunk, spec, seed=seed), chunks)
+
+        try:
+            for items in rendered:
+                for index, data in items:
+                    out.write(f'{index:0{width}d}.mid', data)
+                    result.items += 1
+                    result.bytes += len(data)
+
+                now = time.perf_counter()
+                result.seconds = now - began
+                if report is not None and now - last_report >= REPORT_INTERVAL:
+                    report(result)
+                    last_report = now
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    result.seconds = time.perf_counter() - began
+
+    return result
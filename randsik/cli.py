@@ -0,0 +1,162 @@
+"""
+The `randsik` command line interface.
+"""
+import argparse
+import asyncio
+import sys
+
+from randsik import batch, server
+from randsik.song_builder import ingest
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Parses a shard given as "index/count", e.g. "0/4"
+    """
+    try:
+        shard, shards = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('shard must look like "0/4"')
+    if not 0 <= shard < shards:
+        raise argparse.ArgumentTypeError('shard index must be between 0 and count - 1')
+
+    return shard, shards
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    spec = batch.load_spec(args.spec)
+    shard, shards = args.shard
+
+    def report(result: batch.BatchResult) -> None:
+        print(result, file=sys.stderr)
+
+    result = batch.run_batch(
+        spec, args.count, args.output, workers=args.workers, seed=args.seed,
+        shard=shard, shards=shards, chunk_size=args.chunk_size,
+        report=None if args.quiet else report,
+    )
+    print(result)
+
+    return 0
+
+
+def run_ingest(args: argparse.Namespace) -> int:
+    def report(file: ingest.SourceFile, reason: str) -> None:
+        print(f'quarantined {file.path}: {reason}', file=sys.stderr)
+
+    result = ingest.ingest(
+        args.source, args.index, workers=args.workers, chunk_size=args.chunk_size,
+        report=None if args.quiet else report,
+    )
+    print(result)
+
+    return 0
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    app = server.Server(
+        workers=args.workers, reservoir_size=args.reservoir_size, hot_after=args.hot_after
+    )
+    where = args.unix or f'{args.host}:{args.port}'
+    print(f'serving on {where}', file=sys.stderr)
+    try:
+        asyncio.run(app.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+def run_load_test(args: argparse.Namespace) -> int:
+    spec = batch.load_spec(args.spec)
+    result = asyncio.run(server.load_test(
+        spec, args.count, concurrency=args.concurrency,
+        host=args.host, port=args.port, path=args.unix,
+    ))
+    print(result)
+
+    return 0
+
+
+def add_address_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--host', default=server.HOST,
+                        help=f'address to listen on or connect to (default: {server.HOST})')
+    parser.add_argument('--port', type=int, default=server.PORT,
+                        help=f'TCP port (default: {server.PORT})')
+    parser.add_argument('--unix', default=None, metavar='PATH',
+                        help='use a Unix socket instead of TCP')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='randsik', description='Generate random music')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = commands.add_parser(
+        'batch', help='generate many MIDI files in parallel',
+        description=batch.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    batch_parser.add_argument('spec', help='JSON or TOML file describing what to generate')
+    batch_parser.add_argument('-n', '--count', type=int, required=True,
+                              help='number of files in the whole batch')
+    batch_parser.add_argument('-o', '--output', required=True,
+                              help='output directory, .zip or .tar(.gz) file')
+    batch_parser.add_argument('-j', '--workers', type=int, default=None,
+                              help='number of processes (default: number of CPUs)')
+    batch_parser.add_argument('--seed', type=int, default=0, help='batch seed (default: 0)')
+    batch_parser.add_argument('--shard', type=parse_shard, default=(0, 1),
+                              help='only generate shard INDEX/COUNT of the batch, e.g. 0/4')
+    batch_parser.add_argument('--chunk-size', type=int, default=batch.CHUNK_SIZE,
+                              help='files generated per task')
+    batch_parser.add_argument('-q', '--quiet', action='store_true',
+                              help='do not report progress')
+    batch_parser.set_defaults(func=run_batch)
+
+    ingest_parser = commands.add_parser(
+        'ingest', help='index a folder of drum loops',
+        description=ingest.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    ingest_parser.add_argument('source', help='folder of drum loops, one sub folder per style')
+    ingest_parser.add_argument('index', help='directory to write the library to')
+    ingest_parser.add_argument('-j', '--workers', type=int, default=None,
+                               help='number of processes (default: number of CPUs)')
+    ingest_parser.add_argument('--chunk-size', type=int, default=ingest.CHUNK_SIZE,
+                               help='files parsed per task')
+    ingest_parser.add_argument('-q', '--quiet', action='store_true',
+                               help='do not list quarantined files')
+    ingest_parser.set_defaults(func=run_ingest)
+
+    serve_parser = commands.add_parser(
+        'serve', help='generate MIDI files for local clients',
+        description=server.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    add_address_arguments(serve_parser)
+    serve_parser.add_argument('-j', '--workers', type=int, default=None,
+                              help='number of processes (default: number of CPUs)')
+    serve_parser.add_argument('--reservoir-size', type=int, default=server.RESERVOIR_SIZE,
+                              help='files kept ready per frequent request, 0 to disable')
+    serve_parser.add_argument('--hot-after', type=int, default=server.HOT_AFTER,
+                              help='requests before files are generated ahead of time')
+    serve_parser.set_defaults(func=run_serve)
+
+    load_test_parser = commands.add_parser(
+        'load-test', help='measure the throughput of a running server',
+    )
+    load_test_parser.add_argument('spec', help='JSON or TOML file describing the request')
+    add_address_arguments(load_test_parser)
+    load_test_parser.add_argument('-n', '--count', type=int, default=1000,
+                                  help='number of requests (default: 1000)')
+    load_test_parser.add_argument('-c', '--concurrency', type=int, default=8,
+                                  help='number of connections (default: 8)')
+    load_test_parser.set_defaults(func=run_load_test)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
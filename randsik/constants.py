@@ -42,6 +42,12 @@ THIRTYSECOND: int = 60
 
 NOTE_LENGTHS = (QUARTER, EIGHTH, SIXTEENTH)
 
+# Tempo used until a track sets one, in microseconds per beat (120 BPM)
+DEFAULT_TEMPO = 500000
+
+# Channel reserved for drums (channel 10 counting from one)
+DRUM_CHANNEL = 9
+
 
 def note_midi_map() -> dict:
     """Generates a list note to midi value mapping"""
@@ -64,7 +70,41 @@ def note_midi_map() -> dict:
     return {x: y for x, y in note_map.items() if 127 >= y >= 0}
 
 
-NOTE_MIDI_MAP = note_midi_map()
+# The output of `note_midi_map()`, written out so it is not computed on import
+NOTE_MIDI_MAP = {
+    "C-1": 0, "B#-1": 0, "C#-1": 1, "Db-1": 1, "D-1": 2, "D#-1": 3, "Eb-1": 3, "E-1": 4, "Fb-1": 4,
+    "F-1": 5, "E#-1": 5, "F#-1": 6, "Gb-1": 6, "G-1": 7, "G#-1": 8, "Ab-1": 8,
+    "A0": 9, "A#0": 10, "Bb0": 10, "B0": 11, "Cb0": 11, "C0": 12, "B#0": 12, "C#0": 13, "Db0": 13,
+    "D0": 14, "D#0": 15, "Eb0": 15, "E0": 16, "Fb0": 16, "F0": 17, "E#0": 17, "F#0": 18, "Gb0": 18,
+    "G0": 19, "G#0": 20, "Ab0": 20,
+    "A1": 21, "A#1": 22, "Bb1": 22, "B1": 23, "Cb1": 23, "C1": 24, "B#1": 24, "C#1": 25, "Db1": 25,
+    "D1": 26, "D#1": 27, "Eb1": 27, "E1": 28, "Fb1": 28, "F1": 29, "E#1": 29, "F#1": 30, "Gb1": 30,
+    "G1": 31, "G#1": 32, "Ab1": 32,
+    "A2": 33, "A#2": 34, "Bb2": 34, "B2": 35, "Cb2": 35, "C2": 36, "B#2": 36, "C#2": 37, "Db2": 37,
+    "D2": 38, "D#2": 39, "Eb2": 39, "E2": 40, "Fb2": 40, "F2": 41, "E#2": 41, "F#2": 42, "Gb2": 42,
+    "G2": 43, "G#2": 44, "Ab2": 44,
+    "A3": 45, "A#3": 46, "Bb3": 46, "B3": 47, "Cb3": 47, "C3": 48, "B#3": 48, "C#3": 49, "Db3": 49,
+    "D3": 50, "D#3": 51, "Eb3": 51, "E3": 52, "Fb3": 52, "F3": 53, "E#3": 53, "F#3": 54, "Gb3": 54,
+    "G3": 55, "G#3": 56, "Ab3": 56,
+    "A4": 57, "A#4": 58, "Bb4": 58, "B4": 59, "Cb4": 59, "C4": 60, "B#4": 60, "C#4": 61, "Db4": 61,
+    "D4": 62, "D#4": 63, "Eb4": 63, "E4": 64, "Fb4": 64, "F4": 65, "E#4": 65, "F#4": 66, "Gb4": 66,
+    "G4": 67, "G#4": 68, "Ab4": 68,
+    "A5": 69, "A#5": 70, "Bb5": 70, "B5": 71, "Cb5": 71, "C5": 72, "B#5": 72, "C#5": 73, "Db5": 73,
+    "D5": 74, "D#5": 75, "Eb5": 75, "E5": 76, "Fb5": 76, "F5": 77, "E#5": 77, "F#5": 78, "Gb5": 78,
+    "G5": 79, "G#5": 80, "Ab5": 80,
+    "A6": 81, "A#6": 82, "Bb6": 82, "B6": 83, "Cb6": 83, "C6": 84, "B#6": 84, "C#6": 85, "Db6": 85,
+    "D6": 86, "D#6": 87, "Eb6": 87, "E6": 88, "Fb6": 88, "F6": 89, "E#6": 89, "F#6": 90, "Gb6": 90,
+    "G6": 91, "G#6": 92, "Ab6": 92,
+    "A7": 93, "A#7": 94, "Bb7": 94, "B7": 95, "Cb7": 95, "C7": 96, "B#7": 96, "C#7": 97, "Db7": 97,
+    "D7": 98, "D#7": 99, "Eb7": 99, "E7": 100, "Fb7": 100, "F7": 101, "E#7": 101, "F#7": 102,
+    "Gb7": 102, "G7": 103, "G#7": 104, "Ab7": 104,
+    "A8": 105, "A#8": 106, "Bb8": 106, "B8": 107, "Cb8": 107, "C8": 108, "B#8": 108, "C#8": 109,
+    "Db8": 109, "D8": 110, "D#8": 111, "Eb8": 111, "E8": 112, "Fb8": 112, "F8": 113, "E#8": 113,
+    "F#8": 114, "Gb8": 114, "G8": 115, "G#8": 116, "Ab8": 116,
+    "A9": 117, "A#9": 118, "Bb9": 118, "B9": 119, "Cb9": 119, "C9": 120, "B#9": 120, "C#9": 121,
+    "Db9": 121, "D9": 122, "D#9": 123, "Eb9": 123, "E9": 124, "Fb9": 124, "F9": 125, "E#9": 125,
+    "F#9": 126, "Gb9": 126, "G9": 127,
+}
 
 
 # Instrument Groups
@@ -0,0 +1,220 @@
+"""
+Weighted and Markov generation of notes and rhythms.
+
+By default `generate` draws every note and note length uniformly. An `Engine` makes
+it draw them from weighted distributions or from first or second order Markov
+chains instead. The states of the distributions are positions in the note
+selection (the notes of the mode, or the scale degrees when given) and positions in
+`note_lengths`.
+
+Every distribution is compiled into alias tables once, when it is created, so every
+draw takes constant time no matter how many states there are. The same engine can
+be reused for any number of patterns::
+
+    engine = Engine(
+        notes=Weighted([4, 1, 2, 3]),
+        rhythm=Markov([[1, 2, 0], [1, 1, 1], [0, 3, 1]]),
+    )
+    pattern = randsik.generate('C4', mode='dorian', scale_degrees=(0, 2, 4, 7), engine=engine)
+"""
+from array import array
+from collections.abc import Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Union
+
+from randsik.rng import RNG, get_rng
+
+if TYPE_CHECKING:
+    from randsik.rhythm import RhythmIndex
+
+
+class AliasTable:
+    """
+    Walker/Vose alias table for drawing from a discrete distribution in O(1)
+    """
+    __slots__ = ("size", "prob", "alias")
+
+    def __init__(self, weights: Sequence[float]) -> None:
+        """
+        :param weights: relative weight of every state, at least one must be positive
+        """
+        weights = [float(weight) for weight in weights]
+        total = sum(weights)
+        if not weights or any(weight < 0 for weight in weights) or total <= 0:
+            raise ValueError('"weights" must be positive numbers with a positive sum')
+
+        size = len(weights)
+        scaled = [weight * size / total for weight in weights]
+        small = [idx for idx, value in enumerate(scaled) if value < 1]
+        large = [idx for idx, value in enumerate(scaled) if value >= 1]
+        prob = [1.0] * size
+        alias = list(range(size))
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] += scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+
+        self.size = size
+        self.prob = array("d", prob)
+        self.alias = array("I", alias)
+
+    def sample(self, rng: RNG) -> int:
+        """
+        Draws a state with a single random number
+        """
+        value = rng.random() * self.size
+        idx = int(value)
+
+        return idx if value - idx < self.prob[idx] else self.alias[idx]
+
+
+class Weighted:
+    """
+    Draws every state independently with fixed weights
+    """
+    order = 0
+
+    def __init__(self, weights: Sequence[float]) -> None:
+        self.table = AliasTable(weights)
+        self.size = self.table.size
+
+    def walk(self, rng: RNG) -> Iterator[int]:
+        """
+        Yields an endless sequence of states
+        """
+        sample = self.table.sample
+        while True:
+            yield sample(rng)
+
+
+class Markov:
+    """
+    Draws every state depending on the one (order 1) or two (order 2) states before it
+    """
+
+    def __init__(
+            self,
+            transitions: Union[Sequence, Mapping],
+            order: int = 1,
+            initial: Sequence[float] = None,
+    ) -> None:
+        """
+        :param transitions: weights of the next state for every context. Either a
+            mapping from the previous state (order 1) or pair of states (order 2) to a
+            row of weights, or a nested sequence: a square matrix for order 1 and a
+            cube for order 2.
+        :param order: number of previous states the next state depends on (1 or 2)
+        :param initial: weights of the first state and of every state whose context
+            has no row of weights, uniform by default
+        """
+        if order not in (1, 2):
+            raise ValueError('"order" must be 1 or 2')
+
+        if isinstance(transitions, Mapping):
+            rows = {
+                key if isinstance(key, tuple) else (key,): row
+                for key, row in transitions.items()
+            }
+        elif order == 1:
+            rows = {(idx,): row for idx, row in enumerate(transitions)}
+        else:
+            rows = {
+                (first, second): row
+                for first, matrix in enumerate(transitions)
+                for second, row in enumerate(matrix)
+            }
+
+        if not rows:
+            raise ValueError('"transitions" must contain at least one row')
+        size = len(next(iter(rows.values())))
+
+        for key, row in rows.items():
+            if len(key) != order or any(not 0 <= state < size for state in key):
+                raise ValueError(f'Invalid transition context {key}')
+            if len(row) != size:
+                raise ValueError('Every row of "transitions" must have the same length')
+
+        self.order = order
+        self.size = size
+        self.tables = {key: AliasTable(row) for key, row in rows.items()}
+        self.initial = AliasTable(initial if initial is not None else [1] * size)
+        if self.initial.size != size:
+            raise ValueError('"initial" must have one weight per state')
+
+    def walk(self, rng: RNG) -> Iterator[int]:
+        """
+        Yields an endless sequence of states
+        """
+        tables, initial, order = self.tables, self.initial, self.order
+        history = ()
+
+        while True:
+            state = tables.get(history, initial).sample(rng)
+            yield state
+            history = (history + (state,))[-order:]
+
+
+Sampler = Union[Weighted, Markov]
+
+
+@dataclass(frozen=True)
+class Engine:
+    """
+    The distributions to draw notes and note lengths from. Either can be left out to
+    draw it uniformly.
+    """
+    notes: Sampler = None
+    rhythm: Sampler = None
+
+    def sample(
+            self,
+            note_selection: Sequence[int],
+            note_lengths: Sequence[int],
+            total_pulses: int,
+            rng: RNG = None,
+            index: "RhythmIndex" = None,
+    ) -> tuple[list[int], list[int]]:
+        """
+        Draws notes until they fill `total_pulses`, trimming the last one to fit.
+        Without a `rhythm` distribution, whole measures are drawn from `index` instead
+        when it can fill them exactly.
+
+        :param index: rhythm index for `note_lengths` and the measure length
+
+        :return: the pitches and durations of the notes
+        """
+        rng = get_rng(rng)
+        notes = self._states(self.notes, len(note_selection), "note selection", rng)
+
+        if self.rhythm is None and index is not None and index.count:
+            measures, extra = divmod(total_pulses, index.ppm)
+            if not extra:
+                durations = index.fill(measures, rng)
+                return [note_selection[next(notes)] for _ in durations], durations
+
+        lengths = self._states(self.rhythm, len(note_lengths), "note_lengths", rng)
+        pitches = []
+        durations = []
+        current_pulses = 0
+        while current_pulses < total_pulses:
+            length = note_lengths[next(lengths)]
+            if length + current_pulses > total_pulses:
+                length = total_pulses - current_pulses
+
+            pitches.append(note_selection[next(notes)])
+            durations.append(length)
+            current_pulses += length
+
+        return pitches, durations
+
+    @staticmethod
+    def _states(sampler: Sampler, size: int, name: str, rng: RNG) -> Iterator[int]:
+        if sampler is None:
+            sampler = Weighted([1] * size)
+        elif sampler.size != size:
+            raise ValueError(f"Distribution has {sampler.size} states but {name} has {size}")
+
+        return sampler.walk(rng)
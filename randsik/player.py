@@ -0,0 +1,248 @@
+"""
+Real-time playback of generated patterns.
+
+The `Player` sends the messages of a stream of patterns to a MIDI output. Every
+message is scheduled against an absolute monotonic clock computed from its tick
+and the tempo of its pattern, so timing errors do not add up over time. While a
+pattern plays, the next one is generated in a background thread.
+
+Any object with a mido style `send(msg)` method can be used as the output, which
+makes it easy to test playback against a fake port.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Union
+
+from mido import Message
+
+from randsik.profiling import LATENCY_SAMPLES, percentile
+from randsik.randsik import Pattern, generate, pulses_to_seconds
+
+
+@dataclass
+class PlaybackStats:
+    """
+    Timing statistics collected while playing. Latency is the time between when a
+    message was scheduled and when it was actually sent.
+    """
+    events: int = 0
+    patterns: int = 0
+    underruns: int = 0
+    max_latency: float = 0.0
+    total_latency: float = 0.0
+    generation_time: float = 0.0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES), repr=False)
+
+    def record(self, latency: float) -> None:
+        self.events += 1
+        self.total_latency += latency
+        self.latencies.append(latency)
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.events if self.events else 0.0
+
+    @property
+    def jitter(self) -> float:
+        """Standard deviation of the recent latencies"""
+        if len(self.latencies) < 2:
+            return 0.0
+        mean = sum(self.latencies) / len(self.latencies)
+
+        return (sum((x - mean) ** 2 for x in self.latencies) / len(self.latencies)) ** 0.5
+
+    def percentile(self, pct: float) -> float:
+        """
+        Returns the given percentile (0-100) of the recent latencies
+        """
+        return percentile(self.latencies, pct)
+
+    def __str__(self) -> str:
+        return (
+            f'patterns={self.patterns} events={self.events} underruns={self.underruns} '
+            f'latency mean={self.mean_latency * 1000:.3f}ms '
+            f'p99={self.percentile(99) * 1000:.3f}ms max={self.max_latency * 1000:.3f}ms '
+            f'jitter={self.jitter * 1000:.3f}ms'
+        )
+
+
+class ConfigWatcher:
+    """
+    Reads a JSON config file and only reloads it when it has changed on disk.
+    When the file can not be parsed (e.g. while it is being written) the last
+    good config is kept.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], loader: Callable = json.load) -> None:
+        self.path = path
+        self.reloads = 0
+        self._loader = loader
+        self._stamp = None
+        self._config = None
+
+    def get(self) -> dict:
+        """
+        Returns the current config
+        """
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        if stamp != self._stamp:
+            try:
+                with open(self.path) as fp:
+                    self._config = self._loader(fp)
+            except ValueError:
+                if self._config is None:
+                    raise
+            else:
+                self.reloads += 1
+            self._stamp = stamp
+
+        return self._config
+
+
+def timed_messages(pattern: Pattern) -> tuple[list[tuple[float, Message]], float]:
+    """
+    Returns the channel messages of a pattern with their offset in seconds from the
+    start of the pattern, and the length of the pattern in seconds
+    """
+    messages = []
+    tick = 0
+
+    for msg in pattern.track:
+        tick += msg.time
+        if not msg.is_meta:
+            messages.append((pulses_to_seconds(tick, pattern.tempo), msg))
+
+    return messages, pulses_to_seconds(tick, pattern.tempo)
+
+
+class Player:
+    """
+    Plays patterns returned by `source` one after another.
+
+    Usage::
+
+        with mido.open_output(name) as port:
+            player = Player(port, lambda: randsik.generate('C3', mode='dorian'))
+            player.play()
+    """
+
+    def __init__(
+            self,
+            port,
+            source: Callable[[], Pattern],
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = None,
+    ) -> None:
+        """
+        :param port: output with a `send(msg)` method (e.g. a mido output port)
+        :param source: called to get the next pattern to play
+        :param clock: monotonic clock returning seconds
+        :param sleep: waits the given number of seconds; by default waiting is
+                      interrupted by `stop`
+        """
+        self.port = port
+        self.source = source
+        self.stats = PlaybackStats()
+        self._clock = clock
+        self._stop = threading.Event()
+        self._sleep = sleep or self._stop.wait
+        self._active = set()
+
+    @classmethod
+    def from_config(cls, port, path: Union[str, os.PathLike], **kwargs) -> 'Player':
+        """
+        Creates a player generating patterns with the `generate` arguments in the
+        "generate" key of a JSON config file. Changes to the file are picked up
+        for the next pattern.
+        """
+        watcher = ConfigWatcher(path)
+
+        return cls(port, lambda: generate(**watcher.get()['generate']), **kwargs)
+
+    def stop(self) -> None:
+        """
+        Stops playback. Can be called from another thread.
+        """
+        self._stop.set()
+
+    def play(self, count: int = None) -> PlaybackStats:
+        """
+        Plays `count` patterns, or until `stop` is called when `count` is None
+
+        :return: the timing statistics of the player
+        """
+        self._stop.clear()
+        played = 0
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            upcoming = executor.submit(self._prepare)
+            start = None
+
+            try:
+                while not self._stop.is_set() and (count is None or played < count):
+                    ready = upcoming.done()
+                    messages, length = upcoming.result()
+                    if count is None or played + 1 < count:
+                        upcoming = executor.submit(self._prepare)
+
+                    if start is None:
+                        start = self._clock()
+                    elif not ready:
+                        # The pattern was not ready in time, start it now instead
+                        self.stats.underruns += 1
+                        start = max(start, self._clock())
+
+                    self._play_pattern(messages, start)
+                    start += length
+                    played += 1
+                    self.stats.patterns += 1
+            finally:
+                upcoming.cancel()
+                self._release_notes()
+
+        return self.stats
+
+    def _prepare(self) -> tuple[list[tuple[float, Message]], float]:
+        """
+        Generates the next pattern and its messages. Runs in the background thread.
+        """
+        began = time.perf_counter()
+        prepared = timed_messages(self.source())
+        self.stats.generation_time += time.perf_counter() - began
+
+        return prepared
+
+    def _play_pattern(self, messages: list[tuple[float, Message]], start: float) -> None:
+        for offset, msg in messages:
+            target = start + offset
+            delay = target - self._clock()
+            if delay > 0:
+                self._sleep(delay)
+            if self._stop.is_set():
+                return
+
+            self.port.send(msg)
+            self.stats.record(self._clock() - target)
+
+            if msg.type == 'note_on':
+                self._active.add((msg.channel, msg.note))
+            elif msg.type == 'note_off':
+                self._active.discard((msg.channel, msg.note))
+
+    def _release_notes(self) -> None:
+        """
+        Sends note_off for every note still sounding
+        """
+        for channel, note in self._active:
+            self.port.send(Message('note_off', channel=channel, note=note))
+        self._active.clear()
@@ -0,0 +1,206 @@
+"""
+Opt-in instrumentation of the generation pipeline.
+
+The main stages of randsik (sampling notes, validating them, building MIDI tracks,
+loading drum loops, assembling songs and encoding files) are wrapped with `timed`.
+While profiling is enabled every call of a stage records its wall time and the
+notes, events and bytes it produced. When profiling is disabled a wrapped call only
+checks a global, so instrumentation costs next to nothing.
+
+Usage::
+
+    with randsik.profile() as stats:
+        create_song(sections)
+    print(stats)
+
+    # or for the whole process, forwarding every call to a metrics system
+    randsik.profiling.enable(callback=lambda stage, seconds, counts: ...)
+    ...
+    print(randsik.stats())
+
+Times are inclusive: the time of `generate` includes the time of the
+`validate_notes` calls it makes. Only the calling process is measured, stages that
+run in worker processes are not recorded.
+"""
+import functools
+import time
+from collections.abc import Callable, Collection, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+Callback = Callable[[str, float, dict], None]
+
+# Number of most recent latencies kept for percentiles
+LATENCY_SAMPLES = 10000
+
+
+def percentile(values: Collection[float], pct: float) -> float:
+    """
+    Returns the given percentile (0-100) of `values`, or 0 when there are none
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+
+    return ordered[idx]
+
+
+@dataclass
+class StageStats:
+    """
+    Totals of all the calls of one stage
+    """
+    calls: int = 0
+    seconds: float = 0.0
+    notes: int = 0
+    events: int = 0
+    bytes: int = 0
+
+    @property
+    def mean(self) -> float:
+        """Mean wall time per call in seconds"""
+        return self.seconds / self.calls if self.calls else 0.0
+
+
+class Stats(dict):
+    """
+    Mapping of stage name to `StageStats`
+    """
+
+    def __str__(self) -> str:
+        lines = [f'{"stage":<24} {"calls":>8} {"total ms":>12} {"notes":>10} '
+                 f'{"events":>10} {"bytes":>12}']
+        for name, stage in sorted(self.items(), key=lambda item: -item[1].seconds):
+            lines.append(
+                f'{name:<24} {stage.calls:>8} {stage.seconds * 1000:>12.3f} '
+                f'{stage.notes:>10} {stage.events:>10} {stage.bytes:>12}'
+            )
+
+        return '\n'.join(lines)
+
+
+class Profiler:
+    """
+    Collects the stats of the stages called while it is active
+    """
+
+    def __init__(self, callback: Callback = None) -> None:
+        """
+        :param callback: called after every call of a stage with the name of the stage,
+                         its wall time in seconds and a dict of the counts it produced
+        """
+        self.stats = Stats()
+        self.callback = callback
+
+    def record(self, stage: str, seconds: float, counts: dict) -> None:
+        entry = self.stats.get(stage)
+        if entry is None:
+            entry = self.stats[stage] = StageStats()
+
+        entry.calls += 1
+        entry.seconds += seconds
+        for name, value in counts.items():
+            setattr(entry, name, getattr(entry, name) + value)
+
+        if self.callback is not None:
+            self.callback(stage, seconds, counts)
+
+
+_default = Profiler()
+
+# The profiler collecting stats, None while profiling is disabled
+_active = None
+
+
+def timed(stage: str, **counters: Callable[[object], int]):
+    """
+    Decorator recording the calls of a function as `stage`.
+
+    :param stage: name of the stage
+    :param counters: functions computing a count ("notes", "events" or "bytes") from
+                     the return value of the function. They only run while profiling
+                     is enabled.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return func(*args, **kwargs)
+
+            began = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - began
+            profiler.record(
+                stage, seconds, {name: count(result) for name, count in counters.items()}
+            )
+
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+def enabled() -> bool:
+    return _active is not None
+
+
+def enable(callback: Callback = None) -> Stats:
+    """
+    Enables profiling for the whole process
+
+    :param callback: called after every recorded call, see `Profiler`
+
+    :return: the stats being collected
+    """
+    global _active
+
+    _default.callback = callback
+    _active = _default
+
+    return _default.stats
+
+
+def disable() -> None:
+    """
+    Disables profiling. The stats collected so far are kept.
+    """
+    global _active
+
+    _active = None
+
+
+def reset() -> None:
+    """
+    Clears the stats collected by `enable`
+    """
+    _default.stats.clear()
+
+
+def stats() -> Stats:
+    """
+    Returns the stats collected since profiling was enabled with `enable`, or the
+    stats of the innermost `profile` block when called inside one
+    """
+    return (_active or _default).stats
+
+
+@contextmanager
+def profile(callback: Callback = None) -> Iterator[Stats]:
+    """
+    Enables profiling inside a with block and yields the stats of that block only.
+    The previous state is restored when the block exits.
+
+    :param callback: called after every recorded call, see `Profiler`
+    """
+    global _active
+
+    previous = _active
+    profiler = Profiler(callback)
+    _active = profiler
+    try:
+        yield profiler.stats
+    finally:
+        _active = previous
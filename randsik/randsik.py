@@ -1,11 +1,22 @@
-import random
-from collections.abc import Iterable, Sequence
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import accumulate, islice
 from dataclasses import dataclass
-from typing import Union
-
-from mido import Message, MetaMessage, MidiTrack, bpm2tempo
+from typing import TYPE_CHECKING, BinaryIO, Union
 
 from randsik import constants as const
+from randsik import scales, smf
+from randsik.profiling import timed
+from randsik.rhythm import rhythm_index
+from randsik.rng import RNG, get_rng
+
+# mido is only imported once a MIDI track is built, which keeps `import randsik` fast
+if TYPE_CHECKING:
+    from mido import MidiTrack
+
+    from randsik.engine import Engine
 
 
 class RandsikValidationError(Exception):
@@ -29,7 +40,7 @@ class Note:
         self._validate_duration()
 
     def _validate_velocity(self):
-        if self.velocity not in tuple(range(128)):
+        if not 0 <= self.velocity <= 127:
             raise RandsikValidationError(
                 'Attribute "velocity" must be an integer between 0 and 127'
             )
@@ -54,7 +65,7 @@ class Rest:
             raise RandsikValidationError('Attribute "duration" must be a positive integer')
 
 
-def write_note(track: MidiTrack, note: Note, rest_val: Union[Rest, None] = None, channel: int = 0) -> None:
+def write_note(track: "MidiTrack", note: Note, rest_val: Union[Rest, None] = None, channel: int = 0) -> None:
     """
     Writes a note to the provided midi track
 
@@ -63,6 +74,8 @@ def write_note(track: MidiTrack, note: Note, rest_val: Union[Rest, None] = None,
     :param rest_val: how long of a rest to how in ticks per quarter note
     :param channel: which channel it takes on MIDI file (possible values 0..15)
     """
+    from mido import Message
+
     if isinstance(note.value, str):
         note_val = const.NOTE_MIDI_MAP[note.value]
     else:
@@ -88,20 +101,431 @@ def write_note(track: MidiTrack, note: Note, rest_val: Union[Rest, None] = None,
     )
 
 
+class NoteData:
+    """
+    Compact struct-of-arrays storage for the notes of a pattern.
+
+    Each note is stored as a pitch, velocity, duration, the rest before it and the
+    channel it plays on. All values are kept in typed arrays and validated in bulk,
+    which makes this far cheaper than a list of `Note` objects for long patterns.
+    Silence after the last note is kept in `rest_after`.
+    """
+    __slots__ = ("pitch", "velocity", "duration", "rest", "channel", "rest_after")
+
+    pitch: array
+    velocity: array
+    duration: array
+    rest: array
+    channel: array
+    rest_after: int
+
+    def __init__(
+            self,
+            pitch: Sequence[int],
+            velocity: Union[int, Sequence[int]],
+            duration: Sequence[int],
+            rest: Union[int, Sequence[int]] = 0,
+            channel: Union[int, Sequence[int]] = 0,
+            rest_after: int = 0,
+    ) -> None:
+        """
+        `velocity`, `rest` and `channel` may either be a sequence with one value per
+        note or a single value shared by all notes. `rest_after` is the number of
+        ticks of silence after the last note.
+        """
+        size = len(pitch)
+        self.pitch = _to_array("B", pitch, size, "pitch")
+        self.velocity = _to_array("B", velocity, size, "velocity")
+        self.duration = _to_array("I", duration, size, "duration")
+        self.rest = _to_array("I", rest, size, "rest")
+        self.channel = _to_array("B", channel, size, "channel")
+        self.rest_after = rest_after
+        self._validate()
+
+    def __len__(self) -> int:
+        return len(self.pitch)
+
+    def __repr__(self) -> str:
+        return f"NoteData(notes={len(self)}, rest_after={self.rest_after})"
+
+    def __iter__(self) -> Iterator[tuple[int, int, int, int, int]]:
+        """
+        Yields (pitch, velocity, duration, rest, channel) for every note
+        """
+        return zip(self.pitch, self.velocity, self.duration, self.rest, self.channel)
+
+    @property
+    def ticks(self) -> int:
+        """Length of the notes in ticks, including `rest_after`"""
+        return sum(self.duration) + sum(self.rest) + self.rest_after
+
+    def pitch_range(self) -> Union[tuple[int, int], None]:
+        """
+        Returns the lowest and highest pitch, or None when there are no notes
+        """
+        if not len(self):
+            return None
+
+        return min(self.pitch), max(self.pitch)
+
+    @classmethod
+    def from_sequence(cls, sequence: Iterable[Union[tuple, Note, Rest]], channel: int = 0):
+        """
+        Converts a sequence of `Note`, `Rest` and tuples of notes (chords) to `NoteData`.
+        Rests are added to the rest before the next note, rests after the last note
+        become `rest_after`.
+        """
+        pitches, velocities, durations, rests = [], [], [], []
+        rest_val = 0
+
+        for seq in sequence:
+            if isinstance(seq, Rest):
+                rest_val += seq.duration
+                continue
+
+            for note in seq if isinstance(seq, tuple) else (seq,):
+                if isinstance(note.value, str):
+                    pitches.append(const.NOTE_MIDI_MAP[note.value])
+                else:
+                    pitches.append(note.value)
+                velocities.append(note.velocity)
+                durations.append(note.duration)
+                rests.append(rest_val)
+                rest_val = 0
+
+        return cls(pitches, velocities, durations, rests, channel, rest_after=rest_val)
+
+    @timed("validate_notes")
+    def _validate(self) -> None:
+        """
+        Validates all values at once
+        """
+        if not isinstance(self.rest_after, int) or self.rest_after < 0:
+            raise RandsikValidationError('Attribute "rest_after" must be a positive integer')
+        if not len(self):
+            return
+        if max(self.pitch) > 127:
+            raise RandsikValidationError('Attribute "pitch" must be an integer between 0 and 127')
+        if max(self.velocity) > 127:
+            raise RandsikValidationError(
+                'Attribute "velocity" must be an integer between 0 and 127'
+            )
+        if max(self.channel) > 15:
+            raise RandsikValidationError('Attribute "channel" must be an integer between 0 and 15')
+
+
+def _to_array(typecode: str, values: Union[int, Sequence[int]], size: int, name: str) -> array:
+    """
+    Creates a typed array from `values`, repeating it `size` times when it is a single value
+    """
+    try:
+        if isinstance(values, int):
+            return array(typecode, (values,)) * size
+        arr = array(typecode, values)
+    except (OverflowError, TypeError):
+        raise RandsikValidationError(f'Attribute "{name}" must be a positive integer in range')
+
+    if len(arr) != size:
+        raise RandsikValidationError(f'Attribute "{name}" must have one value per note')
+
+    return arr
+
+
+class NoteView(ABC):
+    """
+    Read-only notes derived from other note data.
+
+    A view keeps a reference to the notes it is derived from and computes its own
+    notes while it is iterated, so deriving a pattern never copies note data. Views
+    can be used everywhere `NoteData` is iterated; `materialize` copies the notes
+    into a new `NoteData` when the arrays themselves are needed.
+    """
+    __slots__ = ()
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[tuple[int, int, int, int, int]]:
+        ...
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(notes={len(self)}, rest_after={self.rest_after})"
+
+    @property
+    @abstractmethod
+    def rest_after(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def ticks(self) -> int:
+        """Length of the notes in ticks, including `rest_after`"""
+
+    def pitch_range(self) -> Union[tuple[int, int], None]:
+        """
+        Returns the lowest and highest pitch, or None when there are no notes
+        """
+        pitches = array("B", (note[0] for note in self))
+        if not pitches:
+            return None
+
+        return min(pitches), max(pitches)
+
+    def materialize(self) -> NoteData:
+        """
+        Copies the notes of this view into a new `NoteData` object
+        """
+        columns = tuple(zip(*self)) or ((), (), (), (), ())
+
+        return NoteData(*columns, rest_after=self.rest_after)
+
+
+Notes = Union[NoteData, NoteView]
+
+
+class TransposedNotes(NoteView):
+    """
+    Notes shifted by a number of semitones
+    """
+    __slots__ = ("base", "semitones")
+
+    def __init__(self, base: Notes, semitones: int) -> None:
+        if isinstance(base, TransposedNotes):
+            base, semitones = base.base, base.semitones + semitones
+
+        span = base.pitch_range()
+        if span and not (0 <= span[0] + semitones and span[1] + semitones <= 127):
+            raise RandsikValidationError('Attribute "pitch" must be an integer between 0 and 127')
+
+        self.base = base
+        self.semitones = semitones
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    def __iter__(self) -> Iterator[tuple[int, int, int, int, int]]:
+        semitones = self.semitones
+        for pitch, velocity, duration, rest, channel in self.base:
+            yield pitch + semitones, velocity, duration, rest, channel
+
+    @property
+    def rest_after(self) -> int:
+        return self.base.rest_after
+
+    @property
+    def ticks(self) -> int:
+        return self.base.ticks
+
+    def pitch_range(self) -> Union[tuple[int, int], None]:
+        span = self.base.pitch_range()
+        if span is None:
+            return None
+
+        return span[0] + self.semitones, span[1] + self.semitones
+
+
+class VelocityNotes(NoteView):
+    """
+    Notes played with a single velocity
+    """
+    __slots__ = ("base", "velocity")
+
+    def __init__(self, base: Notes, velocity: int) -> None:
+        if isinstance(base, VelocityNotes):
+            base = base.base
+        if not 0 <= velocity <= 127:
+            raise RandsikValidationError(
+                'Attribute "velocity" must be an integer between 0 and 127'
+            )
+
+        self.base = base
+        self.velocity = velocity
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    def __iter__(self) -> Iterator[tuple[int, int, int, int, int]]:
+        velocity = self.velocity
+        for pitch, _, duration, rest, channel in self.base:
+            yield pitch, velocity, duration, rest, channel
+
+    @property
+    def rest_after(self) -> int:
+        return self.base.rest_after
+
+    @property
+    def ticks(self) -> int:
+        return self.base.ticks
+
+    def pitch_range(self) -> Union[tuple[int, int], None]:
+        return self.base.pitch_range()
+
+
+class ConcatNotes(NoteView):
+    """
+    Notes of several note data objects played one after another. The silence after
+    each part is added to the rest before the first note of the next one.
+    """
+    __slots__ = ("parts", "_size", "_rest_after")
+
+    def __init__(self, parts: Iterable[Notes]) -> None:
+        flat = []
+        for part in parts:
+            if isinstance(part, ConcatNotes):
+                flat.extend(part.parts)
+            else:
+                flat.append(part)
+
+        self.parts = tuple(flat)
+        self._size = sum(len(part) for part in self.parts)
+        self._rest_after = 0
+        for part in self.parts:
+            self._rest_after = part.rest_after + (self._rest_after if not len(part) else 0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[tuple[int, int, int, int, int]]:
+        carry = 0
+        for part in self.parts:
+            for pitch, velocity, duration, rest, channel in part:
+                yield pitch, velocity, duration, rest + carry, channel
+                carry = 0
+            carry += part.rest_after
+
+    @property
+    def rest_after(self) -> int:
+        return self._rest_after
+
+    @property
+    def ticks(self) -> int:
+        return sum(part.ticks for part in self.parts)
+
+    def pitch_range(self) -> Union[tuple[int, int], None]:
+        spans = [span for span in (part.pitch_range() for part in self.parts) if span]
+        if not spans:
+            return None
+
+        return min(span[0] for span in spans), max(span[1] for span in spans)
+
+
+class RepeatedNotes(NoteView):
+    """
+    Notes repeated a number of times without copying them
+    """
+    __slots__ = ("base", "times")
+
+    def __init__(self, base: Notes, times: int) -> None:
+        if not isinstance(times, int) or times < 0:
+            raise ValueError('"times" must be a positive integer')
+
+        self.base = base
+        self.times = times
+
+    def __len__(self) -> int:
+        return len(self.base) * self.times
+
+    def __iter__(self) -> Iterator[tuple[int, int, int, int, int]]:
+        base = self.base
+        carry = 0
+        for _ in range(self.times):
+            for pitch, velocity, duration, rest, channel in base:
+                yield pitch, velocity, duration, rest + carry, channel
+                carry = 0
+            carry += base.rest_after
+
+    @property
+    def rest_after(self) -> int:
+        if len(self.base) and self.times:
+            return self.base.rest_after
+
+        return self.base.rest_after * self.times
+
+    @property
+    def ticks(self) -> int:
+        return self.base.ticks * self.times
+
+    def pitch_range(self) -> Union[tuple[int, int], None]:
+        return self.base.pitch_range() if self.times else None
+
+
+class SlicedNotes(NoteView):
+    """
+    The notes starting between two ticks. Notes still sounding at the end tick are
+    shortened to end there, notes that started before the start tick are left out.
+    """
+    __slots__ = ("base", "start", "end", "_scan")
+
+    def __init__(self, base: Notes, start: int, end: int = None) -> None:
+        ticks = base.ticks
+        end = ticks if end is None else min(end, ticks)
+        if start < 0 or end < 0:
+            raise ValueError('"start" and "end" must be positive integers')
+
+        self.base = base
+        self.start = min(start, end)
+        self.end = end
+        self._scan = None
+
+    def __len__(self) -> int:
+        return self._scanned()[0]
+
+    def __iter__(self) -> Iterator[tuple[int, int, int, int, int]]:
+        start, end = self.start, self.end
+        tick = 0
+        last = start
+
+        for pitch, velocity, duration, rest, channel in self.base:
+            tick += rest
+            if tick >= end:
+                break
+            off = tick + duration
+            if tick >= start:
+                stop = off if off < end else end
+                yield pitch, velocity, stop - tick, tick - last, channel
+                last = stop
+            tick = off
+
+    @property
+    def rest_after(self) -> int:
+        return self._scanned()[1]
+
+    @property
+    def ticks(self) -> int:
+        return self.end - self.start
+
+    def _scanned(self) -> tuple[int, int]:
+        """
+        Counts the notes and the silence after them the first time it is needed
+        """
+        if self._scan is None:
+            size = 0
+            last = self.start
+            for _, _, duration, rest, _ in self:
+                size += 1
+                last += rest + duration
+            self._scan = (size, self.end - last)
+
+        return self._scan
+
+
 class Pattern:
     """
     A sequence of chords and notes
+
+    The notes are stored as `NoteData` and the MIDI track is only built the first time
+    the `track` attribute is accessed.
     """
 
-    track: MidiTrack
-    sequence: Iterable[Union[tuple, Note]]
     tempo: float
     program: int
     channel: int
 
     def __init__(
             self,
-            sequence: Iterable[Union[tuple, Note, Rest]],
+            sequence: Union[Iterable[Union[tuple, Note, Rest]], Notes],
             tempo: float = 120,
             program: int = 1,
             channel: int = 0,
@@ -109,46 +533,208 @@ class Pattern:
         """
         creates a pattern and attaches it to the provided `midi_file` object.
 
+        `sequence` may either be an iterable of `Note`, `Rest` and tuples of notes or
+        already built note data (`NoteData` or a `NoteView`).
+
         For more information on values for `program` see:
             https://en.wikipedia.org/wiki/General_MIDI#Piano
         """
-        self.track = MidiTrack()
-        self.sequence = sequence
+        if isinstance(sequence, (NoteData, NoteView)):
+            self._notes = sequence
+        else:
+            self._notes = NoteData.from_sequence(sequence, channel=channel)
+        self._track = None
         self.tempo = tempo
         self.program = program  # this controls the instrument
         self.channel = channel
 
-        # build midi track given input
-        self._build_midi_track()
+    @classmethod
+    def from_arrays(
+            cls,
+            pitch: Sequence[int],
+            velocity: Union[int, Sequence[int]],
+            duration: Sequence[int],
+            rest: Union[int, Sequence[int]] = 0,
+            tempo: float = 120,
+            program: int = 1,
+            channel: int = 0,
+            rest_after: int = 0,
+    ) -> "Pattern":
+        """
+        Creates a pattern straight from note values without creating `Note` objects
+        """
+        return cls(
+            NoteData(pitch, velocity, duration, rest, channel, rest_after=rest_after),
+            tempo=tempo, program=program, channel=channel,
+        )
 
     def __repr__(self) -> str:
         return f"Pattern(sequence={self.sequence})"
 
-    def __iter__(self):
-        """Iterate over internal `sequence` property"""
+    def __iter__(self) -> Iterator[Union[Note, Rest]]:
+        """
+        Iterates over the pattern as `Note` and `Rest` objects, see `sequence`
+        """
+        for pitch, velocity, duration, rest, _ in self._notes:
+            if rest:
+                yield Rest(rest)
+            yield Note(pitch, velocity, duration)
+        if self._notes.rest_after:
+            yield Rest(self._notes.rest_after)
+
+    def transpose(self, semitones: int) -> "Pattern":
+        """
+        Returns this pattern shifted by `semitones` (negative to shift down)
+        """
+        return self._derive(TransposedNotes(self._notes, semitones))
+
+    def with_velocity(self, velocity: int) -> "Pattern":
+        """
+        Returns this pattern with every note played at `velocity`
+        """
+        return self._derive(VelocityNotes(self._notes, velocity))
+
+    def repeat(self, times: int) -> "Pattern":
+        """
+        Returns this pattern played `times` times in a row
+        """
+        return self._derive(RepeatedNotes(self._notes, times))
+
+    def concat(self, *patterns: "Pattern") -> "Pattern":
+        """
+        Returns this pattern followed by `patterns`. The result keeps the tempo,
+        program and channel of this pattern.
+        """
+        return self._derive(ConcatNotes((self._notes,) + tuple(p.notes for p in patterns)))
+
+    def slice(self, start_tick: int, end_tick: int = None) -> "Pattern":
+        """
+        Returns the part of this pattern from `start_tick` up to `end_tick`. Notes
+        starting in that range are kept and cut off at `end_tick`.
+
+        :param start_tick: first tick of the slice
+        :param end_tick: tick the slice ends at, defaults to the end of the pattern
+        """
+        return self._derive(SlicedNotes(self._notes, start_tick, end_tick))
+
+    def _derive(self, notes: NoteView) -> "Pattern":
+        """
+        Returns a new pattern for `notes` with the settings of this pattern. The MIDI
+        track of the new pattern is only built when it is accessed.
+        """
+        return Pattern(notes, tempo=self.tempo, program=self.program, channel=self.channel)
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns this pattern as the bytes of a type 1 MIDI file with a single track.
+
+        The bytes are written straight from the note data and are the same as saving a
+        `mido.MidiFile` containing `self.track`.
+        """
+        return smf.encode_file([[self]])
 
-    def _build_midi_track(self) -> None:
+    def save(self, file: Union[str, BinaryIO]) -> None:
+        """
+        Saves this pattern as a MIDI file
+
+        :param file: file name or file object opened in binary mode
+        """
+        smf.write_file(file, self.to_bytes())
+
+    @property
+    def notes(self) -> Notes:
+        """The note data of this pattern"""
+        return self._notes
+
+    @property
+    def ticks(self) -> int:
+        """Length of the pattern in ticks"""
+        return self._notes.ticks
+
+    @property
+    def rest_after(self) -> int:
+        """Ticks of silence after the last note"""
+        return self._notes.rest_after
+
+    @property
+    def sequence(self) -> list[Union[Note, Rest]]:
+        """
+        The pattern as a list of `Note` and `Rest` objects
+        """
+        return list(self)
+
+    @property
+    def track(self) -> "MidiTrack":
+        """
+        The MIDI track for this pattern, built on first access
+        """
+        if self._track is None:
+            self._track = self._build_midi_track()
+
+        return self._track
+
+    @timed("build_midi_track", events=len)
+    def _build_midi_track(self) -> "MidiTrack":
         """
         Builds a midi track given the arguments provided to __init__
+
+        A pattern without notes only contains its tempo and its silence. Silence after
+        the last note is carried by the end_of_track message that ends the track;
+        `join_tracks` moves it onto the next message when patterns are played one
+        after another.
         """
-        self.track.append(
-            Message("program_change", program=self.program - 1, channel=self.channel)
-        )
-        self.track.append(MetaMessage("set_tempo", tempo=bpm2tempo(self.tempo)))
-        rest_val = None
-
-        for seq in self.sequence:
-            if isinstance(seq, tuple):
-                for note in seq:
-                    write_note(self.track, note, channel=self.channel)
-            elif isinstance(seq, Note):
-                write_note(self.track, seq, rest_val, channel=self.channel)
-                rest_val = None
-            elif isinstance(seq, Rest):
-                rest_val = seq.duration
-                continue
+        from mido import Message, MetaMessage, MidiTrack, bpm2tempo
+
+        notes = self._notes
+        track = MidiTrack()
+
+        if len(notes):
+            track.append(
+                Message("program_change", program=self.program - 1, channel=self.channel)
+            )
+        track.append(MetaMessage("set_tempo", tempo=bpm2tempo(self.tempo)))
+
+        for pitch, velocity, duration, rest, channel in notes:
+            track.append(
+                Message("note_on", note=pitch, velocity=velocity, time=rest, channel=channel)
+            )
+            track.append(
+                Message("note_off", note=pitch, velocity=velocity, time=duration, channel=channel)
+            )
+
+        if notes.rest_after:
+            track.append(MetaMessage("end_of_track", time=notes.rest_after))
+
+        return track
+
 
+def join_tracks(items: Iterable[Union[Pattern, Iterable]]) -> "MidiTrack":
+    """
+    Joins patterns and MIDI tracks (or any sequences of messages) one after another
+    into a new track. The time of every end_of_track is added to the message that
+    follows it, so the joined track has a single end_of_track, at its end.
+    """
+    from mido import MetaMessage, MidiTrack
+
+    track = MidiTrack()
+    pending = 0
+
+    for item in items:
+        for msg in item.track if isinstance(item, Pattern) else item:
+            if msg.type == "end_of_track":
+                pending += msg.time
+            elif pending:
+                track.append(msg.copy(time=msg.time + pending))
+                pending = 0
+            else:
+                track.append(msg)
+
+    track.append(MetaMessage("end_of_track", time=pending))
 
+    return track
+
+
+@timed("generate", notes=lambda pattern: len(pattern.notes))
 def generate(
         note: str = None,
         mode: str = None,
@@ -161,10 +747,17 @@ def generate(
         velocity: int = 127,
         channel: int = 0,
         note_lengths: Sequence = (const.QUARTER, const.SIXTEENTH, const.EIGHTH),
+        rng: RNG = None,
+        seed=None,
+        engine: "Engine" = None,
 ) -> Pattern:
     """
     Function to generate a random sequence of notes
 
+    Every measure is filled exactly: its note lengths are drawn from all the ways
+    `note_lengths` can add up to one measure (see `randsik.rhythm`). Only when that is
+    impossible are lengths drawn one by one and the last note cut to fit.
+
     :param note: key of pattern, will also determine octave ('C4', 'D3', etc.).
                  if None random note will be selected
     :param mode: which mode to choose from ('ionian', 'mixolydian', 'chromatic').
@@ -180,49 +773,335 @@ def generate(
     :param note_lengths: Tuple of available note lengths to use for pattern (default (QUARTER,
                          EIGHTH, SIXTEENTH) )
     :param scale_degrees: Scale degrees a random pattern can use (e.g. 1, 3, 5)
+    :param rng: random number generator (e.g. `random.Random`) to draw from
+    :param seed: seed for a new random number generator when `rng` is not given. When
+                 neither is given the global `random` module is used
+    :param engine: weighted or Markov distributions to draw the notes and note lengths
+                   from (see `randsik.engine`), drawn uniformly by default
     """
+    rng = get_rng(rng, seed)
+    note_selection = get_note_selection(note, mode, octaves, scale_degrees, rng=rng)
+
+    # Allowed pulses per measure and total pulses for the track
+    ppm = time_sig_to_ppm(time_sig)
+    total_pulses = ppm * measures
+
+    index = rhythm_index(ppm, tuple(sorted(note_lengths)))
+    pitches, durations = _sample_measures(
+        note_selection, note_lengths, measures, total_pulses, index, rng, engine
+    )
+
+    pattern = Pattern.from_arrays(
+        pitches, velocity, durations, program=program, tempo=tempo, channel=channel
+    )
+
+    return pattern
+
+
+def _sample_measures(
+        note_selection: Sequence[int],
+        note_lengths: Sequence[int],
+        measures: int,
+        total_pulses: int,
+        index,
+        rng: RNG,
+        engine: "Engine" = None,
+) -> tuple[list[int], list[int]]:
+    """
+    Draws the pitches and durations of `measures` measures the way `generate` does
+    """
+    if engine is not None:
+        return engine.sample(note_selection, note_lengths, total_pulses, rng, index=index)
+    if index.count:
+        durations = index.fill(measures, rng)
+        return rng.choices(note_selection, k=len(durations)), durations
+
+    return sample_uniform(note_selection, note_lengths, total_pulses, rng)
+
+
+class PatternStream:
+    """
+    Endless iterator of patterns, `measures` measures each, see `generate_stream`
+    """
+
+    # Parameters that change the notes to choose from or the rhythm tables
+    _SELECTION = frozenset(("note", "mode", "octaves", "scale_degrees"))
+    _RHYTHM = frozenset(("time_sig", "note_lengths", "measures"))
+
+    def __init__(self, rng: RNG, **params) -> None:
+        self.rng = rng
+        self.params = params
+        self.chunks = 0
+        self._selection = None
+        self._rhythm = None
+
+    def __iter__(self) -> "PatternStream":
+        return self
+
+    def __next__(self) -> Pattern:
+        params = self.params
+        if self._selection is None:
+            self._selection = get_note_selection(
+                params["note"], params["mode"], params["octaves"], params["scale_degrees"],
+                rng=self.rng,
+            )
+        if self._rhythm is None:
+            ppm = time_sig_to_ppm(params["time_sig"])
+            note_lengths = tuple(params["note_lengths"])
+            self._rhythm = (
+                note_lengths, ppm * params["measures"],
+                rhythm_index(ppm, tuple(sorted(note_lengths))),
+            )
+
+        note_lengths, total_pulses, index = self._rhythm
+        pitches, durations = _sample_measures(
+            self._selection, note_lengths, params["measures"], total_pulses, index, self.rng,
+            params["engine"],
+        )
+        self.chunks += 1
+
+        return Pattern.from_arrays(
+            pitches, params["velocity"], durations, program=params["program"],
+            tempo=params["tempo"], channel=params["channel"],
+        )
+
+    def update(self, **changes) -> None:
+        """
+        Changes parameters of `generate` for the following patterns. Only the tables
+        affected by the change are rebuilt.
+        """
+        unknown = set(changes) - set(self.params)
+        if unknown:
+            raise TypeError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+
+        self.params.update(changes)
+        if self._SELECTION & set(changes):
+            self._selection = None
+        if self._RHYTHM & set(changes):
+            self._rhythm = None
+
+    def events(self, chunks: int = None) -> Iterator[tuple[int, bytes]]:
+        """
+        Yields the events of the next `chunks` patterns (forever when None) as
+        (absolute tick, message bytes) pairs on one continuous timeline. The program
+        change and tempo are only sent at the start and when they change.
+        """
+        tick = 0
+        program = tempo = None
+
+        for pattern in islice(self, chunks):
+            if pattern.program != program:
+                program = pattern.program
+                yield tick, bytes((smf.PROGRAM_CHANGE | pattern.channel, program - 1))
+            if pattern.tempo != tempo:
+                tempo = pattern.tempo
+                yield tick, smf.META_SET_TEMPO + smf.tempo_bytes(tempo)
+            yield from smf.pattern_events(pattern, tick)
+            tick += pattern.ticks
+
+
+def generate_stream(
+        note: str = None,
+        mode: str = None,
+        octaves: int = 1,
+        measures: int = 1,
+        time_sig: str = "4/4",
+        scale_degrees=None,
+        program: const.Instrument = const.Piano.ACOUSTIC_GRAND_PIANO,
+        tempo: int = 120,
+        velocity: int = 127,
+        channel: int = 0,
+        note_lengths: Sequence = (const.QUARTER, const.SIXTEENTH, const.EIGHTH),
+        rng: RNG = None,
+        seed=None,
+        engine: "Engine" = None,
+) -> PatternStream:
+    """
+    Returns an endless stream of patterns of `measures` measures each. Accepts the same
+    parameters as `generate`.
+
+    The note selection, the rhythm index and the random number generator are set up
+    once and reused for every pattern; a random note or mode is chosen once for the
+    whole stream. Parameters can be changed between patterns with
+    `PatternStream.update`. Patterns are generated one at a time and nothing is kept
+    from earlier patterns, so memory stays the same however long the stream runs::
+
+        stream = generate_stream("C4", mode="dorian", seed=1)
+        for idx, pattern in enumerate(stream):
+            if idx == 16:
+                stream.update(mode="lydian", tempo=100)
+    """
+    return PatternStream(
+        get_rng(rng, seed),
+        note=note, mode=mode, octaves=octaves, measures=measures, time_sig=time_sig,
+        scale_degrees=scale_degrees, program=program, tempo=tempo, velocity=velocity,
+        channel=channel, note_lengths=note_lengths, engine=engine,
+    )
+
+
+def sample_uniform(
+        note_selection: Sequence[int], note_lengths: Sequence[int], total_pulses: int, rng: RNG
+) -> tuple[list[int], list[int]]:
+    """
+    Draws notes and note lengths uniformly until they fill `total_pulses`
+
+    :return: the pitches and durations of the notes
+    """
+    pitches = []
+    durations = []
+    current_pulses = 0
+    while current_pulses < total_pulses:
+        note_val = rng.choice(note_selection)
+        length = rng.choice(note_lengths)
+
+        # Check if we need to trim the last note to fit in the measure
+        if length + current_pulses > total_pulses:
+            length = length - ((length + current_pulses) - total_pulses)
+
+        pitches.append(note_val)
+        durations.append(length)
+        current_pulses += length
+
+    return pitches, durations
+
+
+@timed("generate_batch", notes=lambda patterns: sum(len(p.notes) for p in patterns))
+def generate_batch(
+        n: int,
+        note: str = None,
+        mode: str = None,
+        octaves: int = 1,
+        measures: int = 1,
+        time_sig: str = "4/4",
+        scale_degrees=None,
+        program: const.Instrument = const.Piano.ACOUSTIC_GRAND_PIANO,
+        tempo: int = 120,
+        velocity: int = 127,
+        channel: int = 0,
+        note_lengths: Sequence = (const.QUARTER, const.SIXTEENTH, const.EIGHTH),
+        rng: RNG = None,
+        seed=None,
+        engine: "Engine" = None,
+) -> list[Pattern]:
+    """
+    Generates `n` random patterns at once. Accepts the same parameters as `generate`.
+
+    The note lengths of every measure are drawn from the shared rhythm index (see
+    `randsik.rhythm`) and the notes of a pattern are drawn in a single call. When the
+    note lengths can not fill a measure exactly, the note lengths for every pattern
+    are drawn in a single call instead and each pattern is cut to `total_pulses` with
+    a cumulative sum and a bisect. When `note` or `mode` is None, a random one is
+    chosen for every pattern, just like calling `generate` `n` times. Otherwise the
+    notes to choose from are only looked up once.
+
+    :param n: Number of patterns to generate
+
+    :return: list of `n` patterns
+    """
+    if n < 0:
+        raise ValueError('"n" must be a non-negative integer')
+    rng = get_rng(rng, seed)
+
+    ppm = time_sig_to_ppm(time_sig)
+    total_pulses = ppm * measures
+
+    index = rhythm_index(ppm, tuple(sorted(note_lengths)))
+
+    # Upper bound on the number of notes a single pattern can hold
+    max_notes = -(-total_pulses // min(note_lengths))
+    lengths = None
+    if engine is None and not index.count:
+        lengths = rng.choices(note_lengths, k=n * max_notes)
+
+    # With a fixed key and mode every pattern chooses from the same notes
+    fixed_selection = None
+    if note is not None and mode is not None:
+        fixed_selection = get_note_selection(note, mode, octaves, scale_degrees)
+
+    patterns = []
+    for i in range(n):
+        note_selection = fixed_selection
+        if note_selection is None:
+            note_selection = get_note_selection(note, mode, octaves, scale_degrees, rng=rng)
+        if engine is not None:
+            values, durations = engine.sample(
+                note_selection, note_lengths, total_pulses, rng, index=index
+            )
+        else:
+            if lengths is None:
+                durations = index.fill(measures, rng)
+            else:
+                durations = trim_durations(
+                    lengths[i * max_notes:(i + 1) * max_notes], total_pulses
+                )
+            values = rng.choices(note_selection, k=len(durations))
+        patterns.append(
+            Pattern.from_arrays(
+                values, velocity, durations, program=program, tempo=tempo, channel=channel
+            )
+        )
+
+    return patterns
+
+
+@timed("note_selection")
+def get_note_selection(
+        note: Union[str, None],
+        mode: Union[str, None],
+        octaves: int,
+        scale_degrees=None,
+        rng: RNG = None,
+) -> list:
+    """
+    Returns the notes a pattern may choose from. When `note` or `mode` is None a
+    random one is selected.
+
+    :param note: key of pattern ('C4', 'D3', etc.)
+    :param mode: which mode to choose from ('ionian', 'mixolydian', 'chromatic')
+    :param octaves: Number of octaves to use
+    :param scale_degrees: Scale degrees to limit the selection to (e.g. 1, 3, 5)
+    :param rng: random number generator to draw from, defaults to the `random` module
+    """
+    rng = get_rng(rng)
     start_midi_note = None
     if note is None:
-        start_midi_note = random.choice(range(40, 80))
+        start_midi_note = rng.choice(range(40, 80))
     elif note not in const.NOTE_MIDI_MAP:
         raise ValueError('"note" must be a valid note (e.g. "C4", "A5", etc.)')
 
     if mode is None:
-        mode = random.choice(tuple((const.MUSIC_MODES.keys())))
+        mode = rng.choice(scales.SCALES.modes)
 
     if start_midi_note is None:
         start_midi_note = const.NOTE_MIDI_MAP[note]
-    playable_notes = get_mode_midi_notes(mode, start_midi_note)
-
-    idx = playable_notes.index(start_midi_note)
-    end = idx + 12 * octaves
-    end_range = end if end < 127 else 127
-    note_selection = playable_notes[idx:end_range]
+    note_selection = scales.SCALES.window(mode, start_midi_note, 12 * octaves)
 
     # This will limit selection to provided scale degrees (e.g. 1, 3, 5, 7)
     if scale_degrees:
         note_selection = [note_selection[x] for x in scale_degrees]
 
-    # Allowed pulses per measure and total pulses for the track
-    ppm = time_sig_to_ppm(time_sig)
-    total_pulses = ppm * measures
+    return note_selection
 
-    pattern_notes = []
-    current_pulses = 0
-    while current_pulses < total_pulses:
-        note_val = random.choice(note_selection)
-        length = random.choice(note_lengths)
 
-        # Check if we need to trim the last note to fit in the measure
-        if length + current_pulses > total_pulses:
-            length = length - ((length + current_pulses) - total_pulses)
+def trim_durations(lengths: Sequence[int], total_pulses: int) -> list[int]:
+    """
+    Cuts a sequence of note lengths so that it adds up to exactly `total_pulses`,
+    trimming the last note to fit.
 
-        pattern_notes.append(Note(note_val, duration=length, velocity=velocity))
-        current_pulses += length
+    :param lengths: candidate note lengths, long enough to fill `total_pulses`
+    :param total_pulses: length in pulses the durations need to add up to
 
-    pattern = Pattern(pattern_notes, program=program, tempo=tempo, channel=channel)
+    :return: list of durations
+    """
+    if total_pulses <= 0:
+        return []
 
-    return pattern
+    cumulative = list(accumulate(lengths))
+    cutoff = bisect_left(cumulative, total_pulses)
+    durations = list(lengths[:cutoff + 1])
+    durations[-1] -= cumulative[cutoff] - total_pulses
+
+    return durations
 
 
 def get_mode_midi_notes(mode: str, start_note: int) -> list:
@@ -234,49 +1113,22 @@ def get_mode_midi_notes(mode: str, start_note: int) -> list:
     we can figure out the steps (w-w-h-w-w-w-h or 2-2-1-2-2-2-1 for ionian) and
     with the start note we know where to start at.
 
-    The basic algorithm just walks up until reaching the 127th note and walks down until
-    reaching 0.
+    The notes are read from the precomputed tables in `randsik.scales`: first all notes
+    from the start note up to 127, followed by the notes below it down to 20.
 
     :param mode: musical mode ("ionian", "mixolydian", etc.)
     :param start_note: starting note (e.g. "C4")
 
     :return: set of allowable notes to be played
     """
-    playable_notes = []
-
-    if mode == "chromatic":
+    if mode == scales.CHROMATIC:
         return [x for x in range(128)]
-    else:
-        steps = const.MUSIC_MODES.get(mode)
-        if not steps:
-            raise ValueError("Invalid mode supplied")
-
-        # Let's go up first
-        current_note = start_note
-        broken = False
-
-        while not broken:
-            playable_notes.append(current_note)
-            for step in steps:
-                current_note += step
-                if current_note > 127:
-                    broken = True
-                    break
-                playable_notes.append(current_note)
-
-        # Now let's go down
-        current_note = start_note
-        broken = False
-
-        while not broken:
-            for step in reversed(steps):
-                current_note -= step
-                if current_note < 20:
-                    broken = True
-                    break
-                playable_notes.append(current_note)
-
-    return playable_notes
+
+    notes = scales.SCALES.notes(mode, start_note)
+    idx = bisect_left(notes, start_note)
+    lowest = bisect_left(notes, scales.LOWEST_NOTE)
+
+    return list(notes[idx:]) + list(reversed(notes[lowest:idx]))
 
 
 def time_sig_to_ppm(time_sig) -> int:
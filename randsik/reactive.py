@@ -0,0 +1,460 @@
+"""
+Call and response: answers phrases played on a MIDI input with generated patterns.
+
+The `Responder` listens to note messages, keeps track of the key and tempo being
+played and, when a phrase ends, generates an answering pattern in that key and
+tempo with `generate`. A phrase ends with the note_off that releases the last held
+note once at least `phrase_notes` notes were played.
+
+Everything the response depends on is prepared up front so answering stays well
+within a latency budget (5 ms by default) measured from the final note_off to the
+first note_on of the response sent to the output:
+
+- the key profiles for all 24 major and minor keys, the scale tables of their modes
+  and the rhythm index of the note lengths are computed when the responder is created
+- note onsets, held notes and the pitch class histogram live in fixed size buffers,
+  so tracking a message allocates nothing
+- the program change is built once and sent when listening starts, so a response
+  starts with its first note
+
+`listen` connects a responder to a mido input port, or to any iterable of messages
+whose `time` is the delta in seconds (see `simulated_input`) to test the budget
+under load without MIDI hardware::
+
+    with mido.open_input(name) as inport, mido.open_output(name) as outport:
+        stats = listen(inport, Responder(measures=1, octaves=2), outport)
+"""
+import queue
+import threading
+import time
+from array import array
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Union
+
+from mido import Message
+
+from randsik import constants as const
+from randsik import scales
+from randsik.player import PlaybackStats, timed_messages
+from randsik.randsik import Pattern, generate, pulses_to_seconds, time_sig_to_ppm
+from randsik.rhythm import rhythm_index
+from randsik.rng import RNG, get_rng
+
+if TYPE_CHECKING:
+    from randsik.engine import Engine
+
+# Latency budget from the final note_off of a phrase to the first output event
+LATENCY_BUDGET = 0.005
+
+# Krumhansl-Kessler key profiles, starting at the tonic
+MAJOR_PROFILE = (6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88)
+MINOR_PROFILE = (6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17)
+
+# Modes generated for major and minor keys
+MAJOR_MODE = 'ionian'
+MINOR_MODE = 'aeolian'
+
+# Number of recent onsets the tempo is estimated from
+ONSETS = 16
+
+# Tempo estimates are folded into this range by doubling or halving
+MIN_TEMPO = 60
+MAX_TEMPO = 180
+
+# Inter-onset intervals outside this range (seconds) are ignored
+MIN_INTERVAL = 0.05
+MAX_INTERVAL = 2.0
+
+# Weight kept by the pitch class histogram for every new note
+DECAY = 0.9
+
+# One name for every MIDI note, used to pass notes to `generate`
+NOTE_NAMES = {midi: name for name, midi in reversed(const.NOTE_MIDI_MAP.items())}
+
+
+@dataclass
+class ReactiveStats(PlaybackStats):
+    """
+    Response latencies. Every recorded latency is the time from receiving the
+    note_off that ended a phrase to sending the first note_on of the response.
+    """
+    budget: float = LATENCY_BUDGET
+    over_budget: int = 0
+
+    def record(self, latency: float) -> None:
+        super().record(latency)
+        self.patterns += 1
+        if latency > self.budget:
+            self.over_budget += 1
+
+    @property
+    def within_budget(self) -> bool:
+        return self.over_budget == 0
+
+    def __str__(self) -> str:
+        return (
+            f'responses={self.patterns} latency mean={self.mean_latency * 1000:.3f}ms '
+            f'p50={self.percentile(50) * 1000:.3f}ms p99={self.percentile(99) * 1000:.3f}ms '
+            f'max={self.max_latency * 1000:.3f}ms '
+            f'over budget ({self.budget * 1000:.1f}ms)={self.over_budget}'
+        )
+
+
+class KeyTracker:
+    """
+    Estimates the key from a decaying histogram of the pitch classes played
+    """
+
+    def __init__(self, decay: float = DECAY) -> None:
+        self.decay = decay
+        self.histogram = array('d', bytes(8 * 12))
+
+        # (root, mode, mean centered profile rotated to the root)
+        self._profiles = []
+        for profile, mode in ((MAJOR_PROFILE, MAJOR_MODE), (MINOR_PROFILE, MINOR_MODE)):
+            mean = sum(profile) / 12
+            for root in range(12):
+                rotated = tuple(profile[(pc - root) % 12] - mean for pc in range(12))
+                self._profiles.append((root, mode, rotated))
+
+    def add(self, pitch: int, weight: float = 1.0) -> None:
+        histogram = self.histogram
+        for pc in range(12):
+            histogram[pc] *= self.decay
+        histogram[pitch % 12] += weight
+
+    def key(self) -> Union[tuple[int, str], None]:
+        """
+        Returns the root pitch class and mode of the most likely key, or None before
+        any note was played
+        """
+        histogram = self.histogram
+        if not any(histogram):
+            return None
+
+        best = None
+        best_score = None
+        for root, mode, profile in self._profiles:
+            score = sum(weight * value for weight, value in zip(histogram, profile))
+            if best_score is None or score > best_score:
+                best, best_score = (root, mode), score
+
+        return best
+
+    def reset(self) -> None:
+        for pc in range(12):
+            self.histogram[pc] = 0.0
+
+
+class TempoTracker:
+    """
+    Estimates the tempo from the median interval between recent note onsets
+    """
+
+    def __init__(self, size: int = ONSETS, default: int = 120) -> None:
+        self.default = default
+        self.intervals = array('d', bytes(8 * size))
+        self._count = 0
+        self._last = None
+
+    def onset(self, now: float) -> None:
+        if self._last is not None:
+            interval = now - self._last
+            if MIN_INTERVAL <= interval <= MAX_INTERVAL:
+                self.intervals[self._count % len(self.intervals)] = interval
+                self._count += 1
+        self._last = now
+
+    def tempo(self) -> int:
+        """
+        Returns the estimated tempo in BPM, or `default` before two onsets were played
+        """
+        count = min(self._count, len(self.intervals))
+        if not count:
+            return self.default
+
+        ordered = sorted(self.intervals[:count])
+        bpm = 60 / ordered[count // 2]
+        while bpm < MIN_TEMPO:
+            bpm *= 2
+        while bpm > MAX_TEMPO:
+            bpm /= 2
+
+        return int(round(bpm))
+
+
+class Responder:
+    """
+    Tracks the notes played and generates a response at the end of every phrase
+    """
+
+    def __init__(
+            self,
+            measures: int = 1,
+            octaves: int = 1,
+            mode: str = None,
+            note: str = None,
+            time_sig: str = '4/4',
+            scale_degrees=None,
+            program: const.Instrument = const.Piano.ACOUSTIC_GRAND_PIANO,
+            tempo: int = None,
+            velocity: int = 100,
+            channel: int = 0,
+            note_lengths: Sequence = (const.QUARTER, const.SIXTEENTH, const.EIGHTH),
+            phrase_notes: int = 4,
+            engine: 'Engine' = None,
+            rng: RNG = None,
+            seed=None,
+    ) -> None:
+        """
+        Takes the arguments of `generate`. `mode`, `note` and `tempo` are tracked from
+        the input when they are None.
+
+        :param phrase_notes: minimum number of notes in a phrase
+        """
+        self.measures = measures
+        self.octaves = octaves
+        self.mode = mode
+        self.note = note
+        self.time_sig = time_sig
+        self.scale_degrees = scale_degrees
+        self.program = program
+        self.fixed_tempo = tempo
+        self.velocity = velocity
+        self.channel = channel
+        self.note_lengths = tuple(note_lengths)
+        self.phrase_notes = phrase_notes
+        self.engine = engine
+        self.rng = get_rng(rng, seed)
+
+        self.keys = KeyTracker()
+        self.tempos = TempoTracker()
+        self.held = bytearray(const.MIDI_NOTES)
+        self._held_count = 0
+        self._phrase_count = 0
+        self._phrase_low = const.MIDI_NOTES
+
+        self.opening = Message('program_change', program=program - 1, channel=channel)
+
+        self._warm()
+
+    def _warm(self) -> None:
+        """
+        Builds every table a response can need, so no response has to
+        """
+        for mode in {self.mode or MAJOR_MODE, self.mode or MINOR_MODE}:
+            for root in range(12):
+                scales.SCALES.notes(mode, root)
+        rhythm_index(time_sig_to_ppm(self.time_sig), tuple(sorted(self.note_lengths)))
+        self._generate('C4', self.mode or MAJOR_MODE, 120, rng=get_rng(seed=0))
+
+    @property
+    def key(self) -> Union[tuple[int, str], None]:
+        """Root pitch class and mode of the key being played"""
+        return self.keys.key()
+
+    @property
+    def tempo(self) -> int:
+        """Tempo being played, or the fixed tempo"""
+        return self.fixed_tempo or self.tempos.tempo()
+
+    def feed(self, msg, now: float) -> Union[Pattern, None]:
+        """
+        Tracks a message received at `now` (seconds)
+
+        :return: the response when `msg` ended a phrase, otherwise None
+        """
+        kind = msg.type
+        if kind == 'note_on' and msg.velocity:
+            pitch = msg.note
+            if not self.held[pitch]:
+                self.held[pitch] = 1
+                self._held_count += 1
+            self.keys.add(pitch)
+            self.tempos.onset(now)
+            self._phrase_count += 1
+            if pitch < self._phrase_low:
+                self._phrase_low = pitch
+        elif kind == 'note_off' or kind == 'note_on':
+            if self.held[msg.note]:
+                self.held[msg.note] = 0
+                self._held_count -= 1
+            if not self._held_count and self._phrase_count >= self.phrase_notes:
+                return self.respond()
+
+        return None
+
+    def respond(self) -> Pattern:
+        """
+        Generates a response to the current phrase and starts a new phrase
+        """
+        key = self.keys.key() or (0, MAJOR_MODE)
+        mode = self.mode or key[1]
+        if self.note is not None:
+            note = self.note
+        else:
+            low = self._phrase_low if self._phrase_low < const.MIDI_NOTES else 60
+            note = NOTE_NAMES[max(0, low - (low - key[0]) % 12)]
+
+        self._phrase_count = 0
+        self._phrase_low = const.MIDI_NOTES
+
+        return self._generate(note, mode, self.tempo)
+
+    def _generate(self, note: str, mode: str, tempo: int, rng: RNG = None) -> Pattern:
+        return generate(
+            note, mode=mode, octaves=self.octaves, measures=self.measures,
+            time_sig=self.time_sig, scale_degrees=self.scale_degrees, program=self.program,
+            tempo=tempo, velocity=self.velocity, channel=self.channel,
+            note_lengths=self.note_lengths, rng=rng or self.rng, engine=self.engine,
+        )
+
+
+class _Playback(threading.Thread):
+    """
+    Sends the messages of the latest response on time. A new response, or stopping,
+    cuts off the one playing. Messages that are due are sent before looking for a new
+    response, so every response plays at least its first note.
+    """
+    STOP = object()
+
+    def __init__(
+            self, port, clock: Callable[[], float],
+            on_first_note: Callable[[Pattern, float], None],
+    ) -> None:
+        super().__init__(daemon=True)
+        self.port = port
+        self.clock = clock
+        self.on_first_note = on_first_note
+        self.responses = queue.Queue()
+
+    def run(self) -> None:
+        item = self.responses.get()
+        while item is not self.STOP:
+            start, pattern, messages = item
+            item = None
+            first = True
+            active = set()
+            for offset, msg in messages:
+                delay = start + offset - self.clock()
+                if delay > 0:
+                    try:
+                        item = self.responses.get(timeout=delay)
+                        break
+                    except queue.Empty:
+                        pass
+                self.port.send(msg)
+                if msg.type == 'note_on':
+                    active.add((msg.channel, msg.note))
+                    if first:
+                        first = False
+                        # Lateness of the first note against its place in the response
+                        self.on_first_note(pattern, self.clock() - start - offset)
+                elif msg.type == 'note_off':
+                    active.discard((msg.channel, msg.note))
+            for channel, note in active:
+                self.port.send(Message('note_off', channel=channel, note=note))
+            if item is None:
+                item = self.responses.get()
+
+    def stop(self) -> None:
+        self.responses.put(self.STOP)
+        self.join()
+
+
+def listen(
+        source: Iterable,
+        responder: Responder,
+        output=None,
+        realtime: bool = None,
+        on_response: Callable[[Pattern, float], None] = None,
+        clock: Callable[[], float] = time.perf_counter,
+) -> ReactiveStats:
+    """
+    Feeds the messages of `source` to `responder` and sends every response to `output`
+
+    The responder's program change is sent to `output` once, before any input is read.
+    The latency of a response is measured until its first note_on is sent (or, without
+    an output, until it is generated).
+
+    :param source: mido input port or iterable of messages. When it is not a port the
+                   `time` of every message is its delta in seconds, as yielded by
+                   `mido.MidiFile.play` or `simulated_input`.
+    :param responder: tracks the input and generates the responses
+    :param output: object with a `send(msg)` method (e.g. a mido output port)
+    :param realtime: play the responses on time in a background thread. Defaults to
+                     True for ports; otherwise the messages of every response are sent
+                     straight away.
+    :param on_response: called with every response and its latency in seconds. With
+                        realtime playback it is called from the playback thread.
+    :param clock: clock used for the latencies and for realtime playback
+
+    :return: the latencies of the responses
+    """
+    is_port = hasattr(source, 'receive')
+    if realtime is None:
+        realtime = is_port
+    stats = ReactiveStats()
+
+    def responded(pattern: Pattern, latency: float) -> None:
+        stats.record(latency)
+        if on_response is not None:
+            on_response(pattern, latency)
+
+    playback = None
+    if output is not None:
+        output.send(responder.opening)
+        if realtime:
+            playback = _Playback(output, clock, responded)
+            playback.start()
+    now = 0.0
+
+    try:
+        for msg in source:
+            received = clock()
+            now = received if is_port else now + msg.time
+            pattern = responder.feed(msg, now)
+            if pattern is None:
+                continue
+
+            if output is None:
+                responded(pattern, clock() - received)
+                continue
+
+            # The program change was sent when listening started
+            messages = timed_messages(pattern)[0][1:]
+            if playback is not None:
+                playback.responses.put((received, pattern, messages))
+                continue
+
+            latency = None
+            for _, out in messages:
+                output.send(out)
+                if latency is None and out.type == 'note_on':
+                    latency = clock() - received
+            responded(pattern, clock() - received if latency is None else latency)
+    finally:
+        if playback is not None:
+            playback.stop()
+
+    return stats
+
+
+def simulated_input(
+        phrases: Iterable[Pattern], gap: float = 0.5, channel: int = 0
+) -> Iterator:
+    """
+    Yields the note messages of `phrases` as played live, with `time` as the delta in
+    seconds, leaving `gap` seconds between phrases. Use it with `listen` to test
+    responses without an input port.
+    """
+    pending = 0.0
+
+    for pattern in phrases:
+        for msg in pattern.track:
+            pending += pulses_to_seconds(msg.time, pattern.tempo)
+            if msg.type in ('note_on', 'note_off'):
+                yield msg.copy(time=pending, channel=channel)
+                pending = 0.0
+        pending += gap
@@ -0,0 +1,145 @@
+"""
+Index of the ways to fill a measure exactly with a set of note lengths.
+
+Filling a measure by drawing note lengths until it is full and cutting off the last
+one produces odd durations (e.g. a whole note clipped to a sixteenth). Instead, the
+`RhythmIndex` of a (pulses per measure, note lengths) pair counts every sequence of
+note lengths that adds up to exactly one measure, weighing every sequence by how
+likely drawing its lengths one at a time is. Drawing a measure from the index gives
+the same rhythms as drawing lengths one at a time until a measure happens to be
+filled exactly, without ever cutting off a note.
+
+A measure is drawn with a single random number, its rank among the weighted
+fillings, which is turned into note lengths with the table of counts. Draws only
+depend on the random number generator, so seeded patterns stay reproducible.
+
+Indexes are cached with `rhythm_index`, so `generate`, song tracks and batches all
+share them.
+"""
+from bisect import bisect_right
+from collections import Counter
+from collections.abc import Sequence
+from functools import lru_cache, reduce
+from itertools import accumulate
+from math import gcd
+
+from randsik.rng import RNG
+
+# Maximum number of indexes kept by `rhythm_index`
+RHYTHM_CACHE_SIZE = 128
+
+
+class RhythmIndex:
+    """
+    All the ways to fill `ppm` pulses with `note_lengths`.
+
+    Lengths that appear more than once in `note_lengths` are drawn more often, just
+    like when drawing lengths with `random.choice`.
+    """
+
+    def __init__(self, ppm: int, note_lengths: Sequence[int]) -> None:
+        """
+        :param ppm: pulses per measure
+        :param note_lengths: allowed note lengths in pulses
+        """
+        if not note_lengths or any(length <= 0 for length in note_lengths):
+            raise ValueError('"note_lengths" must be positive integers')
+
+        multiplicity = Counter(note_lengths)
+        self.ppm = ppm
+        self.lengths = tuple(sorted(multiplicity))
+
+        step = reduce(gcd, self.lengths)
+        self._units = tuple(length // step for length in self.lengths)
+        self._size = ppm // step if ppm % step == 0 else 0
+
+        # Drawing a length one at a time picks it with probability multiplicity / K,
+        # so a filling of n notes has weight prod(multiplicity) / K ** n. Multiplying
+        # every note by K ** units keeps the weights whole numbers with the same ratios,
+        # because the units of every filling add up to the same size.
+        draws = len(note_lengths)
+        self._weights = tuple(
+            multiplicity[length] * draws ** (unit - 1)
+            for length, unit in zip(self.lengths, self._units)
+        )
+
+        # ways[n]: total weight of the fillings of n units, distinct[n]: their number
+        ways = [1] + [0] * self._size
+        distinct = [1] + [0] * self._size
+        for total in range(1, self._size + 1):
+            for unit, weight in zip(self._units, self._weights):
+                if unit <= total:
+                    ways[total] += weight * ways[total - unit]
+                    distinct[total] += distinct[total - unit]
+
+        self._ways = ways
+        self.count = distinct[self._size] if self._size else 0
+
+        # For every number of units left, the cumulative weight of starting the rest of
+        # the measure with each length, so the next length of a rank is found by bisecting
+        self._steps = [None] + [
+            list(accumulate(
+                weight * ways[remaining - unit] if unit <= remaining else 0
+                for unit, weight in zip(self._units, self._weights)
+            ))
+            for remaining in range(1, self._size + 1)
+        ]
+
+    def __repr__(self) -> str:
+        return f'RhythmIndex(ppm={self.ppm}, lengths={self.lengths}, fillings={self.count})'
+
+    @property
+    def total(self) -> int:
+        """Total weight of the fillings, ranks go from 0 up to this number"""
+        return self._ways[self._size] if self.count else 0
+
+    def filling(self, rank: int) -> tuple[int, ...]:
+        """
+        Returns the note lengths of the filling at `rank` (0 <= rank < total).
+        Fillings take up as many ranks as their weight.
+        """
+        ways, steps, units, lengths = self._ways, self._steps, self._units, self.lengths
+        durations = []
+        remaining = self._size
+
+        while remaining:
+            cumulative = steps[remaining]
+            idx = bisect_right(cumulative, rank)
+            if idx:
+                rank -= cumulative[idx - 1]
+            remaining -= units[idx]
+            rank %= ways[remaining]
+            durations.append(lengths[idx])
+
+        return tuple(durations)
+
+    def sample(self, rng: RNG) -> tuple[int, ...]:
+        """
+        Draws the note lengths of one measure
+        """
+        if not self.count:
+            raise ValueError(f'{self.lengths} can not fill a measure of {self.ppm} pulses')
+
+        return self.filling(rng.randrange(self.total))
+
+    def fill(self, measures: int, rng: RNG) -> list[int]:
+        """
+        Draws the note lengths of `measures` measures
+        """
+        durations = []
+        for _ in range(measures):
+            durations += self.sample(rng)
+
+        return durations
+
+
+@lru_cache(maxsize=RHYTHM_CACHE_SIZE)
+def rhythm_index(ppm: int, note_lengths: tuple[int, ...]) -> RhythmIndex:
+    """
+    Returns the shared index for `ppm` and `note_lengths`. The least recently used
+    indexes are dropped once more than `RHYTHM_CACHE_SIZE` are cached.
+
+    The index does not depend on the order of `note_lengths`, so callers pass them
+    sorted to share one cache entry between every ordering of the same lengths.
+    """
+    return RhythmIndex(ppm, note_lengths)
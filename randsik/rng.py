@@ -0,0 +1,54 @@
+"""
+Random number generators used for generating patterns and songs.
+
+Every generation function accepts either an `rng` (a `random.Random` instance) or a
+`seed`. When neither is given the functions of the global `random` module are used.
+
+Independent child streams (e.g. one per instrument or section) are derived by
+hashing the parent seed together with a key, so the streams do not depend on the
+order in which they are created or on which process creates them.
+"""
+import hashlib
+import random
+from types import ModuleType
+from typing import Union
+
+RNG = Union[random.Random, ModuleType]
+
+
+def get_rng(rng: RNG = None, seed=None) -> RNG:
+    """
+    Returns the random number generator to use for the given `rng` and `seed` arguments
+
+    :param rng: random number generator to use as is
+    :param seed: seed for a new `random.Random` instance when `rng` is not given
+    """
+    if rng is not None:
+        return rng
+    if seed is not None:
+        return random.Random(seed)
+
+    return random
+
+
+def derive_seed(seed, *keys) -> int:
+    """
+    Derives a 64 bit seed for a child stream from `seed` and `keys`
+
+    :param seed: parent seed
+    :param keys: identify the child stream (e.g. a section index and a channel)
+    """
+    data = repr((seed,) + keys).encode()
+
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def spawn(seed, count: int, *keys) -> list[random.Random]:
+    """
+    Returns `count` independent random number generators derived from `seed`
+
+    :param seed: parent seed
+    :param count: number of generators
+    :param keys: extra keys shared by all the generators
+    """
+    return [random.Random(derive_seed(seed, *keys, idx)) for idx in range(count)]
@@ -0,0 +1,135 @@
+"""
+Precomputed lookup tables of the notes in every musical mode.
+
+For every (mode, root pitch class) pair the playable MIDI notes are computed once
+and stored as a sorted tuple. Finding the notes of a pattern is then a matter of
+bisecting and slicing that tuple.
+"""
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+
+from randsik import constants as const
+
+CHROMATIC = "chromatic"
+
+# Lowest note returned when the notes below the start note are needed
+LOWEST_NOTE = 20
+
+
+class ScaleIndex:
+    """
+    Sorted note tables for every mode and root pitch class.
+
+    Tables are built the first time a (mode, root) pair is used and kept for the
+    lifetime of the index.
+    """
+
+    def __init__(self, modes: Mapping[str, Sequence[int]]) -> None:
+        self._modes = {}
+        self._tables = {}
+
+        for name, steps in modes.items():
+            self.register(name, steps)
+
+    @property
+    def modes(self) -> tuple[str, ...]:
+        """Names of the available modes, not including "chromatic\""""
+        return tuple(self._modes)
+
+    def register(self, name: str, steps: Sequence[int]) -> None:
+        """
+        Registers a mode given the steps between its notes in semitones
+        (e.g. (2, 2, 1, 2, 2, 2, 1) for ionian). The steps must add up to an octave.
+
+        :param name: name of the mode
+        :param steps: semitone steps between the notes of the mode
+        """
+        steps = tuple(steps)
+        if name == CHROMATIC:
+            raise ValueError(f'"{CHROMATIC}" is a reserved mode name')
+        if not steps or any(not isinstance(step, int) or step <= 0 for step in steps):
+            raise ValueError('"steps" must be a sequence of positive integers')
+        if sum(steps) != 12:
+            raise ValueError('"steps" must add up to 12 semitones')
+
+        self._modes[name] = steps
+        for key in [key for key in self._tables if key[0] == name]:
+            del self._tables[key]
+
+    def notes(self, mode: str, root: int) -> tuple[int, ...]:
+        """
+        Returns all MIDI notes (0..127) in `mode` starting at the root pitch class `root`
+        (0 for C, 1 for C#, ...) in ascending order.
+        """
+        key = (mode, root % 12)
+        table = self._tables.get(key)
+
+        if table is None:
+            if mode == CHROMATIC:
+                table = tuple(range(const.MIDI_NOTES))
+            else:
+                steps = self._modes.get(mode)
+                if not steps:
+                    raise ValueError("Invalid mode supplied")
+                table = _build_table(steps, key[1])
+            self._tables[key] = table
+
+        return table
+
+    def window(self, mode: str, start_note: int, size: int) -> list[int]:
+        """
+        Returns `size` notes in `mode` starting at `start_note` and walking up. When the
+        top of the MIDI range is reached, the notes below `start_note` are used in
+        descending order.
+
+        :param mode: musical mode ("ionian", "chromatic", etc.)
+        :param start_note: MIDI note to start at
+        :param size: number of notes
+        """
+        notes = self.notes(mode, start_note)
+
+        if mode == CHROMATIC:
+            end = start_note + size
+            return list(notes[start_note:end if end < 127 else 127])
+
+        size = min(size, 127)
+
+        pos = bisect_left(notes, start_note)
+        selection = list(notes[pos:pos + size])
+        missing = size - len(selection)
+
+        if missing > 0:
+            below = notes[bisect_left(notes, LOWEST_NOTE):pos]
+            selection.extend(reversed(below[-missing:]))
+
+        return selection
+
+
+def _build_table(steps: Sequence[int], root: int) -> tuple[int, ...]:
+    """
+    Walks the steps of a mode through the whole MIDI range, starting an octave below
+    `root` so the notes under it are included as well
+    """
+    notes = []
+    current_note = root - 12
+
+    while current_note < const.MIDI_NOTES:
+        for step in steps:
+            if 0 <= current_note < const.MIDI_NOTES:
+                notes.append(current_note)
+            current_note += step
+
+    return tuple(notes)
+
+
+SCALES = ScaleIndex(const.MUSIC_MODES)
+
+
+def register_mode(name: str, steps: Sequence[int]) -> None:
+    """
+    Registers a custom mode which can then be used everywhere a mode name is accepted
+
+    :param name: name of the mode
+    :param steps: semitone steps between the notes of the mode, adding up to 12
+    """
+    SCALES.register(name, steps)
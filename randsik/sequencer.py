@@ -0,0 +1,277 @@
+"""
+asyncio sequencer playing many patterns at once on a shared clock.
+
+Every pattern or MIDI track added to the `Sequencer` becomes a voice. Voices are
+merged onto a single timeline with a priority queue that holds only the next
+event of every voice, so the cost of scheduling an event does not depend on the
+length of the patterns. Voices can be added and removed while the sequencer is
+running, and every voice can send to its own output port.
+"""
+import asyncio
+import heapq
+import inspect
+import itertools
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import dataclass
+from typing import Union
+
+from mido import Message, MidiTrack
+
+from randsik import constants as const
+from randsik.player import PlaybackStats
+from randsik.randsik import Pattern
+
+# The event loop only wakes up with millisecond precision, so the sequencer wakes
+# up this many seconds early and yields to the loop until the event is due
+SPIN_THRESHOLD = 0.002
+
+
+@dataclass
+class SequencerStats(PlaybackStats):
+    """
+    Playback statistics plus the time the sequencer spends scheduling events
+    """
+    scheduling_time: float = 0.0
+
+    @property
+    def mean_overhead(self) -> float:
+        """Mean scheduling time per event in seconds"""
+        return self.scheduling_time / self.events if self.events else 0.0
+
+
+class _Voice:
+    __slots__ = ('port', 'events', 'active')
+
+    def __init__(self, port, events: Iterator[tuple[float, Message]]) -> None:
+        self.port = port
+        self.events = events
+        self.active = set()
+
+
+def voice_events(
+        messages: Sequence, offset: float = 0.0, loop: bool = False,
+        ticks_per_beat: int = const.QUARTER,
+) -> Iterator[tuple[float, Message]]:
+    """
+    Yields the channel messages of a track with their time in seconds, following
+    the set_tempo messages in the track
+
+    :param messages: mido messages with delta times in ticks
+    :param offset: time in seconds of the first tick
+    :param loop: repeat the messages forever
+    :param ticks_per_beat: ticks per quarter note
+    """
+    tempo = const.DEFAULT_TEMPO
+    seconds = offset
+
+    if loop and not sum(msg.time for msg in messages):
+        loop = False
+
+    while True:
+        for msg in messages:
+            seconds += msg.time * tempo / 1e6 / ticks_per_beat
+            if msg.type == 'set_tempo':
+                tempo = msg.tempo
+            elif not msg.is_meta:
+                yield seconds, msg
+        if not loop:
+            return
+
+
+class Sequencer:
+    """
+    Plays any number of patterns or MIDI tracks at the same time.
+
+    Usage::
+
+        sequencer = Sequencer()
+        for channel, track in enumerate(song.tracks):
+            sequencer.add(track, port)
+        await sequencer.run()
+    """
+
+    def __init__(
+            self,
+            clock: Callable[[], float] = time.monotonic,
+            ticks_per_beat: int = const.QUARTER,
+    ) -> None:
+        """
+        :param clock: monotonic clock returning seconds
+        :param ticks_per_beat: ticks per quarter note of the tracks that are added
+        """
+        self.stats = SequencerStats()
+        self.ticks_per_beat = ticks_per_beat
+        self._clock = clock
+        self._voices = {}
+        self._queue = []
+        self._ids = itertools.count()
+        self._order = itertools.count()
+        self._start = None
+        self._position = 0.0
+        self._changed = None
+        self._stopped = False
+
+    @property
+    def voices(self) -> tuple[int, ...]:
+        """Ids of the voices currently playing"""
+        return tuple(self._voices)
+
+    def add(
+            self,
+            source: Union[Pattern, MidiTrack, Sequence],
+            port,
+            loop: bool = False,
+            offset: float = 0.0,
+    ) -> int:
+        """
+        Adds a voice. When the sequencer is running the voice starts `offset` seconds
+        from now, otherwise `offset` seconds after the sequencer starts (or resumes).
+
+        :param source: pattern or track (a sequence of mido messages) to play
+        :param port: output with a `send(msg)` method; `send` may be a coroutine
+        :param loop: repeat the source until the voice is removed
+        :param offset: delay in seconds before the voice starts
+
+        :return: id of the voice
+        """
+        messages = source.track if isinstance(source, Pattern) else source
+        if self._start is not None:
+            offset += self._clock() - self._start
+        else:
+            offset += self._position
+
+        voice_id = next(self._ids)
+        voice = _Voice(port, voice_events(messages, offset, loop, self.ticks_per_beat))
+        self._voices[voice_id] = voice
+        self._push(voice_id, voice)
+        self._notify()
+
+        return voice_id
+
+    def remove(self, voice_id: int) -> None:
+        """
+        Removes a voice and silences the notes it left sounding
+        """
+        voice = self._voices.pop(voice_id, None)
+        if voice is None:
+            return
+
+        self._release(voice)
+        self._notify()
+
+    def stop(self) -> None:
+        """
+        Stops `run` and silences the notes left sounding. The voices stay in place, and
+        calling `run` again resumes where the sequencer stopped.
+        """
+        self._stopped = True
+        for voice in self._voices.values():
+            self._release(voice)
+        self._notify()
+
+    async def run(self, until: float = None) -> SequencerStats:
+        """
+        Plays until all voices are done, `until` seconds have passed or `stop` is called.
+        A sequencer that was stopped resumes where it stopped, `until` counts from the
+        first start.
+
+        :return: timing statistics
+        """
+        if self._start is not None:
+            raise RuntimeError('Sequencer is already running')
+
+        self._stopped = False
+        self._changed = asyncio.Event()
+        # Queued events are timed from the first start, so the clock is rebased to
+        # continue from the position where the last run ended
+        self._start = self._clock() - self._position
+        queue = self._queue
+
+        try:
+            while not self._stopped and queue:
+                when = queue[0][0]
+                if until is not None and when > until:
+                    break
+
+                delay = self._start + when - self._clock()
+                if delay > SPIN_THRESHOLD:
+                    await self._wait(delay - SPIN_THRESHOLD)
+                    continue
+                if delay > 0:
+                    await asyncio.sleep(0)
+                    continue
+
+                began = time.perf_counter()
+                due = defaultdict(list)
+                now = self._clock() - self._start
+                while queue and queue[0][0] <= now:
+                    when, _, voice_id, msg = heapq.heappop(queue)
+                    voice = self._voices.get(voice_id)
+                    if voice is None:
+                        continue
+                    due[voice.port].append((when, voice, msg))
+                    self._push(voice_id, voice)
+                self.stats.scheduling_time += time.perf_counter() - began
+
+                if len(due) == 1:
+                    await self._send(*due.popitem())
+                else:
+                    await asyncio.gather(*(self._send(port, items) for port, items in due.items()))
+        finally:
+            self._position = self._clock() - self._start
+            self._start = None
+
+        return self.stats
+
+    @staticmethod
+    def _release(voice: _Voice) -> None:
+        """
+        Sends a note_off for every note a voice left sounding
+        """
+        for channel, note in voice.active:
+            result = voice.port.send(Message('note_off', channel=channel, note=note))
+            if inspect.isawaitable(result):
+                asyncio.ensure_future(result)
+        voice.active.clear()
+
+    def _notify(self) -> None:
+        """
+        Wakes up `run` so it can look at the queue again
+        """
+        if self._changed is not None:
+            self._changed.set()
+
+    async def _wait(self, delay: float) -> None:
+        """
+        Sleeps for `delay` seconds or until voices are added, removed or stopped
+        """
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def _push(self, voice_id: int, voice: _Voice) -> None:
+        """
+        Queues the next event of a voice, dropping the voice when it is done
+        """
+        event = next(voice.events, None)
+        if event is None:
+            self._voices.pop(voice_id, None)
+            return
+
+        heapq.heappush(self._queue, (event[0], next(self._order), voice_id, event[1]))
+
+    async def _send(self, port, items: list) -> None:
+        for when, voice, msg in items:
+            result = port.send(msg)
+            if inspect.isawaitable(result):
+                await result
+            self.stats.record(self._clock() - self._start - when)
+
+            if msg.type == 'note_on' and msg.velocity:
+                voice.active.add((msg.channel, msg.note))
+            elif msg.type in ('note_off', 'note_on'):
+                voice.active.discard((msg.channel, msg.note))
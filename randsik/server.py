@@ -0,0 +1,481 @@
+"""
+Local server generating MIDI files on demand.
+
+Services that need random patterns can ask a running `randsik serve` instead of
+importing randsik and generating inline. The server listens on a local TCP or Unix
+socket. Every request is one line of JSON holding a batch spec (see
+`randsik.batch`), optionally with a "seed"::
+
+    {"generate": {"note": "C4", "mode": "dorian", "measures": 4}}
+    {"song": [{"measures": 4, "mode": "dorian", "tempo": 92, "key": "D3",
+               "octaves": 1, "instruments": ["Bass.SYNTH_BASS_1"]}], "seed": 7}
+    {"metrics": true}
+
+Every response starts with a line of JSON, {"ok": true, "size": N, "cached": false}
+or {"ok": false, "error": "..."}, and successful responses are followed by the N
+bytes of the MIDI file (or of the metrics as JSON). Several requests can be sent
+over the same connection.
+
+Files are generated in a process pool whose workers are started and warmed up
+(imports, scale and rhythm tables, drum loops) before the server accepts
+connections. Requests without a seed that come in often are answered from a
+reservoir: once a spec was requested `hot_after` times, up to `reservoir_size`
+files for it are generated in the background and handed out instantly.
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Union
+
+from randsik.batch import song_sections, validate_spec
+from randsik.player import PlaybackStats
+from randsik.randsik import generate
+from randsik.song_builder.drums import default_library
+from randsik.song_builder.song import song_to_bytes
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+# Files kept ready per spec
+RESERVOIR_SIZE = 16
+
+# Number of specs with a reservoir, the least recently requested are dropped
+RESERVOIR_KEYS = 32
+
+# Requests of a spec before files are generated for it ahead of time
+HOT_AFTER = 2
+
+# Largest request line accepted
+MAX_REQUEST = 1 << 20
+
+# Seconds to wait for all workers to be started and warmed up
+READY_TIMEOUT = 120
+
+# Set in every worker process, see `_init_worker`
+_barrier = None
+
+
+def render_spec(spec: Mapping) -> bytes:
+    """
+    Returns the MIDI file for a request. Runs in worker processes.
+    """
+    seed = spec.get('seed')
+    if 'generate' in spec:
+        return generate(**spec['generate'], seed=seed).to_bytes()
+
+    return song_to_bytes(song_sections(spec['song']), seed=seed)
+
+
+def warm_up() -> None:
+    """
+    Loads everything the first request would otherwise have to. Runs once in every
+    worker process.
+    """
+    default_library()
+    for mode in ('ionian', 'dorian', None):
+        generate('C4', mode=mode, seed=0).to_bytes()
+
+
+def _init_worker(barrier) -> None:
+    global _barrier
+    _barrier = barrier
+    warm_up()
+
+
+def _ready() -> int:
+    """
+    Blocks until every worker runs this task, so one task is run by each worker and
+    the pool only counts as ready once all its workers are warm
+    """
+    _barrier.wait(READY_TIMEOUT)
+
+    return os.getpid()
+
+
+@dataclass
+class ServerStats(PlaybackStats):
+    """
+    Request counts and latencies (from reading a request to writing its response).
+    Every request answered is recorded as one event.
+    """
+    reservoir_hits: int = 0
+    errors: int = 0
+    bytes: int = 0
+
+    @property
+    def requests(self) -> int:
+        """Number of requests answered"""
+        return self.events
+
+    def record(self, latency: float, size: int = 0, cached: bool = False) -> None:
+        super().record(latency)
+        self.bytes += size
+        self.reservoir_hits += cached
+
+    def __str__(self) -> str:
+        return (
+            f'{self.requests} requests ({self.reservoir_hits} from the reservoir, '
+            f'{self.errors} errors), latency mean={self.mean_latency * 1000:.2f}ms '
+            f'p99={self.percentile(99) * 1000:.2f}ms max={self.max_latency * 1000:.2f}ms'
+        )
+
+
+class Server:
+    """
+    Generates MIDI files for the requests of local clients
+
+    Usage::
+
+        server = Server(workers=4)
+        asyncio.run(server.serve(port=8765))
+    """
+
+    def __init__(
+            self,
+            workers: int = None,
+            reservoir_size: int = RESERVOIR_SIZE,
+            reservoir_keys: int = RESERVOIR_KEYS,
+            hot_after: int = HOT_AFTER,
+            executor: Executor = None,
+    ) -> None:
+        """
+        :param workers: number of processes, defaults to the number of CPUs
+        :param reservoir_size: files kept ready per spec, 0 disables the reservoir
+        :param reservoir_keys: number of specs with a reservoir
+        :param hot_after: requests of a spec before files are generated ahead of time
+        :param executor: executor to generate with instead of a new process pool
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.reservoir_size = reservoir_size
+        self.reservoir_keys = reservoir_keys
+        self.hot_after = hot_after
+        self.stats = ServerStats()
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._reservoir = OrderedDict()
+        self._counts = OrderedDict()
+        self._refilling = set()
+        self._pending = 0
+        self._idle = None
+        self._server = None
+        self._path = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of files being generated or waiting for a worker"""
+        return self._pending
+
+    def metrics(self) -> dict:
+        stats = self.stats
+        return {
+            'requests': stats.requests,
+            'reservoir_hits': stats.reservoir_hits,
+            'errors': stats.errors,
+            'bytes': stats.bytes,
+            'queue_depth': self.queue_depth,
+            'reservoir': sum(len(files) for files in self._reservoir.values()),
+            'latency_ms': {
+                'mean': stats.mean_latency * 1000,
+                'p50': stats.percentile(50) * 1000,
+                'p99': stats.percentile(99) * 1000,
+                'max': stats.max_latency * 1000,
+            },
+        }
+
+    async def start(
+            self, host: str = HOST, port: int = PORT, path: Union[str, os.PathLike] = None
+    ) -> asyncio.AbstractServer:
+        """
+        Starts and warms up the workers, then listens on `path` (a Unix socket) or on
+        `host` and `port`
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(multiprocessing.Barrier(self.workers),),
+            )
+            task = _ready
+        else:
+            task = warm_up
+
+        # Workers warm up when they start. Every `_ready` task waits for the others, so
+        # each one occupies its own worker and the pool has to start all of them.
+        loop = asyncio.get_running_loop()
+        self._idle = asyncio.Event()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, task) for _ in range(self.workers)
+        ))
+
+        if path is not None:
+            self._path = os.fspath(path)
+            self._server = await asyncio.start_unix_server(
+                self._handle, os.fspath(path), limit=MAX_REQUEST
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, host, port, limit=MAX_REQUEST
+            )
+
+        return self._server
+
+    async def serve(
+            self, host: str = HOST, port: int = PORT, path: Union[str, os.PathLike] = None
+    ) -> None:
+        """
+        Starts the server and serves until cancelled
+        """
+        server = await self.start(host, port, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except FileNotFoundError:
+                pass
+            self._path = None
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._idle is not None:
+            # Lets waiting refills see that the server is closed
+            self._idle.set()
+
+    async def render(self, spec: Mapping) -> tuple[bytes, bool]:
+        """
+        Returns the file for `spec` and whether it came from the reservoir
+        """
+        validate_spec(spec)
+        if 'seed' in spec or not self.reservoir_size:
+            return await self._submit(spec), False
+
+        key = json.dumps(spec, sort_keys=True)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        self._counts.move_to_end(key)
+        while len(self._counts) > self.reservoir_keys * 4:
+            self._counts.popitem(last=False)
+
+        files = self._reservoir.get(key)
+        if files is None and self._counts[key] >= self.hot_after:
+            files = self._reservoir[key] = deque()
+            while len(self._reservoir) > self.reservoir_keys:
+                self._reservoir.popitem(last=False)
+
+        if files is not None:
+            self._reservoir.move_to_end(key)
+            if key not in self._refilling:
+                self._refilling.add(key)
+                asyncio.ensure_future(self._refill(key, spec))
+            if files:
+                return files.popleft(), True
+
+        return await self._submit(spec), False
+
+    async def _submit(self, spec: Mapping) -> bytes:
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        try:
+            return await loop.run_in_executor(self._executor, render_spec, spec)
+        finally:
+            self._pending -= 1
+            self._idle.set()
+
+    async def _refill(self, key: str, spec: Mapping) -> None:
+        """
+        Generates files for `key` until its reservoir is full. Requests waiting for a
+        worker go first.
+        """
+        try:
+            while self._executor is not None:
+                files = self._reservoir.get(key)
+                if files is None or len(files) >= self.reservoir_size:
+                    return
+                if self._pending >= self.workers:
+                    self._idle.clear()
+                    await self._idle.wait()
+                    continue
+                files.append(await self._submit(spec))
+        except Exception:
+            self._reservoir.pop(key, None)
+        finally:
+            self._refilling.discard(key)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self._reply(writer, error='request too long')
+                    return
+                if not line:
+                    return
+                await self._answer(writer, line)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, writer: asyncio.StreamWriter, line: bytes) -> None:
+        began = time.perf_counter()
+        try:
+            spec = json.loads(line)
+            if not isinstance(spec, dict):
+                raise ValueError('A request must be a JSON object')
+            if spec.get('metrics'):
+                await self._reply(writer, json.dumps(self.metrics()).encode())
+                return
+            data, cached = await self.render(spec)
+        except Exception as exc:
+            self.stats.errors += 1
+            await self._reply(writer, error=f'{type(exc).__name__}: {exc}')
+            return
+
+        await self._reply(writer, data, cached)
+        self.stats.record(time.perf_counter() - began, len(data), cached)
+
+    @staticmethod
+    async def _reply(
+            writer: asyncio.StreamWriter, data: bytes = b'', cached: bool = False,
+            error: str = None
+    ) -> None:
+        if error is not None:
+            header = {'ok': False, 'error': error}
+        else:
+            header = {'ok': True, 'size': len(data), 'cached': cached}
+        writer.write(json.dumps(header).encode() + b'\n' + data)
+
+
+class ServerError(Exception):
+    """
+    Raised by the client when the server could not answer a request
+    """
+
+
+class Client:
+    """
+    Connection to a randsik server
+
+    Usage::
+
+        async with Client(port=8765) as client:
+            data = await client.request({'generate': {'note': 'C4'}})
+    """
+
+    def __init__(
+            self, host: str = HOST, port: int = PORT, path: Union[str, os.PathLike] = None
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.path = path
+        self._reader = None
+        self._writer = None
+
+    async def __aenter__(self) -> 'Client':
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def connect(self) -> None:
+        if self.path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(os.fspath(self.path))
+        else:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+
+    async def request(self, spec: Mapping) -> bytes:
+        """
+        Returns the MIDI file the server generated for `spec`
+        """
+        data, _ = await self._request(spec)
+
+        return data
+
+    async def metrics(self) -> dict:
+        data, _ = await self._request({'metrics': True})
+
+        return json.loads(data)
+
+    async def _request(self, spec: Mapping) -> tuple[bytes, bool]:
+        self._writer.write(json.dumps(spec).encode() + b'\n')
+        await self._writer.drain()
+        header = json.loads(await self._reader.readline())
+        if not header['ok']:
+            raise ServerError(header['error'])
+
+        return await self._reader.readexactly(header['size']), header['cached']
+
+
+@dataclass
+class LoadTestResult(ServerStats):
+    """
+    Requests and latencies seen by the load test client, over `seconds` seconds
+    """
+    seconds: float = 0.0
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.requests} requests ({self.reservoir_hits} from the reservoir, '
+            f'{self.errors} errors) in {self.seconds:.2f}s: '
+            f'{self.requests_per_second:.1f} requests/s, '
+            f'latency p50={self.percentile(50) * 1000:.2f}ms '
+            f'p99={self.percentile(99) * 1000:.2f}ms'
+        )
+
+
+async def load_test(
+        spec: Mapping,
+        requests: int,
+        concurrency: int = 8,
+        host: str = HOST,
+        port: int = PORT,
+        path: Union[str, os.PathLike] = None,
+) -> LoadTestResult:
+    """
+    Sends `requests` requests for `spec` over `concurrency` connections and measures
+    the throughput and latency
+    """
+    result = LoadTestResult()
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        async with Client(host, port, path) as client:
+            for _ in remaining:
+                began = time.perf_counter()
+                try:
+                    data, cached = await client._request(spec)
+                except ServerError:
+                    result.errors += 1
+                    continue
+                result.record(time.perf_counter() - began, len(data), cached)
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.seconds = time.perf_counter() - began
+
+    return result
@@ -0,0 +1,364 @@
+"""
+Writes Standard MIDI Files (SMF) straight from pattern note data.
+
+The bytes written here are the same as the ones mido writes for the equivalent
+`MidiFile`, but no mido `Message` objects are created for the notes of a pattern.
+"""
+import heapq
+import struct
+from collections.abc import Iterable, Iterator
+from operator import itemgetter
+from typing import BinaryIO, Union
+
+from randsik import constants as const
+from randsik.profiling import timed
+
+META_SET_TEMPO = b"\xff\x51\x03"
+META_END_OF_TRACK = b"\xff\x2f\x00"
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+PROGRAM_CHANGE = 0xC0
+SYSEX = 0xF0
+SYSEX_END = 0xF7
+
+# Delta times in a pattern are made of a handful of note lengths, so the encoded
+# values are cached after the first time they are seen.
+_VARLEN_CACHE = {}
+
+
+def encode_varlen(value: int) -> bytes:
+    """
+    Encodes an integer as a MIDI variable length quantity
+
+    :param value: non-negative integer to encode
+
+    :return: encoded bytes, the last byte being < 128
+    """
+    encoded = _VARLEN_CACHE.get(value)
+    if encoded is not None:
+        return encoded
+
+    if not isinstance(value, int) or value < 0:
+        raise ValueError("variable int must be a non-negative integer")
+
+    buffer = [value & 0x7F]
+    rest = value >> 7
+    while rest:
+        buffer.append((rest & 0x7F) | 0x80)
+        rest >>= 7
+    encoded = bytes(reversed(buffer))
+
+    if len(_VARLEN_CACHE) < 4096:
+        _VARLEN_CACHE[value] = encoded
+
+    return encoded
+
+
+def tempo_bytes(bpm: float) -> bytes:
+    """
+    Returns the three data bytes of a set_tempo meta message for the given BPM
+    """
+    return int(round(60 * 1e6 / bpm)).to_bytes(3, "big")
+
+
+class TrackEncoder:
+    """
+    Incrementally encodes events into the data of a single MTrk chunk.
+
+    Patterns and mido messages can be mixed freely. Running status and the delta
+    time of removed end_of_track messages are carried over from one to the next,
+    just like mido does when saving a track.
+    """
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self.running_status = None
+        self.pending_time = 0
+
+    def add_pattern(self, pattern) -> None:
+        """
+        Adds the program change, tempo and notes of a `randsik.Pattern`. A pattern
+        without notes only adds its tempo. Silence after the last note is added to the
+        delta time of the next event.
+        """
+        data = self.data
+        notes = pattern.notes
+        channel = pattern.channel
+
+        if not len(notes):
+            data += encode_varlen(self.pending_time)
+            data += META_SET_TEMPO + tempo_bytes(pattern.tempo)
+            self.running_status = None
+            self.pending_time = notes.rest_after
+            return
+
+        data += encode_varlen(self.pending_time)
+        data += bytes((PROGRAM_CHANGE | channel, pattern.program - 1))
+        data += b"\x00" + META_SET_TEMPO + tempo_bytes(pattern.tempo)
+        self.pending_time = 0
+
+        # Every note produces at most 14 bytes while its delta times fit in 4 bytes,
+        # grow the buffer once up front and only again for longer delta times
+        start = len(data)
+        data.extend(bytes(14 * len(notes)))
+        view = memoryview(data)
+        pos = start
+        running = None
+
+        for pitch, velocity, duration, rest, chan in notes:
+            for status, delta in ((NOTE_ON | chan, rest), (NOTE_OFF | chan, duration)):
+                if delta < 0x80:
+                    view[pos] = delta
+                    pos += 1
+                else:
+                    encoded = encode_varlen(delta)
+                    size = len(encoded)
+                    if size > 4:
+                        view.release()
+                        data.extend(bytes(size - 4))
+                        view = memoryview(data)
+                    view[pos:pos + size] = encoded
+                    pos += size
+                if status != running:
+                    view[pos] = status
+                    pos += 1
+                    running = status
+                view[pos] = pitch
+                view[pos + 1] = velocity
+                pos += 2
+
+        view.release()
+        del data[pos:]
+        self.running_status = running
+        self.pending_time = notes.rest_after
+
+    def add_messages(self, messages: Iterable) -> None:
+        """
+        Adds mido messages (e.g. the contents of a `mido.MidiTrack`)
+        """
+        data = self.data
+
+        for msg in messages:
+            if msg.type == "end_of_track":
+                self.pending_time += msg.time
+                continue
+
+            data += encode_varlen(msg.time + self.pending_time)
+            self.pending_time = 0
+
+            if msg.is_meta:
+                data += bytes(msg.bytes())
+                self.running_status = None
+            elif msg.type == "sysex":
+                data.append(SYSEX)
+                data += encode_varlen(len(msg.data) + 1)
+                data += bytes(msg.data)
+                data.append(SYSEX_END)
+                self.running_status = None
+            else:
+                msg_bytes = msg.bytes()
+                status = msg_bytes[0]
+                if status == self.running_status:
+                    data += bytes(msg_bytes[1:])
+                else:
+                    data += bytes(msg_bytes)
+                self.running_status = status if status < 0xF0 else None
+
+    def add_event(self, delta: int, event: bytes) -> None:
+        """
+        Adds a single event given as the raw bytes of a MIDI or meta message
+
+        :param delta: ticks since the previous event
+        :param event: message bytes, e.g. bytes((0x90, 60, 100)) for a note_on
+        """
+        data = self.data
+        data += encode_varlen(delta + self.pending_time)
+        self.pending_time = 0
+        status = event[0]
+
+        if status == SYSEX:
+            data.append(SYSEX)
+            data += encode_varlen(len(event) - 1)
+            data += event[1:]
+            self.running_status = None
+        elif status >= 0xF0:
+            data += event
+            self.running_status = None
+        else:
+            data += event[1:] if status == self.running_status else event
+            self.running_status = status
+
+    def flush(self) -> bytes:
+        """
+        Returns the data encoded so far and clears it. Running status is kept, so the
+        returned pieces can be written one after another.
+        """
+        data = bytes(self.data)
+        self.data.clear()
+
+        return data
+
+    def add(self, item) -> None:
+        """
+        Adds either a pattern or an iterable of mido messages
+        """
+        if hasattr(item, "notes"):
+            self.add_pattern(item)
+        else:
+            self.add_messages(item)
+
+    def finish(self) -> bytes:
+        """
+        Closes the track with an end_of_track message and returns the whole MTrk chunk
+        """
+        self.data += encode_varlen(self.pending_time)
+        self.data += META_END_OF_TRACK
+        self.pending_time = 0
+        self.running_status = None
+
+        return chunk(b"MTrk", self.data)
+
+
+def pattern_events(pattern, start: int = 0) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields the note events of a pattern as (absolute tick, message bytes) pairs
+
+    :param pattern: `randsik.Pattern` to read the notes from
+    :param start: absolute tick the pattern starts at
+    """
+    notes = pattern.notes
+    tick = start
+
+    for pitch, velocity, duration, rest, channel in notes:
+        tick += rest
+        yield tick, bytes((NOTE_ON | channel, pitch, velocity))
+        tick += duration
+        yield tick, bytes((NOTE_OFF | channel, pitch, velocity))
+
+
+def track_events(items: Iterable, start: int = 0) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields the events of a track as (absolute tick, message bytes) pairs, ending with
+    an end_of_track event at the end of the track. Events are produced one at a time,
+    no absolute time copy of the track is made.
+
+    :param items: patterns or mido tracks played one after another in this track
+    :param start: absolute tick the track starts at
+    """
+    tick = start
+
+    for item in items:
+        if hasattr(item, "notes"):
+            if len(item.notes):
+                yield tick, bytes((PROGRAM_CHANGE | item.channel, item.program - 1))
+            yield tick, META_SET_TEMPO + tempo_bytes(item.tempo)
+            yield from pattern_events(item, tick)
+            tick += item.ticks
+        else:
+            for msg in item:
+                tick += msg.time
+                if msg.type != "end_of_track":
+                    yield tick, bytes(msg.bytes())
+
+    yield tick, META_END_OF_TRACK
+
+
+def merge_patterns(tracks: Iterable[Iterable]) -> Iterator[tuple[int, bytes]]:
+    """
+    Merges the events of several tracks into a single stream ordered by absolute tick,
+    e.g. to write a type 0 file. Events at the same tick keep the order of their
+    tracks, like `mido.merge_tracks`. Only one pending event per track is held in
+    memory.
+
+    :param tracks: every track is an iterable of patterns and/or mido tracks
+
+    :return: (absolute tick, message bytes) pairs, ending with a single end_of_track
+             at the end of the longest track
+    """
+    end = 0
+
+    for tick, event in heapq.merge(*map(track_events, tracks), key=itemgetter(0)):
+        if event == META_END_OF_TRACK:
+            end = tick
+        else:
+            yield tick, event
+
+    yield end, META_END_OF_TRACK
+
+
+def chunk(name: bytes, data: Union[bytes, bytearray]) -> bytes:
+    """
+    Returns an IFF chunk with the given name and data
+    """
+    return name + struct.pack(">L", len(data)) + data
+
+
+def header(num_tracks: int, midi_type: int = 1, ticks_per_beat: int = const.QUARTER) -> bytes:
+    """
+    Returns the MThd chunk of a MIDI file
+    """
+    return chunk(b"MThd", struct.pack(">hhh", midi_type, num_tracks, ticks_per_beat))
+
+
+def encode_track(items: Iterable) -> bytes:
+    """
+    Encodes a single MTrk chunk from patterns and/or iterables of mido messages
+
+    :param items: patterns or mido tracks played one after another in this track
+    """
+    encoder = TrackEncoder()
+    for item in items:
+        encoder.add(item)
+
+    return encoder.finish()
+
+
+def encode_merged(tracks: Iterable[Iterable]) -> bytes:
+    """
+    Encodes several tracks merged into a single MTrk chunk (see `merge_patterns`)
+    """
+    encoder = TrackEncoder()
+    previous = 0
+
+    for tick, event in merge_patterns(tracks):
+        if event == META_END_OF_TRACK:
+            encoder.pending_time += tick - previous
+        else:
+            encoder.add_event(tick - previous, event)
+        previous = tick
+
+    return encoder.finish()
+
+
+@timed("encode_file", bytes=len)
+def encode_file(
+        tracks: Iterable[Iterable], midi_type: int = 1, ticks_per_beat: int = const.QUARTER
+) -> bytes:
+    """
+    Encodes a complete MIDI file.
+
+    :param tracks: every track is an iterable of patterns and/or mido tracks
+    :param midi_type: MIDI file type (0, 1 or 2). For type 0 all tracks are merged
+                      into one.
+    :param ticks_per_beat: ticks per quarter note
+
+    :return: bytes of the MIDI file
+    """
+    if midi_type == 0:
+        chunks = [encode_merged(tracks)]
+    else:
+        chunks = [encode_track(items) for items in tracks]
+
+    return header(len(chunks), midi_type, ticks_per_beat) + b"".join(chunks)
+
+
+def write_file(file: Union[str, BinaryIO], data: bytes) -> None:
+    """
+    Writes `data` to a file name or a file object opened in binary mode
+    """
+    if hasattr(file, "write"):
+        file.write(data)
+    else:
+        with open(file, "wb") as fp:
+            fp.write(data)
@@ -0,0 +1,229 @@
+"""
+Content addressed cache of rendered song sections.
+
+Songs repeat their sections (verse, chorus, verse, chorus, ...). With a
+`SectionCache` every (section, instrument, channel, seed) combination is rendered
+once and the pattern is reused for every other occurrence, within a song and across
+songs. Entries are kept in memory with an LRU bound and, when a directory is given,
+also written to disk so later runs and other processes can reuse them.
+
+Because a cached section is looked up by its contents rather than its position in
+the song, sections with the same fields play the same notes wherever they occur.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import struct
+import sys
+import tempfile
+from array import array
+from collections import OrderedDict
+from typing import Union
+
+from randsik import constants as con
+from randsik.randsik import NoteData, Pattern, RandsikValidationError
+
+# Number of patterns kept in memory by default
+CACHE_SIZE = 256
+
+MAGIC = b'RSC1'
+
+# Typecodes of the NoteData arrays, in the order they are stored on disk
+_ARRAYS = (('pitch', 'B'), ('velocity', 'B'), ('duration', 'I'), ('rest', 'I'), ('channel', 'B'))
+
+
+def section_key(section, inst: con.Instrument, channel: int, seed) -> str:
+    """
+    Returns the key of a rendered section. The key only depends on plain values, so it
+    is the same in every process and every run.
+    """
+    fields = (
+        section.measures, section.mode, section.tempo, section.key, section.octaves,
+        tuple(int(instrument) for instrument in section.instruments),
+    )
+    data = repr((fields, int(inst), channel, seed)).encode()
+
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class SectionCache:
+    """
+    LRU cache of rendered section patterns, optionally backed by a directory
+    """
+
+    def __init__(
+            self, maxsize: int = CACHE_SIZE, directory: Union[str, os.PathLike] = None
+    ) -> None:
+        """
+        :param maxsize: maximum number of patterns kept in memory
+        :param directory: directory to store the patterns in as well
+        """
+        self.maxsize = maxsize
+        self.directory = pathlib.Path(directory) if directory is not None else None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return (
+            f'SectionCache(entries={len(self)}, hits={self.hits}, misses={self.misses}, '
+            f'directory={self.directory})'
+        )
+
+    def __reduce__(self):
+        # Worker processes get an empty copy; entries are shared through the directory
+        return self.__class__, (self.maxsize, self.directory)
+
+    def get(self, key: str) -> Union[Pattern, None]:
+        """
+        Returns the pattern stored under `key`, or None
+        """
+        pattern = self._entries.get(key)
+        if pattern is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return pattern
+
+        if self.directory is not None:
+            pattern = self._read(key)
+            if pattern is not None:
+                self._remember(key, pattern)
+                self.hits += 1
+                return pattern
+
+        self.misses += 1
+
+        return None
+
+    def put(self, key: str, pattern: Pattern) -> None:
+        """
+        Stores a pattern under `key`
+        """
+        self._remember(key, pattern)
+        if self.directory is not None:
+            self._write(key, pattern)
+
+    def clear(self) -> None:
+        """
+        Drops the patterns kept in memory. Files on disk are left alone.
+        """
+        self._entries.clear()
+
+    def _remember(self, key: str, pattern: Pattern) -> None:
+        self._entries[key] = pattern
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / f'{key}.notes'
+
+    def _write(self, key: str, pattern: Pattern) -> None:
+        """
+        Writes the pattern atomically, so readers never see half a file
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(dump_pattern(pattern))
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _read(self, key: str) -> Union[Pattern, None]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fp:
+                data = fp.read()
+        except OSError:
+            return None
+
+        try:
+            return load_pattern(data)
+        except ValueError:
+            # Truncated or corrupt entry: drop it so the section is rendered again
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+
+
+def dump_pattern(pattern: Pattern) -> bytes:
+    """
+    Serializes a pattern as a small JSON header followed by its note arrays
+    (little endian)
+    """
+    notes = pattern.notes
+    if not isinstance(notes, NoteData):
+        notes = notes.materialize()
+
+    header = json.dumps({
+        'tempo': pattern.tempo,
+        'program': int(pattern.program),
+        'channel': pattern.channel,
+        'rest_after': notes.rest_after,
+        'notes': len(notes),
+        'itemsize': array('I').itemsize,
+    }).encode()
+
+    chunks = [MAGIC, struct.pack('<I', len(header)), header]
+    for name, _ in _ARRAYS:
+        values = getattr(notes, name)
+        if sys.byteorder == 'big':
+            values = array(values.typecode, values)
+            values.byteswap()
+        chunks.append(values.tobytes())
+
+    return b''.join(chunks)
+
+
+def load_pattern(data: bytes) -> Pattern:
+    """
+    Reads a pattern written by `dump_pattern`. Raises ValueError when the data is
+    not a complete cached section.
+    """
+    if len(data) < 8 or data[:4] != MAGIC:
+        raise ValueError('Not a cached section')
+
+    size, = struct.unpack_from('<I', data, 4)
+    if 8 + size > len(data):
+        raise ValueError('Cached section header is truncated')
+
+    try:
+        return _load_pattern(data, size, json.loads(data[8:8 + size]))
+    except (KeyError, TypeError, OverflowError, RandsikValidationError) as exc:
+        raise ValueError(f'Cached section is corrupt: {exc!r}') from exc
+
+
+def _load_pattern(data: bytes, size: int, header: dict) -> Pattern:
+    if header['itemsize'] != array('I').itemsize:
+        raise ValueError('Cached section was written on an incompatible platform')
+
+    pos = 8 + size
+    values = {}
+    for name, typecode in _ARRAYS:
+        arr = array(typecode)
+        end = pos + arr.itemsize * header['notes']
+        arr.frombytes(data[pos:end])
+        if sys.byteorder == 'big':
+            arr.byteswap()
+        values[name] = arr
+        pos = end
+
+    if pos != len(data):
+        raise ValueError('Cached section has the wrong size')
+
+    notes = NoteData(**values, rest_after=header['rest_after'])
+
+    return Pattern(
+        notes, tempo=header['tempo'], program=header['program'], channel=header['channel']
+    )
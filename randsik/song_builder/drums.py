@@ -1,39 +1,327 @@
-import math
+import json
+import mmap
 import os
 import pathlib
-import random
+import struct
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Union
 
-from mido import MidiTrack, MidiFile
+from mido import Message, MetaMessage, MidiTrack, MidiFile
+from mido.frozen import FrozenMessage, FrozenMetaMessage, freeze_message
+
+from randsik.profiling import timed
+from randsik.randsik import join_tracks
+from randsik.rng import RNG, get_rng
 
 DRUM_MIDI_FOLDER = pathlib.Path(os.path.dirname(__file__)) / '..' / 'midi' / 'drums'
 
+# Every drum loop read with `DrumLoop.from_file` is treated as four measures long
+MEASURES_PER_LOOP = 4
+
+# Files of an ingested drum library (see `randsik.song_builder.ingest`)
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 1
+
+# Every event of the packed event store: delta time in ticks, status and two data bytes
+EVENT = struct.Struct('<IBBBx')
 
-def select_random_child(path: pathlib.Path) -> pathlib.Path:
+
+def select_random_child(path: pathlib.Path, rng: RNG = None) -> pathlib.Path:
     """
     Selects child of the provided Path object. Raises an error if now children found
     """
-    folders = list(path.iterdir())
+    rng = get_rng(rng)
+    folders = sorted(path.iterdir())
     length = len(folders) - 1
-    random_child = folders[random.randint(0, length)]
+    random_child = folders[rng.randint(0, length)]
 
     if random_child.is_file():
         return random_child
     else:
-        return select_random_child(random_child)
+        return select_random_child(random_child, rng=rng)
+
+
+@dataclass(frozen=True)
+class DrumLoop:
+    """
+    A parsed drum loop
+    """
+    name: str
+    style: str
+    messages: tuple[Union[Message, MetaMessage], ...]
+    ticks: int
+    ticks_per_beat: int
+    measures: int = MEASURES_PER_LOOP
+
+    @classmethod
+    @timed('load_drum_loop', events=lambda loop: len(loop.messages))
+    def from_file(cls, path: pathlib.Path, style: str) -> 'DrumLoop':
+        """
+        Parses the first track of the MIDI file at `path`. The messages are frozen
+        so they can safely be shared by every track the loop is used in.
+        """
+        midi_file = MidiFile(path)
+        messages = tuple(freeze_message(msg) for msg in midi_file.tracks[0])
+
+        return cls(
+            name=path.name,
+            style=style,
+            messages=messages,
+            ticks=sum(msg.time for msg in messages),
+            ticks_per_beat=midi_file.ticks_per_beat,
+        )
+
+
+class EventStore:
+    """
+    Memory mapped packed event store of an ingested drum library. The events of a loop
+    are only decoded when the loop is used.
+    """
+    _open = {}
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = pathlib.Path(path)
+        with open(self.path, 'rb') as fp:
+            size = os.fstat(fp.fileno()).st_size
+            self._buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> 'EventStore':
+        """
+        Returns the store at `path`, mapping it once per process
+        """
+        key = str(path)
+        store = cls._open.get(key)
+        if store is None:
+            store = cls._open[key] = cls(path)
+
+        return store
 
+    def __enter__(self) -> 'EventStore':
+        return self
 
-def drums(measures: int) -> MidiTrack:
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Unmaps the store. A store shared through `open` is forgotten as well.
+        """
+        if self._open.get(str(self.path)) is self:
+            del self._open[str(self.path)]
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._buffer = b''
+
+    def packed(self, offset: int, count: int) -> bytes:
+        """
+        Returns the raw records of `count` events starting at event `offset`
+        """
+        return bytes(self._buffer[offset * EVENT.size:(offset + count) * EVENT.size])
+
+    def messages(self, offset: int, count: int, ticks: int) -> tuple[FrozenMessage, ...]:
+        """
+        Decodes `count` events starting at event `offset`. The loop is closed with an
+        end_of_track message so it lasts exactly `ticks`.
+        """
+        view = memoryview(self._buffer)[offset * EVENT.size:(offset + count) * EVENT.size]
+        messages = []
+        tick = 0
+
+        for delta, status, data1, data2 in EVENT.iter_unpack(view):
+            data = (status, data1) if 0xC0 <= status < 0xE0 else (status, data1, data2)
+            messages.append(FrozenMessage.from_bytes(data, time=delta))
+            tick += delta
+        view.release()
+
+        messages.append(FrozenMetaMessage('end_of_track', time=ticks - tick))
+
+        return tuple(messages)
+
+
+class PackedDrumLoop:
+    """
+    A drum loop of an ingested library. Behaves like a `DrumLoop`, but its messages are
+    read from the event store on first use.
+    """
+    __slots__ = ('name', 'style', 'ticks', 'ticks_per_beat', 'measures', '_store', '_offset',
+                 '_count', '_messages')
+
+    def __init__(
+            self, name: str, style: str, ticks: int, ticks_per_beat: int, measures: int,
+            store: EventStore, offset: int, count: int
+    ) -> None:
+        self.name = name
+        self.style = style
+        self.ticks = ticks
+        self.ticks_per_beat = ticks_per_beat
+        self.measures = measures
+        self._store = store
+        self._offset = offset
+        self._count = count
+        self._messages = None
+
+    def __repr__(self) -> str:
+        return f'PackedDrumLoop(name={self.name!r}, style={self.style!r})'
+
+    def __reduce__(self):
+        return _packed_loop, (
+            self.name, self.style, self.ticks, self.ticks_per_beat, self.measures,
+            str(self._store.path), self._offset, self._count
+        )
+
+    @property
+    def messages(self) -> tuple[FrozenMessage, ...]:
+        if self._messages is None:
+            self._messages = self._store.messages(self._offset, self._count, self.ticks)
+
+        return self._messages
+
+
+def _packed_loop(name, style, ticks, ticks_per_beat, measures, path, offset, count):
+    return PackedDrumLoop(
+        name, style, ticks, ticks_per_beat, measures, EventStore.open(path), offset, count
+    )
+
+
+class DrumLibrary:
+    """
+    Immutable index of parsed drum loops grouped by style (the name of the folder
+    the loop is in, e.g. "rock", "funk" or "blues").
+
+    Loading a library walks the folder and parses every loop once. After that,
+    selecting a loop does not touch the disk. Libraries can be pickled and are
+    inherited by processes forked after they are loaded.
+    """
+    __slots__ = ('_styles',)
+
+    def __init__(self, loops: Mapping[str, Sequence[DrumLoop]]) -> None:
+        styles = {style: tuple(items) for style, items in loops.items() if items}
+        self._styles = MappingProxyType(styles)
+
+    def __len__(self) -> int:
+        return sum(len(loops) for loops in self._styles.values())
+
+    def __repr__(self) -> str:
+        return f'DrumLibrary(styles={tuple(self._styles)}, loops={len(self)})'
+
+    def __reduce__(self):
+        return self.__class__, (dict(self._styles),)
+
+    @classmethod
+    @timed('load_drum_library')
+    def load(cls, folder: pathlib.Path = DRUM_MIDI_FOLDER) -> 'DrumLibrary':
+        """
+        Scans `folder` and parses every loop in it. Every sub folder is a style;
+        files directly inside `folder` are filed under the style "default".
+        """
+        folder = pathlib.Path(folder)
+        loops = {}
+
+        for path in sorted(folder.rglob('*.mid')):
+            parent = path.parent.relative_to(folder)
+            style = parent.parts[0] if parent.parts else 'default'
+            loops.setdefault(style, []).append(DrumLoop.from_file(path, style))
+
+        return cls(loops)
+
+    @classmethod
+    @timed('load_drum_library')
+    def open(cls, directory: Union[str, os.PathLike], time_sig: str = '4/4') -> 'DrumLibrary':
+        """
+        Opens a library created with `randsik.song_builder.ingest.ingest`. The event
+        store is memory mapped, so opening even a large library parses no MIDI files.
+
+        :param directory: directory the library was ingested into
+        :param time_sig: only use loops in this time signature
+        """
+        directory = pathlib.Path(directory)
+        with open(directory / INDEX_FILE) as fp:
+            index = json.load(fp)
+        if index.get('version') != INDEX_VERSION:
+            raise ValueError(f'Unsupported drum index version {index.get("version")}')
+
+        store = EventStore.open(directory / index['events'])
+        loops = {}
+
+        for entry in index['loops']:
+            if entry['time_sig'] != time_sig:
+                continue
+            loops.setdefault(entry['style'], []).append(PackedDrumLoop(
+                pathlib.PurePosixPath(entry['path']).name, entry['style'], entry['ticks'],
+                entry['ticks_per_beat'], entry['measures'], store, entry['offset'],
+                entry['count'],
+            ))
+
+        return cls(loops)
+
+    @property
+    def styles(self) -> tuple[str, ...]:
+        return tuple(self._styles)
+
+    def loops(self, style: str = None) -> tuple[DrumLoop, ...]:
+        """
+        Returns all loops, or only the loops of `style`
+        """
+        if style is None:
+            return tuple(loop for loops in self._styles.values() for loop in loops)
+
+        return self._styles[style]
+
+    def choice(self, style: str = None, rng: RNG = None) -> DrumLoop:
+        """
+        Selects a random loop. When no style is given a random style is picked first,
+        which is the same as how `select_random_child` walks the drum folder.
+        """
+        rng = get_rng(rng)
+        if not self._styles:
+            raise ValueError('Drum library does not contain any loops')
+        if style is None:
+            style = rng.choice(self.styles)
+
+        return rng.choice(self._styles[style])
+
+
+_default_library = None
+
+
+def default_library() -> DrumLibrary:
+    """
+    Returns the library of drum loops that ship with randsik. It is loaded on first
+    use and shared by all later calls.
+    """
+    global _default_library
+
+    if _default_library is None:
+        _default_library = DrumLibrary.load(DRUM_MIDI_FOLDER)
+
+    return _default_library
+
+
+@timed('drums', events=len)
+def drums(
+        measures: int, library: DrumLibrary = None, style: str = None, rng: RNG = None
+) -> MidiTrack:
     """
     Returns random drum track to use. Right this is very basic. It will be improved upon.
 
+    :param measures: number of measures the drum track needs to cover
+    :param library: drum loops to choose from, defaults to the loops that ship with randsik
+    :param style: only use loops of this style (e.g. "rock")
+    :param rng: random number generator to draw from, defaults to the `random` module
+
     TODO: refactor later to reflect different time signatures other than 4/4
     """
-    drum_loops = math.ceil(measures / 4)
-    drum_track = MidiTrack()
+    if library is None:
+        library = default_library()
+    loops = []
+    covered = 0
 
-    for _ in range(drum_loops):
-        midi_file_name = select_random_child(DRUM_MIDI_FOLDER)
-        midi_file = MidiFile(midi_file_name)
-        drum_track += midi_file.tracks[0]
+    while covered < measures:
+        loop = library.choice(style, rng=rng)
+        loops.append(loop.messages)
+        covered += loop.measures
 
-    return drum_track
+    return join_tracks(loops)
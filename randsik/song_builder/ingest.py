@@ -0,0 +1,310 @@
+"""
+Ingests large collections of drum loops into a library that opens instantly.
+
+`DrumLibrary.load` parses every MIDI file of a folder when it is loaded, which is
+fine for the loops that ship with randsik but not for a collection of tens of
+thousands of loops. `ingest` parses a folder once, in parallel, and writes:
+
+- a packed event store: the channel messages of every loop, normalized to
+  `randsik.constants.QUARTER` ticks per beat and without running status, stored as
+  fixed size records (see `randsik.song_builder.drums.EVENT`)
+- an index (JSON) with the style, length and position in the event store of every
+  loop, and the files that could not be read
+
+`DrumLibrary.open` memory maps the event store, so loops are only decoded when
+they are played. Files that can not be parsed (e.g. "running status without
+last_status") or contain no notes are quarantined: they are listed in the index
+with the reason and left out of the library instead of aborting the ingest.
+
+Ingesting into the same directory again only parses files that are new or whose
+modification time or size changed::
+
+    result = ingest('my_loops', 'my_loops.index', workers=8)
+    library = DrumLibrary.open('my_loops.index')
+    create_song(sections, drum_library=library)
+"""
+import json
+import math
+import os
+import pathlib
+import struct
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Union
+
+from mido import MidiFile
+
+from randsik import constants as const
+from randsik import smf
+from randsik.song_builder.drums import EVENT, INDEX_FILE, INDEX_VERSION, EventStore
+from randsik.utils import chunked
+
+# File extensions of the MIDI files picked up by `scan`
+MIDI_SUFFIXES = ('.mid', '.midi')
+
+# Number of files every task of the process pool parses
+CHUNK_SIZE = 32
+
+# Errors mido raises for broken files
+PARSE_ERRORS = (OSError, EOFError, ValueError, KeyError, IndexError, TypeError, struct.error)
+
+
+class LoopError(ValueError):
+    """
+    Raised for a file that is valid MIDI but not a usable drum loop
+    """
+
+
+@dataclass
+class IngestResult:
+    loops: int = 0
+    parsed: int = 0
+    unchanged: int = 0
+    quarantined: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.loops} loops ({self.parsed} parsed, {self.unchanged} unchanged), '
+            f'{self.quarantined} quarantined in {self.seconds:.2f}s'
+        )
+
+
+@dataclass(frozen=True)
+class SourceFile:
+    """
+    A MIDI file found by `scan`
+    """
+    path: str
+    style: str
+    mtime_ns: int
+    size: int
+
+
+def scan(source: Union[str, os.PathLike]) -> list[SourceFile]:
+    """
+    Lists the MIDI files below `source`. Every sub folder of `source` is a style,
+    files directly inside it are filed under the style "default".
+    """
+    source = pathlib.Path(source)
+    files = []
+
+    for root, _, names in os.walk(source):
+        for name in names:
+            if not name.lower().endswith(MIDI_SUFFIXES):
+                continue
+            path = pathlib.Path(root, name)
+            relative = path.relative_to(source)
+            stat = path.stat()
+            files.append(SourceFile(
+                path=relative.as_posix(),
+                style=relative.parts[0] if len(relative.parts) > 1 else 'default',
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+            ))
+
+    return sorted(files, key=lambda file: file.path)
+
+
+def parse_loop(path: Union[str, os.PathLike]) -> dict:
+    """
+    Reads a drum loop and normalizes it: all tracks are merged, times are scaled to
+    `randsik.constants.QUARTER` ticks per beat, only channel messages are kept and the
+    loop is rounded up to whole measures of its time signature.
+
+    :return: the packed events of the loop and its "ticks", "measures", "time_sig" and
+             original "ticks_per_beat"
+    """
+    midi_file = MidiFile(path)
+    ticks_per_beat = midi_file.ticks_per_beat
+    if ticks_per_beat <= 0:
+        raise LoopError('timecode based files are not supported')
+
+    numerator, denominator = 4, 4
+    for msg in midi_file.tracks[0] if midi_file.tracks else ():
+        if msg.type == 'time_signature':
+            numerator, denominator = msg.numerator, msg.denominator
+            break
+
+    events = bytearray()
+    notes = 0
+    previous = 0
+    end = 0
+
+    for tick, event in smf.merge_patterns([[track] for track in midi_file.tracks]):
+        # Round absolute times, so scaling does not add up rounding errors
+        tick = (tick * const.QUARTER + ticks_per_beat // 2) // ticks_per_beat
+        end = tick
+        status = event[0]
+        if status >= 0xF0:
+            continue
+        data = event[1:] + bytes(2 - len(event[1:]))
+        events += EVENT.pack(tick - previous, status, data[0], data[1])
+        previous = tick
+        if status & 0xF0 == 0x90 and data[1]:
+            notes += 1
+
+    if not notes:
+        raise LoopError('no notes')
+
+    ticks_per_measure = const.QUARTER * 4 * numerator // denominator
+    measures = max(1, math.ceil(end / ticks_per_measure))
+
+    return {
+        'events': bytes(events),
+        'ticks': measures * ticks_per_measure,
+        'measures': measures,
+        'time_sig': f'{numerator}/{denominator}',
+        'ticks_per_beat': ticks_per_beat,
+    }
+
+
+def ingest_file(path: Union[str, os.PathLike]) -> Union[dict, str]:
+    """
+    Parses one loop. Runs in worker processes.
+
+    :return: the parsed loop (see `parse_loop`) or, for a broken file, the reason
+    """
+    try:
+        return parse_loop(path)
+    except PARSE_ERRORS as exc:
+        return f'{type(exc).__name__}: {exc}'
+
+
+def ingest_chunk(paths: list[str]) -> list[Union[dict, str]]:
+    return [ingest_file(path) for path in paths]
+
+
+def load_index(directory: Union[str, os.PathLike]) -> Union[dict, None]:
+    """
+    Returns the index of a previous ingest into `directory`, or None
+    """
+    try:
+        with open(pathlib.Path(directory) / INDEX_FILE) as fp:
+            index = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    return index if index.get('version') == INDEX_VERSION else None
+
+
+def ingest(
+        source: Union[str, os.PathLike],
+        directory: Union[str, os.PathLike],
+        workers: int = None,
+        chunk_size: int = CHUNK_SIZE,
+        report: Callable[[SourceFile, str], None] = None,
+) -> IngestResult:
+    """
+    Ingests the drum loops below `source` into `directory`
+
+    :param source: folder of MIDI files, every sub folder is a style
+    :param directory: where the index and event store are written
+    :param workers: number of processes, defaults to the number of CPUs. With 1 the
+                    files are parsed in this process.
+    :param chunk_size: number of files every task of the process pool parses
+    :param report: called with every quarantined file and the reason
+
+    :return: number of loops, parsed, unchanged and quarantined files
+    """
+    began = time.perf_counter()
+    source = pathlib.Path(source)
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    previous = load_index(directory) or {'loops': [], 'quarantine': [], 'events': None}
+    known = {
+        (entry['path'], entry['mtime_ns'], entry['size']): entry
+        for entry in previous['loops'] + previous['quarantine']
+    }
+    old_store = EventStore(directory / previous['events']) if previous['events'] else None
+
+    files = scan(source)
+    changed = [file for file in files if (file.path, file.mtime_ns, file.size) not in known]
+    paths = [str(source / file.path) for file in changed]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(changed) <= chunk_size:
+        parsed = ingest_chunk(paths)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = [
+                item for items in pool.map(ingest_chunk, chunked(paths, chunk_size))
+                for item in items
+            ]
+    parsed = dict(zip(changed, parsed))
+
+    result = IngestResult(parsed=len(changed), unchanged=len(files) - len(changed))
+    index = {'version': INDEX_VERSION, 'events': None, 'loops': [], 'quarantine': []}
+    fd, events_tmp = tempfile.mkstemp(dir=directory, prefix='events-', suffix='.bin')
+
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            offset = 0
+            for file in files:
+                entry = {'path': file.path, 'style': file.style,
+                         'mtime_ns': file.mtime_ns, 'size': file.size}
+                if file in parsed:
+                    loop = parsed[file]
+                    if isinstance(loop, str):
+                        index['quarantine'].append({**entry, 'reason': loop})
+                        if report is not None:
+                            report(file, loop)
+                        continue
+                    events = loop.pop('events')
+                    entry.update(loop)
+                else:
+                    old = known[(file.path, file.mtime_ns, file.size)]
+                    if 'reason' in old:
+                        index['quarantine'].append(old)
+                        continue
+                    events = old_store.packed(old['offset'], old['count'])
+                    entry.update({name: old[name] for name in (
+                        'ticks', 'measures', 'time_sig', 'ticks_per_beat')})
+
+                count = len(events) // EVENT.size
+                entry.update({'offset': offset, 'count': count})
+                fp.write(events)
+                offset += count
+                index['loops'].append(entry)
+
+        index['events'] = pathlib.Path(events_tmp).name
+        _write_index(directory, index)
+    except BaseException:
+        os.unlink(events_tmp)
+        raise
+    finally:
+        # Unmapped before the previous store is replaced or removed
+        if old_store is not None:
+            old_store.close()
+
+    # The previous store may still be mapped by running processes, which keep their
+    # view of it after it is removed
+    if previous['events'] and previous['events'] != index['events']:
+        try:
+            os.unlink(directory / previous['events'])
+        except OSError:
+            pass
+
+    result.loops = len(index['loops'])
+    result.quarantined = len(index['quarantine'])
+    result.seconds = time.perf_counter() - began
+
+    return result
+
+
+def _write_index(directory: pathlib.Path, index: dict) -> None:
+    """
+    Replaces the index atomically, so readers see either the old or the new library
+    """
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(index, fp, separators=(',', ':'))
+        os.replace(tmp, directory / INDEX_FILE)
+    except BaseException:
+        os.unlink(tmp)
+        raise
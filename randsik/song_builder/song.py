@@ -1,16 +1,28 @@
+import heapq
 import random
 from collections import defaultdict
-from collections.abc import Sequence, Mapping, Iterator
+from collections.abc import Sequence, Mapping, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
 from dataclasses import dataclass
+from operator import itemgetter
+from typing import BinaryIO, Union
 
-from mido import MidiFile, MidiTrack
+from mido import MetaMessage, MidiFile, MidiTrack
 
 from randsik import constants as con
-from randsik import generate, Pattern, Note
-from randsik.song_builder.drums import drums
+from randsik import smf
+from randsik import generate, Pattern, Rest
+from randsik.profiling import timed
+from randsik.randsik import join_tracks, time_sig_to_ppm
+from randsik.rng import RNG, derive_seed, get_rng
+from randsik.song_builder.cache import SectionCache, section_key
+from randsik.song_builder.drums import DrumLibrary, drums
 
 Instrument_Seq = Sequence[con.Instrument]
 
+# Songs are always written in 4/4 for now
+TIME_SIG = '4/4'
+
 
 @dataclass(frozen=True)
 class SongSection:
@@ -22,21 +34,34 @@ class SongSection:
     octaves: int
     instruments: Instrument_Seq
 
+    def __post_init__(self) -> None:
+        # A tuple keeps sections hashable and their cache keys stable
+        object.__setattr__(self, 'instruments', tuple(self.instruments))
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state: tuple) -> None:
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
 
 Section_Seq = Sequence[SongSection]
 
 
-def get_random_scale_degrees(octaves: int) -> Sequence[int]:
-    num_notes = random.randint(2, octaves * 7)
+def get_random_scale_degrees(octaves: int, rng: RNG = None) -> Sequence[int]:
+    rng = get_rng(rng)
+    num_notes = rng.randint(2, octaves * 7)
 
-    return tuple(random.randint(1, octaves * 7) for _ in range(num_notes))
+    return tuple(rng.randint(1, octaves * 7) for _ in range(num_notes))
 
 
-def get_random_note_lengths() -> Sequence[int]:
+def get_random_note_lengths(rng: RNG = None) -> Sequence[int]:
+    rng = get_rng(rng)
     note_lengths = (con.QUARTER, con.EIGHTH, con.WHOLE, con.HALF, con.SIXTEENTH, con.THIRTYSECOND)
     length = len(note_lengths)
 
-    return tuple(random.choices(note_lengths, k=random.randint(2, length)))
+    return tuple(rng.choices(note_lengths, k=rng.randint(2, length)))
 
 
 def get_section_instrument_map(sections: Section_Seq) -> Mapping[con.Instrument, list[bool]]:
@@ -56,58 +81,356 @@ def get_section_instrument_map(sections: Section_Seq) -> Mapping[con.Instrument,
 
 def get_rest_measures(measures: int, instrument: con.Instrument, tempo: int, channel: int) -> Pattern:
     """
-    Returns a pattern with whole notes for every measure.
-    The notes have a 0 velocity and therefore should not be audible.
-    These are the messages sent when the instrument is not playing.
-
-    TODO: This feels a little hacky. It might be worth it to come back and change.
+    Returns a pattern without notes that is silent for every measure.
+    These are the measures where the instrument is not playing. The pattern only sets
+    the tempo of the section; the silence is carried as delta time on the next event
+    of the track.
     """
-    sequence = [Note(velocity=1, duration=con.WHOLE, value=1)] * measures
+    sequence = [Rest(measures * time_sig_to_ppm(TIME_SIG))]
     pattern = Pattern(sequence, program=instrument.value, tempo=tempo, channel=channel)
 
     return pattern
 
 
-def create_song(sections: Section_Seq) -> MidiFile:
+@timed('create_song', events=lambda midi_file: sum(len(t) for t in midi_file.tracks))
+def create_song(
+        sections: Section_Seq,
+        drum_library: DrumLibrary = None,
+        executor: Executor = None,
+        workers: int = None,
+        seed: int = None,
+        rng: RNG = None,
+        cache: SectionCache = None,
+        midi_type: int = 1,
+) -> MidiFile:
     """
     Function that returns a song based on the passed in configuration.
+
+    When `executor` or `workers` is given, every instrument track and the drum track
+    are generated in parallel (see `song_tracks`).
+
+    :param sections: sections of the song
+    :param drum_library: drum loops to choose from, defaults to the loops that ship with randsik
+    :param executor: executor to generate the tracks with
+    :param workers: generate the tracks in a process pool with this many processes
+    :param seed: seed that makes the song reproducible
+    :param rng: random number generator to draw the song seed from when `seed` is not given
+    :param cache: render every distinct section once and reuse it (see `song_tracks`)
+    :param midi_type: 1 for one track per instrument plus a drum track, 0 for all of
+                      them merged into a single track (see `merge_tracks`)
     """
-    midi_file = MidiFile()
-    instrument_map = get_section_instrument_map(sections)
+    if midi_type not in (0, 1):
+        raise ValueError('"midi_type" must be 0 or 1')
 
-    for idx, (instrument, incl_sect) in enumerate(instrument_map.items()):
-        midi_file.tracks.append(track(instrument, idx, zip(incl_sect, sections)))
+    midi_file = MidiFile(type=midi_type)
+    song = song_tracks(
+        sections, drum_library, executor=executor, workers=workers, seed=seed, rng=rng,
+        materialize=True, cache=cache
+    )
 
-    measures = sum(sect.measures for sect in sections)
-    midi_file.tracks.append(drums(measures))
+    if midi_type == 0:
+        midi_file.tracks.append(merge_tracks(song))
+        return midi_file
+
+    for song_track in song:
+        midi_file.tracks.append(join_tracks(song_track))
 
     return midi_file
 
 
-def track(inst: con.Instrument, channel: int, sections: Iterator) -> MidiTrack:
+def song_to_bytes(
+        sections: Section_Seq,
+        drum_library: DrumLibrary = None,
+        executor: Executor = None,
+        workers: int = None,
+        seed: int = None,
+        rng: RNG = None,
+        cache: SectionCache = None,
+        midi_type: int = 1,
+) -> bytes:
+    """
+    Returns the same song as `create_song` as the bytes of a MIDI file. The bytes are
+    written straight from the pattern note data without building mido tracks. With
+    `midi_type` 0 the tracks are merged on the fly with `smf.merge_patterns`.
+    """
+    if midi_type not in (0, 1):
+        raise ValueError('"midi_type" must be 0 or 1')
+
+    return smf.encode_file(
+        song_tracks(
+            sections, drum_library, executor=executor, workers=workers, seed=seed, rng=rng,
+            cache=cache
+        ),
+        midi_type=midi_type,
+    )
+
+
+def save_song(
+        sections: Section_Seq,
+        file: Union[str, BinaryIO],
+        drum_library: DrumLibrary = None,
+        executor: Executor = None,
+        workers: int = None,
+        seed: int = None,
+        rng: RNG = None,
+        cache: SectionCache = None,
+        midi_type: int = 1,
+) -> None:
+    """
+    Writes the song for the passed in configuration to a MIDI file
+
+    :param sections: sections of the song
+    :param file: file name or file object opened in binary mode
+    :param drum_library: drum loops to choose from, defaults to the loops that ship with randsik
+    :param executor: executor to generate the tracks with
+    :param workers: generate the tracks in a process pool with this many processes
+    :param seed: seed that makes the song reproducible
+    :param rng: random number generator to draw the song seed from when `seed` is not given
+    :param cache: render every distinct section once and reuse it (see `song_tracks`)
+    :param midi_type: 1 for one track per instrument, 0 for a single merged track
+    """
+    smf.write_file(
+        file,
+        song_to_bytes(
+            sections, drum_library, executor=executor, workers=workers, seed=seed, rng=rng,
+            cache=cache, midi_type=midi_type
+        )
+    )
+
+
+def merge_tracks(tracks: Iterable[Iterable[Union[Pattern, MidiTrack]]]) -> MidiTrack:
+    """
+    Merges the tracks of a song into the single track of a type 0 file.
+
+    The messages of every track are merged by absolute tick with a heap, reading one
+    message per track at a time, so no absolute time copy of the tracks is made.
+    Messages at the same tick keep the order of their tracks, which gives the same
+    result as `mido.merge_tracks` on the tracks of the type 1 song.
+
+    :param tracks: every track is a list of patterns and/or mido tracks, as returned
+                   by `song_tracks`
+    """
+    merged = MidiTrack()
+    previous = end = 0
+
+    for tick, msg in heapq.merge(*map(_track_messages, tracks), key=itemgetter(0)):
+        if msg is None:
+            end = tick
+        else:
+            merged.append(msg.copy(time=tick - previous))
+            previous = tick
+
+    merged.append(MetaMessage('end_of_track', time=end - previous))
+
+    return merged
+
+
+def _track_messages(items: Iterable[Union[Pattern, MidiTrack]]) -> Iterator[tuple]:
+    """
+    Yields the messages of a track as (absolute tick, message) pairs, followed by
+    (end of the track, None)
+    """
+    tick = 0
+
+    for item in items:
+        for msg in item.track if isinstance(item, Pattern) else item:
+            tick += msg.time
+            if msg.type != 'end_of_track':
+                yield tick, msg
+
+    yield tick, None
+
+
+@timed('song_tracks')
+def song_tracks(
+        sections: Section_Seq,
+        drum_library: DrumLibrary = None,
+        executor: Executor = None,
+        workers: int = None,
+        seed: int = None,
+        rng: RNG = None,
+        materialize: bool = False,
+        cache: SectionCache = None,
+) -> list[list[Union[Pattern, MidiTrack]]]:
+    """
+    Returns the tracks of a song. Every track is a list of the patterns played by one
+    instrument, the last track holds the drums.
+
+    When a `seed` (or `rng`) is given, every section of every instrument and the drum
+    track draw from their own random stream derived from the song seed, so the song
+    only depends on the seed and not on how many workers were used. With an `executor`
+    or `workers` the tracks are generated in parallel and put back together in the
+    same order; a seed is picked at random if none is given.
+
+    With a `cache`, the stream of a section is derived from the section's fields
+    instead of its position, so repeated sections (same measures, mode, tempo, key,
+    octaves and instruments) play the same notes and are only generated once per
+    instrument. A seed is picked at random if none is given. Worker processes start
+    with an empty copy of the cache and only share the entries it stores on disk.
+
+    :param sections: sections of the song
+    :param drum_library: drum loops to choose from, defaults to the loops that ship with randsik
+    :param executor: executor to generate the tracks with
+    :param workers: generate the tracks in a process pool with this many processes
+    :param seed: seed that makes the song reproducible
+    :param rng: random number generator to draw the song seed from when `seed` is not given
+    :param materialize: build the MIDI track of every pattern while generating it
+    :param cache: cache of rendered sections
+    """
+    instrument_map = get_section_instrument_map(sections)
+    measures = sum(sect.measures for sect in sections)
+
+    if executor is None and workers is None and seed is None and rng is None and cache is None:
+        tracks = []
+        for idx, (instrument, incl_sect) in enumerate(instrument_map.items()):
+            tracks.append(track_patterns(instrument, idx, zip(incl_sect, sections)))
+        tracks.append([drums(measures, library=drum_library)])
+
+        return tracks
+
+    if seed is None:
+        seed = get_rng(rng).getrandbits(64)
+
+    tasks = [
+        (
+            _render_track, instrument, idx, tuple(zip(incl_sect, sections)), seed, materialize,
+            cache
+        )
+        for idx, (instrument, incl_sect) in enumerate(instrument_map.items())
+    ]
+    tasks.append((_render_drums, measures, drum_library, seed))
+
+    if executor is None and workers is None:
+        return [func(*args) for func, *args in tasks]
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return _run_tasks(pool, tasks)
+
+    return _run_tasks(executor, tasks)
+
+
+def _run_tasks(executor: Executor, tasks: list) -> list:
+    """
+    Runs the tasks on `executor` and returns their results in order
+    """
+    futures = [executor.submit(func, *args) for func, *args in tasks]
+
+    return [future.result() for future in futures]
+
+
+def _render_track(
+        inst: con.Instrument,
+        channel: int,
+        sections: Sequence,
+        seed: int,
+        materialize: bool,
+        cache: SectionCache = None,
+) -> list[Pattern]:
+    """
+    Generates the patterns of a single track. Runs in worker processes.
+    """
+    patterns = track_patterns(inst, channel, sections, seed=seed, cache=cache)
+
+    if materialize:
+        for pattern in patterns:
+            pattern.track
+
+    return patterns
+
+
+def _render_drums(measures: int, drum_library: DrumLibrary, seed: int) -> list[MidiTrack]:
+    """
+    Generates the drum track. Runs in worker processes.
+    """
+    rng = random.Random(derive_seed(seed, 'drums'))
+
+    return [drums(measures, library=drum_library, rng=rng)]
+
+
+def track(
+        inst: con.Instrument,
+        channel: int,
+        sections: Iterator,
+        rng: RNG = None,
+        seed: int = None,
+        cache: SectionCache = None,
+) -> MidiTrack:
     """
     Returns a randomly programmed track.
     """
-    full_track = MidiTrack()
+    return join_tracks(
+        track_patterns(inst, channel, sections, rng=rng, seed=seed, cache=cache)
+    )
+
+
+def track_patterns(
+        inst: con.Instrument,
+        channel: int,
+        sections: Iterator,
+        rng: RNG = None,
+        seed: int = None,
+        cache: SectionCache = None,
+) -> list[Pattern]:
+    """
+    Returns the randomly programmed patterns of a track, one per section.
+
+    :param inst: instrument of the track
+    :param channel: channel of the track
+    :param sections: pairs of (whether the instrument plays, section)
+    :param rng: random number generator shared by all sections
+    :param seed: song seed; every section draws from its own stream derived from the
+                 seed, the section's position and the channel
+    :param cache: cache of rendered sections. Requires a `seed`; sections are then
+                  looked up by their fields instead of their position.
+    """
+    if cache is not None and seed is None:
+        raise ValueError('A "seed" is required to cache sections')
 
-    for include, section in sections:
+    patterns = []
+
+    for idx, (include, section) in enumerate(sections):
         if include is False:
             pattern = get_rest_measures(section.measures, inst, section.tempo, channel)
+        elif cache is not None:
+            key = section_key(section, inst, channel, seed)
+            pattern = cache.get(key)
+            if pattern is None:
+                section_rng = random.Random(derive_seed(seed, key))
+                pattern = section_pattern(section, inst, channel, rng=section_rng)
+                cache.put(key, pattern)
         else:
-            note_lengths = get_random_note_lengths()
-            pattern = generate(
-                section.key,
-                mode=section.mode,
-                octaves=section.octaves,
-                measures=section.measures,
-                time_sig='4/4',
-                tempo=section.tempo,
-                scale_degrees=get_random_scale_degrees(section.octaves),
-                channel=channel,
-                note_lengths=note_lengths,
-                program=inst,
-                velocity=80
-            )
-        full_track += pattern.track
-
-    return full_track
+            if seed is not None:
+                section_rng = random.Random(derive_seed(seed, idx, channel))
+            else:
+                section_rng = get_rng(rng)
+            pattern = section_pattern(section, inst, channel, rng=section_rng)
+        patterns.append(pattern)
+
+    return patterns
+
+
+@timed('section_pattern', notes=lambda pattern: len(pattern.notes))
+def section_pattern(
+        section: SongSection, inst: con.Instrument, channel: int, rng: RNG = None
+) -> Pattern:
+    """
+    Returns a randomly programmed pattern for one instrument in one section.
+    """
+    rng = get_rng(rng)
+    note_lengths = get_random_note_lengths(rng=rng)
+
+    return generate(
+        section.key,
+        mode=section.mode,
+        octaves=section.octaves,
+        measures=section.measures,
+        time_sig=TIME_SIG,
+        tempo=section.tempo,
+        scale_degrees=get_random_scale_degrees(section.octaves, rng=rng),
+        channel=channel,
+        note_lengths=note_lengths,
+        program=inst,
+        velocity=80,
+        rng=rng,
+    )
@@ -0,0 +1,270 @@
+"""
+Writes songs to disk one section at a time.
+
+`create_song` keeps the whole song in memory until it is saved. The `SongWriter`
+in this module instead renders every section as it is added and writes its events
+straight to the output, so memory stays bounded by a single section no matter how
+long the song (or how many sections an iterable yields) is.
+
+The output is a type 0 MIDI file: all instruments and the drums are merged into a
+single track. The length of that track is patched in when the writer is closed,
+so the output has to be seekable.
+"""
+import heapq
+import random
+import struct
+from collections.abc import Iterable, Iterator
+from operator import itemgetter
+from typing import BinaryIO, Union
+
+from randsik import constants as con
+from randsik import smf
+from randsik.randsik import time_sig_to_ppm
+from randsik.rng import RNG, derive_seed, get_rng
+from randsik.song_builder.drums import DrumLibrary, default_library
+from randsik.song_builder.song import TIME_SIG, SongSection, section_pattern
+
+
+class SongWriter:
+    """
+    Renders song sections and writes them to a MIDI file as they are added.
+
+    Instruments get a channel the first time they appear (channel 9 is left to the
+    drums). Sections an instrument does not play in produce no events at all.
+
+    Usage::
+
+        with SongWriter('song.mid', seed=1) as writer:
+            for section in sections:
+                writer.write_section(section)
+    """
+
+    def __init__(
+            self,
+            file: Union[str, BinaryIO],
+            drum_library: DrumLibrary = None,
+            seed: int = None,
+            rng: RNG = None,
+            drums: bool = True,
+    ) -> None:
+        """
+        :param file: file name or seekable file object opened in binary mode
+        :param drum_library: drum loops to choose from, defaults to the loops that ship
+                             with randsik
+        :param seed: seed that makes the song reproducible
+        :param rng: random number generator to draw from when `seed` is not given
+        :param drums: whether to add a drum part
+        """
+        if hasattr(file, 'write'):
+            self._file = file
+            self._owns_file = False
+        else:
+            self._file = open(file, 'wb')
+            self._owns_file = True
+
+        if not self._file.seekable():
+            raise ValueError('SongWriter needs a seekable file')
+
+        self._seed = seed
+        self._rng = get_rng(rng)
+        self._encoder = smf.TrackEncoder()
+        self._channels = {}
+        self._tempo = None
+        self._tick = 0
+        self._section_start = 0
+        self._section_idx = 0
+        self._track_length = 0
+        self._closed = False
+        # Drum notes sounding at the end of the last section, (status, note) -> count
+        self._held_drums = {}
+
+        if drums:
+            library = drum_library if drum_library is not None else default_library()
+            drum_rng = random.Random(derive_seed(seed, 'drums')) if seed is not None else self._rng
+            self._drum_events = _peekable(drum_events(library, drum_rng))
+        else:
+            self._drum_events = None
+
+        self._file.write(smf.header(1, midi_type=0))
+        self._file.write(b'MTrk')
+        self._length_pos = self._file.tell()
+        self._file.write(struct.pack('>L', 0))
+
+    def __enter__(self) -> 'SongWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def ticks(self) -> int:
+        """Length of the song written so far in ticks"""
+        return self._section_start
+
+    def write_section(self, section: SongSection) -> None:
+        """
+        Renders a section and writes its events to the file
+        """
+        if self._closed:
+            raise ValueError('SongWriter is closed')
+
+        start = self._section_start
+        end = start + section.measures * time_sig_to_ppm(TIME_SIG)
+        sources = [self._section_header(section, start)]
+
+        for inst in dict.fromkeys(section.instruments):
+            channel = self._channel(inst)
+            if self._seed is not None:
+                rng = random.Random(derive_seed(self._seed, self._section_idx, channel))
+            else:
+                rng = self._rng
+            pattern = section_pattern(section, inst, channel, rng=rng)
+            sources.append(smf.pattern_events(pattern, start))
+
+        if self._drum_events is not None:
+            sources.append(self._track_drums(self._drum_events.take_until(end)))
+
+        for tick, event in heapq.merge(*sources, key=itemgetter(0)):
+            self._encoder.add_event(tick - self._tick, event)
+            self._tick = tick
+
+        self._write(self._encoder.flush())
+        self._section_start = end
+        self._section_idx += 1
+
+    def close(self) -> None:
+        """
+        Ends the track and patches its length in the header of the track chunk
+        """
+        if self._closed:
+            return
+
+        # Drum notes cut off by the end of the song are released before it ends
+        for (channel, note), count in self._held_drums.items():
+            for _ in range(count):
+                self._encoder.add_event(
+                    self._section_start - self._tick, bytes((smf.NOTE_OFF | channel, note, 0))
+                )
+                self._tick = self._section_start
+        self._held_drums.clear()
+
+        self._encoder.add_event(self._section_start - self._tick, smf.META_END_OF_TRACK)
+        self._write(self._encoder.flush())
+
+        end = self._file.tell()
+        self._file.seek(self._length_pos)
+        self._file.write(struct.pack('>L', self._track_length))
+        self._file.seek(end)
+        self._closed = True
+
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._track_length += len(data)
+
+    def _track_drums(self, events: Iterator[tuple[int, bytes]]) -> Iterator[tuple[int, bytes]]:
+        """
+        Passes drum events through, keeping track of the notes they leave sounding
+        """
+        held = self._held_drums
+
+        for tick, event in events:
+            kind = event[0] & 0xF0
+            if kind == smf.NOTE_ON or kind == smf.NOTE_OFF:
+                key = (event[0] & 0x0F, event[1])
+                if kind == smf.NOTE_ON and event[2]:
+                    held[key] = held.get(key, 0) + 1
+                elif held.get(key):
+                    held[key] -= 1
+                    if not held[key]:
+                        del held[key]
+            yield tick, event
+
+    def _channel(self, inst: con.Instrument) -> int:
+        """
+        Returns the channel of an instrument, assigning the next free one on first use
+        """
+        channel = self._channels.get(inst)
+
+        if channel is None:
+            channel = len(self._channels)
+            if channel >= con.DRUM_CHANNEL:
+                channel += 1
+            if channel > 15:
+                raise ValueError('A song can not have more than 15 instruments')
+            self._channels[inst] = channel
+
+        return channel
+
+    def _section_header(self, section: SongSection, start: int) -> list[tuple[int, bytes]]:
+        """
+        Returns the tempo and program changes needed at the start of a section
+        """
+        events = []
+
+        if section.tempo != self._tempo:
+            events.append((start, smf.META_SET_TEMPO + smf.tempo_bytes(section.tempo)))
+            self._tempo = section.tempo
+
+        for inst in dict.fromkeys(section.instruments):
+            if inst not in self._channels:
+                channel = self._channel(inst)
+                events.append((start, bytes((smf.PROGRAM_CHANGE | channel, inst.value - 1))))
+
+        return events
+
+
+def drum_events(library: DrumLibrary, rng: RNG = None) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields the events of randomly selected drum loops, one after another, forever, as
+    (absolute tick, message bytes) pairs
+    """
+    tick = 0
+
+    while True:
+        for msg in library.choice(rng=rng).messages:
+            tick += msg.time
+            if msg.type != 'end_of_track':
+                yield tick, bytes(msg.bytes())
+
+
+def write_song_stream(
+        sections: Iterable[SongSection],
+        file: Union[str, BinaryIO],
+        drum_library: DrumLibrary = None,
+        seed: int = None,
+        rng: RNG = None,
+) -> int:
+    """
+    Writes every section of `sections` to `file` as soon as it is rendered.
+    `sections` may be any iterable, e.g. a generator.
+
+    :return: length of the song in ticks
+    """
+    with SongWriter(file, drum_library=drum_library, seed=seed, rng=rng) as writer:
+        for section in sections:
+            writer.write_section(section)
+
+    return writer.ticks
+
+
+class _peekable:
+    """
+    Wraps an iterator of (tick, event) pairs so events can be taken up to a tick
+    """
+
+    def __init__(self, iterator: Iterator[tuple[int, bytes]]) -> None:
+        self._iterator = iterator
+        self._next = next(iterator, None)
+
+    def take_until(self, tick: int) -> Iterator[tuple[int, bytes]]:
+        """
+        Yields all events before `tick`
+        """
+        while self._next is not None and self._next[0] < tick:
+            yield self._next
+            self._next = next(self._iterator, None)
@@ -0,0 +1,12 @@
+"""
+Small helpers shared by the modules that split work between processes.
+"""
+from collections.abc import Iterator, Sequence
+
+
+def chunked(items: Sequence, size: int) -> Iterator[Sequence]:
+    """
+    Splits `items` into consecutive slices of at most `size` items
+    """
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
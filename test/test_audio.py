@@ -0,0 +1,85 @@
+"""
+Tests for `randsik.audio` module.
+"""
+import wave
+
+import pytest
+
+from randsik import constants as con
+from randsik import QUARTER, Pattern, generate
+from randsik.randsik import pulses_to_seconds
+from randsik.song_builder.song import SongSection, create_song
+
+np = pytest.importorskip('numpy')
+
+from randsik.audio import (  # noqa: E402
+    DRUM_VOICE, SAMPLE_RATE, VOICES, Notes, render, render_array, render_many, voice
+)
+
+
+def test_pattern_notes():
+    """
+    Test that note times follow `pulses_to_seconds`
+    """
+    pattern = Pattern.from_arrays([60, 64], 100, [QUARTER, QUARTER], rest=[0, QUARTER], tempo=90)
+    notes = Notes.from_pattern(pattern)
+
+    assert list(notes.start) == [0.0, pulses_to_seconds(2 * QUARTER, 90)]
+    assert list(notes.end) == [pulses_to_seconds(QUARTER, 90), pulses_to_seconds(3 * QUARTER, 90)]
+
+
+def test_trailing_rest_is_rendered():
+    """
+    Test that the rest after the last note is kept as silence
+    """
+    pattern = Pattern.from_arrays([60], 100, [QUARTER], rest_after=2 * QUARTER, tempo=120)
+    audio = render_array(pattern)
+
+    assert len(audio) == int(np.ceil(pulses_to_seconds(3 * QUARTER, 120) * SAMPLE_RATE))
+    assert not audio[-SAMPLE_RATE // 2:].any()
+
+
+def test_song_notes_match_patterns():
+    """
+    Test that the notes of a song follow its tempo and every family gets its voice
+    """
+    section = SongSection(
+        measures=2, mode='dorian', tempo=92, key='D3', octaves=1,
+        instruments=(con.Bass.SYNTH_BASS_1, con.SynthPad.PAD_5_BOWED)
+    )
+    notes = Notes.from_midi_file(create_song([section], seed=1))
+
+    drums = np.array([notes.voices[idx] is DRUM_VOICE for idx in notes.voice_idx])
+
+    # Drum loops may run past the end of the instruments
+    assert notes.end[~drums].max() == pytest.approx(pulses_to_seconds(2 * con.WHOLE, 92))
+    assert {VOICES['Bass'], VOICES['SynthPad'], DRUM_VOICE} == set(notes.voices)
+    assert voice(con.Bass.SYNTH_BASS_1.value, channel=9) is DRUM_VOICE
+
+
+def test_chunks_match_whole_rendering(tmp_path):
+    """
+    Test that rendering in small chunks writes the same audio as rendering at once
+    """
+    pattern = generate('C4', measures=4, tempo=140, seed=3)
+    whole = render_array(pattern)
+    seconds = render(pattern, tmp_path / 'pattern.wav', chunk_size=1000)
+
+    with wave.open(str(tmp_path / 'pattern.wav')) as fp:
+        frames = np.frombuffer(fp.readframes(fp.getnframes()), dtype='<i2')
+
+    assert seconds == pytest.approx(len(whole) / SAMPLE_RATE)
+    assert np.array_equal(frames, (whole * 32767).astype('<i2'))
+    assert 0 < np.abs(whole).max() < 1
+
+
+def test_render_many(tmp_path):
+    """
+    Test that patterns rendered in parallel are the same as rendered one by one
+    """
+    patterns = [generate('C4', seed=seed) for seed in range(4)]
+    paths = [tmp_path / f'{idx}.wav' for idx in range(4)]
+    lengths = render_many(zip(patterns, paths), workers=2)
+
+    assert lengths == [render(pattern, tmp_path / 'one.wav') for pattern in patterns]
+    assert paths[1].read_bytes() != paths[2].read_bytes()
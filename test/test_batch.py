@@ -0,0 +1,79 @@
+"""
+Tests for `randsik.batch` and `randsik.cli` modules.
+"""
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from randsik import batch, cli
+from randsik.constants import Bass, Piano
+
+GENERATE_SPEC = {'generate': {'note': 'C4', 'mode': 'dorian', 'measures': 2}}
+SONG_SPEC = {'song': [
+    {'measures': 2, 'mode': 'ionian', 'tempo': 100, 'key': 'C3', 'octaves': 1,
+     'instruments': ['Bass.ACOUSTIC_BASS', 1]},
+]}
+
+
+def read_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def test_shards_match_whole_batch(tmp_path):
+    """
+    Test that the shards of a batch add up to the whole batch, whatever the number of workers
+    """
+    whole = batch.run_batch(GENERATE_SPEC, 10, tmp_path / 'all.zip', workers=1, seed=3)
+    batch.run_batch(GENERATE_SPEC, 10, tmp_path / 'a.zip', workers=2, seed=3, shards=2)
+    batch.run_batch(GENERATE_SPEC, 10, tmp_path / 'b.zip', workers=1, seed=3, shard=1, shards=2,
+                    chunk_size=3)
+
+    files = read_zip(tmp_path / 'all.zip')
+    assert whole.items == 10 and whole.bytes == sum(len(data) for data in files.values())
+    assert sorted(files) == [f'{idx}.mid' for idx in range(10)]
+    assert {**read_zip(tmp_path / 'a.zip'), **read_zip(tmp_path / 'b.zip')} == files
+
+
+def test_song_spec_outputs(tmp_path):
+    """
+    Test that songs can be written to a directory and a tar file
+    """
+    batch.run_batch(SONG_SPEC, 3, tmp_path / 'songs', workers=1, seed=1)
+    batch.run_batch(SONG_SPEC, 3, tmp_path / 'songs.tar.gz', workers=1, seed=1)
+
+    with tarfile.open(tmp_path / 'songs.tar.gz') as archive:
+        for name in archive.getnames():
+            assert archive.extractfile(name).read() == (tmp_path / 'songs' / name).read_bytes()
+
+
+def test_get_instrument():
+    """
+    Test that instruments can be given by program number or name
+    """
+    assert batch.get_instrument(1) is Piano.ACOUSTIC_GRAND_PIANO
+    assert batch.get_instrument('Bass.ACOUSTIC_BASS') is Bass.ACOUSTIC_BASS
+    assert batch.get_instrument('ACOUSTIC_BASS') is Bass.ACOUSTIC_BASS
+
+    with pytest.raises(ValueError):
+        batch.get_instrument('Piano.ACOUSTIC_BASS')
+    with pytest.raises(ValueError):
+        batch.validate_spec({})
+
+
+def test_cli_batch(tmp_path, capsys):
+    """
+    Test the `randsik batch` command
+    """
+    spec = tmp_path / 'spec.json'
+    spec.write_text(json.dumps(GENERATE_SPEC))
+
+    code = cli.main([
+        'batch', str(spec), '-n', '4', '-o', str(tmp_path / 'out.zip'), '-j', '1', '--shard', '1/2'
+    ])
+
+    assert code == 0
+    assert sorted(read_zip(tmp_path / 'out.zip')) == ['1.mid', '3.mid']
+    assert '2 files' in capsys.readouterr().out
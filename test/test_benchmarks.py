@@ -0,0 +1,42 @@
+"""
+Tests for the `benchmarks` package.
+"""
+from benchmarks import runner
+from benchmarks.cases import CASES, Case
+
+
+def test_cases_run(monkeypatch):
+    """
+    Test that every case runs at its smallest size
+    """
+    monkeypatch.setattr(runner, 'MIN_TIME', 0)
+    smallest = [Case(case.name, case.setup, case.sizes[:1]) for case in CASES]
+
+    results = runner.run(smallest, repeat=1, report=None)
+
+    assert [result.name for result in results] == [case.name for case in CASES]
+    assert all(result.time > 0 and result.peak_memory > 0 for result in results)
+
+
+def test_compare(tmp_path):
+    """
+    Test that results worse than the baseline by more than the threshold are reported
+    """
+    baseline = [
+        runner.Result('fast', 1, time=1.0, mean=1.0, runs=1, peak_memory=100),
+        runner.Result('slow', 1, time=1.0, mean=1.0, runs=1, peak_memory=100),
+    ]
+    path = tmp_path / 'baseline.json'
+    runner.save(baseline, path)
+
+    current = [
+        runner.Result('fast', 1, time=1.1, mean=1.1, runs=1, peak_memory=100),
+        runner.Result('slow', 1, time=2.0, mean=2.0, runs=1, peak_memory=300),
+        runner.Result('new', 1, time=9.0, mean=9.0, runs=1, peak_memory=900),
+    ]
+    regressions = runner.compare(current, runner.load(path), threshold=0.25)
+
+    assert [(r.key, r.metric) for r in regressions] == [
+        ('slow/1', 'time'), ('slow/1', 'peak_memory')
+    ]
+    assert regressions[0].ratio == 2.0
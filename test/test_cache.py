@@ -0,0 +1,152 @@
+"""
+Tests for `randsik.song_builder.cache` module.
+"""
+import pickle
+
+import pytest
+
+from randsik import constants as con
+from randsik import generate
+from randsik.song_builder.cache import SectionCache, dump_pattern, load_pattern, section_key
+from randsik.song_builder.song import SongSection, song_to_bytes
+
+VERSE = SongSection(
+    measures=2, mode='dorian', tempo=92, key='D3', octaves=1,
+    instruments=[con.Bass.SYNTH_BASS_1, con.SynthPad.PAD_5_BOWED]
+)
+CHORUS = SongSection(
+    measures=2, mode='ionian', tempo=92, key='D3', octaves=1,
+    instruments=(con.Bass.SYNTH_BASS_1,)
+)
+SONG = (VERSE, CHORUS, VERSE, CHORUS)
+
+
+def test_section_instruments_are_a_tuple():
+    """
+    Test that sections created with a list of instruments are hashable
+    """
+    assert isinstance(VERSE.instruments, tuple)
+    assert hash(VERSE) == hash(SongSection(**{
+        'measures': 2, 'mode': 'dorian', 'tempo': 92, 'key': 'D3', 'octaves': 1,
+        'instruments': (con.Bass.SYNTH_BASS_1, con.SynthPad.PAD_5_BOWED),
+    }))
+
+
+def test_section_key():
+    """
+    Test that the key changes with the section, instrument, channel and seed
+    """
+    key = section_key(VERSE, con.Bass.SYNTH_BASS_1, 0, 1)
+
+    assert key == section_key(VERSE, con.Bass.SYNTH_BASS_1, 0, 1)
+    assert key != section_key(CHORUS, con.Bass.SYNTH_BASS_1, 0, 1)
+    assert key != section_key(VERSE, con.SynthPad.PAD_5_BOWED, 0, 1)
+    assert key != section_key(VERSE, con.Bass.SYNTH_BASS_1, 1, 1)
+    assert key != section_key(VERSE, con.Bass.SYNTH_BASS_1, 0, 2)
+
+
+def test_repeated_sections_are_rendered_once():
+    """
+    Test that every distinct (section, instrument) pair misses the cache once
+    """
+    cache = SectionCache()
+    data = song_to_bytes(SONG, seed=3, cache=cache)
+
+    # verse: bass and pad, chorus: bass
+    assert cache.misses == 3
+    assert cache.hits == 3
+    assert song_to_bytes(SONG, seed=3, cache=SectionCache()) == data
+    assert song_to_bytes(SONG, seed=3, cache=cache) == data
+    assert cache.misses == 3
+
+
+def test_lru_bound():
+    """
+    Test that the least recently used patterns are dropped
+    """
+    cache = SectionCache(maxsize=1)
+    pattern = generate('C4', seed=1)
+    cache.put('a', pattern)
+    cache.put('b', pattern)
+
+    assert len(cache) == 1
+    assert cache.get('a') is None
+    assert cache.get('b') is pattern
+
+
+def test_directory(tmp_path):
+    """
+    Test that patterns stored on disk are found by another cache
+    """
+    data = song_to_bytes(SONG, seed=5, cache=SectionCache(directory=tmp_path))
+    cache = SectionCache(directory=tmp_path)
+
+    assert song_to_bytes(SONG, seed=5, cache=cache) == data
+    assert cache.misses == 0
+    assert len(list(tmp_path.glob('*.notes'))) == 3
+
+
+def test_truncated_entries_are_rendered_again(tmp_path):
+    """
+    Test that truncated or corrupt files on disk count as misses and are replaced
+    """
+    data = song_to_bytes(SONG, seed=5, cache=SectionCache(directory=tmp_path))
+    files = sorted(tmp_path.glob('*.notes'))
+    complete = {path: path.read_bytes() for path in files}
+    files[0].write_bytes(complete[files[0]][:-3])
+    files[1].write_bytes(complete[files[1]][:6])
+    files[2].write_bytes(complete[files[2]].replace(b'"notes"', b'"nodes"'))
+    cache = SectionCache(directory=tmp_path)
+
+    assert song_to_bytes(SONG, seed=5, cache=cache) == data
+    assert cache.misses == 3
+    assert {path: path.read_bytes() for path in files} == complete
+
+
+def test_load_pattern_rejects_truncated_data():
+    """
+    Test that every truncation of a cached section raises ValueError
+    """
+    data = dump_pattern(generate('C4', measures=1, seed=7))
+
+    for end in range(len(data)):
+        with pytest.raises(ValueError):
+            load_pattern(data[:end])
+
+
+def test_dump_and_load_pattern():
+    """
+    Test that patterns survive the disk format
+    """
+    pattern = generate('C4', measures=2, channel=3, program=con.Bass.SYNTH_BASS_1, seed=7)
+    loaded = load_pattern(dump_pattern(pattern))
+
+    assert loaded.sequence == pattern.sequence
+    assert (loaded.tempo, loaded.program, loaded.channel) == (
+        pattern.tempo, pattern.program, pattern.channel
+    )
+
+    with pytest.raises(ValueError):
+        load_pattern(b'nope')
+
+
+def test_cache_pickles_empty(tmp_path):
+    """
+    Test that worker processes get an empty cache with the same directory
+    """
+    cache = SectionCache(maxsize=4, directory=tmp_path)
+    cache.put('a', generate('C4', seed=1))
+    copy = pickle.loads(pickle.dumps(cache))
+
+    assert len(copy) == 0
+    assert (copy.maxsize, copy.directory) == (4, tmp_path)
+
+
+def test_cache_requires_seed():
+    """
+    Test that caching sections without a seed is an error
+    """
+    from randsik.song_builder.song import track_patterns
+
+    with pytest.raises(ValueError):
+        track_patterns(con.Bass.SYNTH_BASS_1, 0, [(True, VERSE)], cache=SectionCache())
@@ -0,0 +1,75 @@
+"""
+Tests for `randsik.song_builder.drums` module.
+"""
+import io
+import pickle
+
+import pytest
+
+from randsik import constants as con
+from randsik.song_builder.drums import DrumLibrary, default_library, drums
+from randsik.song_builder.song import SongSection
+from randsik.song_builder.stream import write_song_stream
+
+SECTION = SongSection(2, 'dorian', 100, 'D3', 1, (con.Bass.SYNTH_BASS_1,))
+
+
+def test_default_library_is_loaded_once():
+    """
+    Test that the bundled drum loops are indexed by style and only loaded once
+    """
+    library = default_library()
+
+    assert library is default_library()
+    assert set(library.styles) == {'blues', 'funk', 'rock'}
+    assert len(library) == len(library.loops())
+    for loop in library.loops('rock'):
+        assert loop.style == 'rock'
+        assert loop.ticks > 0
+        assert loop.ticks_per_beat > 0
+
+
+def test_drum_library_pickles():
+    """
+    Test that a library can be sent to other processes
+    """
+    library = default_library()
+    copy = pickle.loads(pickle.dumps(library))
+
+    assert copy.styles == library.styles
+    assert copy.loops() == library.loops()
+
+
+def test_drums_uses_library():
+    """
+    Test that "drums" splices one loop per four measures from the given library
+    """
+    library = default_library()
+    loop = library.loops('funk')[1]
+    single = DrumLibrary({'funk': [loop]})
+
+    track = drums(9, library=single)
+    messages = [msg for msg in loop.messages if msg.type != 'end_of_track']
+
+    assert [msg.copy(time=0) for msg in track[:-1]] == [msg.copy(time=0) for msg in messages] * 3
+    assert sum(msg.time for msg in track) == 3 * sum(msg.time for msg in loop.messages)
+    assert [msg.type for msg in track].count('end_of_track') == 1
+    assert track[-1].type == 'end_of_track'
+
+
+def test_empty_library():
+    """
+    Test that selecting from an empty library raises an error
+    """
+    with pytest.raises(ValueError):
+        DrumLibrary({}).choice()
+
+
+def test_empty_library_is_not_replaced():
+    """
+    Test that an empty library raises an error instead of falling back to the default loops
+    """
+    with pytest.raises(ValueError, match='Drum library does not contain any loops'):
+        drums(4, library=DrumLibrary({}))
+    with pytest.raises(ValueError, match='Drum library does not contain any loops'):
+        write_song_stream([SECTION], io.BytesIO(), drum_library=DrumLibrary({}), seed=1)
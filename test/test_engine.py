@@ -0,0 +1,88 @@
+"""
+Tests for `randsik.engine` module.
+"""
+import random
+from collections import Counter
+
+import pytest
+
+from randsik import Engine, Markov, Weighted, generate, generate_batch, QUARTER, EIGHTH
+from randsik.engine import AliasTable
+
+
+def test_alias_table_distribution():
+    """
+    Test that an alias table draws states in proportion to their weights
+    """
+    table = AliasTable([1, 0, 3, 4])
+    rng = random.Random(1)
+    counts = Counter(table.sample(rng) for _ in range(40000))
+
+    assert counts[1] == 0
+    assert abs(counts[0] / 40000 - 1 / 8) < 0.01
+    assert abs(counts[2] / 40000 - 3 / 8) < 0.01
+    assert abs(counts[3] / 40000 - 4 / 8) < 0.01
+
+
+@pytest.mark.parametrize('weights', [[], [0, 0], [1, -1]])
+def test_alias_table_validation(weights):
+    """
+    Test that invalid weights are rejected
+    """
+    with pytest.raises(ValueError):
+        AliasTable(weights)
+
+
+def test_markov_first_order():
+    """
+    Test that a first order chain follows its transitions
+    """
+    chain = Markov([[0, 1, 0], [0, 0, 1], [1, 0, 0]], initial=[0, 0, 1])
+    walk = chain.walk(random.Random(1))
+
+    assert [next(walk) for _ in range(6)] == [2, 0, 1, 2, 0, 1]
+
+
+def test_markov_second_order():
+    """
+    Test that a second order chain depends on the two previous states
+    """
+    chain = Markov({(0, 0): [0, 1], (0, 1): [0, 1], (1, 1): [1, 0], (1, 0): [1, 0]},
+                   order=2, initial=[1, 0])
+    walk = chain.walk(random.Random(1))
+
+    # The second state has no full context yet, so it is drawn from `initial`
+    assert [next(walk) for _ in range(7)] == [0, 0, 1, 1, 0, 0, 1]
+
+    with pytest.raises(ValueError):
+        Markov({(0,): [1, 1]}, order=2)
+
+
+def test_generate_with_engine():
+    """
+    Test that generate draws from the engine and stays reproducible
+    """
+    engine = Engine(
+        notes=Weighted([1, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0]),
+        rhythm=Markov([[1, 0], [1, 0]], initial=[1, 0]),
+    )
+    pattern = generate('C4', mode='ionian', measures=4, engine=engine, seed=3,
+                       note_lengths=(QUARTER, EIGHTH))
+
+    assert set(pattern.notes.pitch) <= {60, 67}
+    assert list(pattern.notes.duration) == [QUARTER] * 16
+    assert pattern.to_bytes() == generate(
+        'C4', mode='ionian', measures=4, engine=engine, seed=3, note_lengths=(QUARTER, EIGHTH)
+    ).to_bytes()
+    batch = generate_batch(
+        3, 'C4', mode='ionian', measures=4, engine=engine, seed=1, note_lengths=(QUARTER, EIGHTH)
+    )
+    assert all(sum(p.notes.duration) == 4 * 4 * QUARTER for p in batch)
+
+
+def test_engine_size_mismatch():
+    """
+    Test that distributions must have one state per note or note length
+    """
+    with pytest.raises(ValueError):
+        generate('C4', mode='ionian', engine=Engine(notes=Weighted([1, 2])))
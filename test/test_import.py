@@ -0,0 +1,42 @@
+"""
+Tests for what importing the `randsik` package pulls in.
+
+The import time itself is measured by the `import_randsik` benchmark case, wall-clock
+limits are too noisy for the test suite.
+"""
+import subprocess
+import sys
+
+# Modules only some features need, none of them may be imported by `import randsik`
+HEAVY_MODULES = ('mido', 'numpy', 'asyncio')
+
+
+def test_import_skips_heavy_modules():
+    """
+    Test that importing randsik does not import modules only some features need
+    """
+    code = (
+        'import sys, randsik\n'
+        f'print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))\n'
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ''
+
+
+def test_mido_imported_lazily():
+    """
+    Test that mido is only imported once a MIDI track is needed
+    """
+    code = (
+        'import sys, randsik\n'
+        'assert "mido" not in sys.modules\n'
+        'pattern = randsik.generate(seed=1)\n'
+        'pattern.to_bytes()\n'
+        'assert "mido" not in sys.modules\n'
+        'pattern.track\n'
+        'assert "mido" in sys.modules\n'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
@@ -0,0 +1,181 @@
+"""
+Tests for `randsik.song_builder.ingest` module.
+"""
+import os
+import pickle
+import shutil
+import struct
+
+from mido import Message, MetaMessage, MidiFile, MidiTrack
+
+from randsik import constants as con
+from randsik import cli
+from randsik.song_builder import ingest as ingest_module
+from randsik.song_builder.drums import DRUM_MIDI_FOLDER, DrumLibrary, EventStore, drums
+from randsik.song_builder.ingest import ingest, load_index
+from randsik.song_builder.song import SongSection, song_to_bytes
+
+
+def write_loop(path, ticks_per_beat=960, tracks=2):
+    """
+    Writes a two measure loop with the kick and hi-hat on separate tracks
+    """
+    midi_file = MidiFile(ticks_per_beat=ticks_per_beat)
+    for note in (36, 42)[:tracks]:
+        track = MidiTrack()
+        for _ in range(8):
+            track.append(Message('note_on', channel=9, note=note, velocity=100))
+            track.append(Message('note_off', channel=9, note=note, time=ticks_per_beat))
+        midi_file.tracks.append(track)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    midi_file.save(path)
+
+
+def write_broken(path):
+    """
+    Writes a file starting with a data byte, which mido can not read
+    """
+    track = b'\x00\x24\x64' + b'\x00\xff\x2f\x00'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(
+        b'MThd' + struct.pack('>Lhhh', 6, 0, 1, 480)
+        + b'MTrk' + struct.pack('>L', len(track)) + track
+    )
+
+
+def test_ingest_and_open(tmp_path):
+    """
+    Test that loops are normalized and broken files are quarantined
+    """
+    write_loop(tmp_path / 'src' / 'rock' / 'a.mid')
+    write_loop(tmp_path / 'src' / 'funk' / 'b.mid', ticks_per_beat=96, tracks=1)
+    write_broken(tmp_path / 'src' / 'rock' / 'broken.mid')
+    quarantined = []
+
+    result = ingest(
+        tmp_path / 'src', tmp_path / 'index', workers=1,
+        report=lambda file, reason: quarantined.append(file.path)
+    )
+    library = DrumLibrary.open(tmp_path / 'index')
+
+    assert (result.loops, result.parsed, result.quarantined) == (2, 3, 1)
+    assert quarantined == ['rock/broken.mid']
+    assert set(library.styles) == {'rock', 'funk'}
+
+    loop = library.loops('rock')[0]
+    assert (loop.name, loop.measures, loop.ticks, loop.ticks_per_beat) == ('a.mid', 2, 3840, 960)
+    assert sum(msg.time for msg in loop.messages) == 3840
+    assert sum(msg.type == 'note_on' for msg in loop.messages) == 16
+    assert len(library.loops('funk')[0].messages) == 17
+
+
+def test_ingest_is_incremental(tmp_path):
+    """
+    Test that unchanged files are not parsed again
+    """
+    write_loop(tmp_path / 'src' / 'rock' / 'a.mid')
+    write_loop(tmp_path / 'src' / 'rock' / 'b.mid')
+    write_broken(tmp_path / 'src' / 'c.mid')
+    ingest(tmp_path / 'src', tmp_path / 'index', workers=1)
+    first = DrumLibrary.open(tmp_path / 'index').loops()
+
+    write_loop(tmp_path / 'src' / 'rock' / 'b.mid', tracks=1)
+    os.utime(tmp_path / 'src' / 'rock' / 'b.mid', ns=(1, 1))
+    result = ingest(tmp_path / 'src', tmp_path / 'index', workers=1)
+    loops = DrumLibrary.open(tmp_path / 'index').loops()
+
+    assert (result.parsed, result.unchanged, result.quarantined) == (1, 2, 1)
+    assert loops[0].messages == first[0].messages
+    assert len(loops[1].messages) == 17
+    assert len(list((tmp_path / 'index').glob('events-*.bin'))) == 1
+    assert load_index(tmp_path / 'index')['quarantine'][0]['path'] == 'c.mid'
+
+
+def test_previous_store_is_closed(tmp_path, monkeypatch):
+    """
+    Test that the previous event store is unmapped before it is replaced
+    """
+    write_loop(tmp_path / 'src' / 'rock' / 'a.mid')
+    ingest(tmp_path / 'src', tmp_path / 'index', workers=1)
+    stores = []
+
+    class RecordingStore(EventStore):
+        def __init__(self, path):
+            super().__init__(path)
+            stores.append(self)
+
+    monkeypatch.setattr(ingest_module, 'EventStore', RecordingStore)
+    write_loop(tmp_path / 'src' / 'rock' / 'b.mid')
+    ingest(tmp_path / 'src', tmp_path / 'index', workers=1)
+
+    assert len(stores) == 1
+    assert stores[0]._buffer == b''
+    assert len(list((tmp_path / 'index').glob('events-*.bin'))) == 1
+
+
+def test_ingest_in_parallel(tmp_path):
+    """
+    Test that parsing in worker processes gives the same library
+    """
+    shutil.copytree(DRUM_MIDI_FOLDER, tmp_path / 'src')
+    ingest(tmp_path / 'src', tmp_path / 'serial', workers=1)
+    ingest(tmp_path / 'src', tmp_path / 'parallel', workers=2, chunk_size=4)
+
+    assert (
+        load_index(tmp_path / 'serial')['loops'] == load_index(tmp_path / 'parallel')['loops']
+    )
+    assert (
+        (tmp_path / 'serial' / load_index(tmp_path / 'serial')['events']).read_bytes()
+        == (tmp_path / 'parallel' / load_index(tmp_path / 'parallel')['events']).read_bytes()
+    )
+
+
+def test_packed_library_in_songs(tmp_path):
+    """
+    Test that ingested loops cover the measures of a song and can be pickled
+    """
+    write_loop(tmp_path / 'src' / 'rock' / 'a.mid')
+    ingest(tmp_path / 'src', tmp_path / 'index', workers=1)
+    library = DrumLibrary.open(tmp_path / 'index')
+    copy = pickle.loads(pickle.dumps(library))
+
+    assert copy.loops()[0].messages == library.loops()[0].messages
+    assert sum(msg.time for msg in drums(5, library=library)) == 3 * 2 * con.WHOLE
+
+    section = SongSection(
+        measures=4, mode='dorian', tempo=92, key='D3', octaves=1,
+        instruments=(con.Bass.SYNTH_BASS_1,)
+    )
+    assert song_to_bytes([section], drum_library=library, seed=1, workers=2) == song_to_bytes(
+        [section], drum_library=library, seed=1
+    )
+
+
+def test_time_signature_filter(tmp_path):
+    """
+    Test that loops in other time signatures are left out when opening a library
+    """
+    midi_file = MidiFile(ticks_per_beat=480)
+    track = MidiTrack([MetaMessage('time_signature', numerator=3, denominator=4)])
+    track.append(Message('note_on', channel=9, note=36, velocity=100))
+    track.append(Message('note_off', channel=9, note=36, time=1440))
+    midi_file.tracks.append(track)
+    (tmp_path / 'src').mkdir()
+    midi_file.save(tmp_path / 'src' / 'waltz.mid')
+    ingest(tmp_path / 'src', tmp_path / 'index', workers=1)
+
+    assert len(DrumLibrary.open(tmp_path / 'index')) == 0
+    assert DrumLibrary.open(tmp_path / 'index', time_sig='3/4').loops()[0].ticks == 1440
+
+
+def test_cli_ingest(tmp_path, capsys):
+    """
+    Test the ingest command
+    """
+    write_loop(tmp_path / 'src' / 'a.mid')
+    write_broken(tmp_path / 'src' / 'b.mid')
+
+    assert cli.main(['ingest', str(tmp_path / 'src'), str(tmp_path / 'index'), '-j', '1']) == 0
+    out, err = capsys.readouterr()
+    assert out.startswith('1 loops')
+    assert 'quarantined b.mid' in err
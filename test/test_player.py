@@ -0,0 +1,93 @@
+"""
+Tests for `randsik.player` module.
+"""
+import json
+
+from randsik import QUARTER, Pattern
+from randsik.player import ConfigWatcher, Player, timed_messages
+
+
+class FakeClock:
+    """
+    Clock that only moves forward when sleeping
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakePort:
+    def __init__(self, clock):
+        self.clock = clock
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append((self.clock(), msg))
+
+
+def quarter_notes():
+    return Pattern.from_arrays([60, 62], 100, [QUARTER, QUARTER], tempo=120)
+
+
+def test_timed_messages():
+    """
+    Test that message offsets are computed from ticks and tempo
+    """
+    messages, length = timed_messages(quarter_notes())
+
+    assert [offset for offset, _ in messages] == [0.0, 0.0, 0.5, 0.5, 1.0]
+    assert length == 1.0
+
+
+def test_player_schedules_on_absolute_clock():
+    """
+    Test that consecutive patterns are played back to back without drift
+    """
+    clock = FakeClock()
+    port = FakePort(clock)
+    player = Player(port, quarter_notes, clock=clock, sleep=clock.sleep)
+
+    stats = player.play(count=3)
+
+    note_on_times = [when - 100.0 for when, msg in port.sent if msg.type == 'note_on']
+    assert note_on_times == [0.0, 0.5, 1.0, 1.5, 2.0, 2.5]
+    assert stats.patterns == 3
+    assert stats.events == 15
+    assert stats.max_latency == 0.0
+
+
+def test_config_watcher_reloads_on_change(tmp_path):
+    """
+    Test that the config file is only read again after it has changed
+    """
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'generate': {'note': 'C4'}}))
+    watcher = ConfigWatcher(path)
+
+    assert watcher.get() == {'generate': {'note': 'C4'}}
+    watcher.get()
+    assert watcher.reloads == 1
+
+    path.write_text(json.dumps({'generate': {'note': 'D4', 'mode': 'dorian'}}))
+    assert watcher.get()['generate']['note'] == 'D4'
+    assert watcher.reloads == 2
+
+
+def test_player_from_config(tmp_path):
+    """
+    Test playing patterns generated from a config file
+    """
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'generate': {'note': 'C4', 'mode': 'ionian', 'seed': 1}}))
+    clock = FakeClock()
+    port = FakePort(clock)
+
+    Player.from_config(port, path, clock=clock, sleep=clock.sleep).play(count=2)
+
+    assert port.sent
@@ -0,0 +1,80 @@
+"""
+Tests for `randsik.profiling` module.
+"""
+import io
+
+import randsik
+from randsik import profiling
+from randsik.song_builder.song import SongSection, create_song, save_song
+from randsik.constants import Piano, Bass
+
+
+def test_profile_records_stages():
+    """
+    Test that the stages of generating and saving a song are recorded
+    """
+    sections = [
+        SongSection(2, 'dorian', 120, 'C3', 1, (Piano.ACOUSTIC_GRAND_PIANO, Bass.ACOUSTIC_BASS))
+    ]
+
+    with randsik.profile() as stats:
+        midi_file = create_song(sections, seed=1)
+        save_song(sections, io.BytesIO(), seed=1)
+
+    assert set(stats) >= {
+        'create_song', 'song_tracks', 'section_pattern', 'generate', 'validate_notes',
+        'build_midi_track', 'drums', 'encode_file',
+    }
+    assert stats['create_song'].calls == 1
+    assert stats['generate'].calls == 4
+    assert stats['generate'].notes == stats['section_pattern'].notes > 0
+    assert stats['create_song'].events == sum(len(track) for track in midi_file.tracks)
+    assert stats['encode_file'].bytes > 0
+    assert stats['create_song'].seconds >= stats['build_midi_track'].seconds > 0
+    assert 'create_song' in str(stats)
+
+
+def test_profile_disabled():
+    """
+    Test that nothing is recorded outside of a profile block and that nested blocks
+    restore the previous state
+    """
+    with randsik.profile() as outer:
+        randsik.generate(seed=1)
+        with randsik.profile() as inner:
+            randsik.generate(seed=1)
+        randsik.generate(seed=1)
+
+    randsik.generate(seed=1)
+
+    assert not profiling.enabled()
+    assert outer['generate'].calls == 2
+    assert inner['generate'].calls == 1
+
+
+def test_enable_callback():
+    """
+    Test that the callback receives every recorded call
+    """
+    calls = []
+    profiling.reset()
+    profiling.enable(callback=lambda stage, seconds, counts: calls.append((stage, counts)))
+    try:
+        pattern = randsik.generate(seed=1)
+    finally:
+        profiling.disable()
+
+    assert ('generate', {'notes': len(pattern.notes)}) in calls
+    assert randsik.stats()['generate'].calls == 1
+    profiling.reset()
+
+
+def test_notes_are_validated_in_bulk():
+    """
+    Test that building a pattern from notes records one validation, not one per note
+    """
+    with randsik.profile() as stats:
+        randsik.Pattern([randsik.Note(60, 100, randsik.QUARTER)] * 10)
+
+    assert 'validate_note' not in stats
+    assert stats['validate_notes'].calls == 1
@@ -1,7 +1,19 @@
 """
 Tests for `randsik` module.
 """
-from randsik import Note, Pattern, QUARTER, EIGHTH, generate
+import random
+
+import pytest
+from mido import MetaMessage, bpm2tempo
+
+import randsik
+from randsik import (
+    Note, NoteData, Rest, Pattern, QUARTER, EIGHTH, HALF, WHOLE, generate, generate_batch,
+    generate_stream
+)
+from randsik import constants as const
+from randsik.scales import SCALES
+from randsik.randsik import NoteView, RandsikValidationError, trim_durations
 
 
 def test_pattern_happy_path():
@@ -27,3 +39,256 @@ def test_generate_happy_path():
     """
     pattern = generate()
     assert pattern.track
+
+
+def test_generate_batch_happy_path():
+    """
+    Test that "generate_batch" returns the requested number of patterns and that every
+    pattern fills its measures exactly
+    """
+    patterns = generate_batch(5, 'C4', mode='dorian', measures=2, note_lengths=(WHOLE, QUARTER))
+
+    assert len(patterns) == 5
+    for pattern in patterns:
+        assert sum(note.duration for note in pattern.sequence) == WHOLE * 2
+
+    assert generate_batch(0) == []
+    with pytest.raises(ValueError, match='non-negative'):
+        generate_batch(-1)
+
+
+def test_generate_batch_fixed_key_selects_notes_once():
+    """
+    Test that the notes to choose from are looked up once when the key and mode are given,
+    and for every pattern otherwise
+    """
+    with randsik.profile() as stats:
+        generate_batch(4, 'C4', mode='dorian', seed=1)
+    assert stats['note_selection'].calls == 1
+
+    with randsik.profile() as stats:
+        generate_batch(4, 'C4', seed=1)
+    assert stats['note_selection'].calls == 4
+
+
+def test_trim_durations():
+    """
+    Test that the last note is trimmed to fit in the total pulses
+    """
+    assert trim_durations([WHOLE, WHOLE, WHOLE], WHOLE + QUARTER) == [WHOLE, QUARTER]
+    assert trim_durations([QUARTER] * 4, WHOLE) == [QUARTER] * 4
+    assert trim_durations([QUARTER], 0) == []
+
+
+def test_pattern_from_arrays():
+    """
+    Test creating a pattern from arrays and that the MIDI track is only built on access
+    """
+    pattern = Pattern.from_arrays([60, 62, 64], 100, [QUARTER, QUARTER, HALF], rest=[0, EIGHTH, 0])
+
+    assert pattern._track is None
+    assert len(pattern.notes) == 3
+    assert pattern.sequence == [
+        Note(60, 100, QUARTER), Rest(EIGHTH), Note(62, 100, QUARTER), Note(64, 100, HALF)
+    ]
+
+    note_on = [msg for msg in pattern.track if msg.type == 'note_on']
+    assert [msg.time for msg in note_on] == [0, EIGHTH, 0]
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'pitch': [128], 'velocity': 100, 'duration': [QUARTER]},
+    {'pitch': [60], 'velocity': 128, 'duration': [QUARTER]},
+    {'pitch': [60], 'velocity': 100, 'duration': [-1]},
+    {'pitch': [60], 'velocity': 100, 'duration': [QUARTER], 'channel': 16},
+    {'pitch': [60, 62], 'velocity': [100], 'duration': [QUARTER, QUARTER]},
+])
+def test_note_data_validation(kwargs):
+    """
+    Test that invalid note data raises a validation error
+    """
+    with pytest.raises(RandsikValidationError):
+        NoteData(**kwargs)
+
+
+def test_generate_with_seed():
+    """
+    Test that the same seed always gives the same pattern
+    """
+    first = generate(measures=4, seed=10)
+    second = generate(measures=4, rng=random.Random(10))
+
+    assert first.to_bytes() == second.to_bytes()
+    assert generate(measures=4, seed=11).to_bytes() != first.to_bytes()
+    assert [p.to_bytes() for p in generate_batch(3, seed=5)] == [
+        p.to_bytes() for p in generate_batch(3, seed=5)
+    ]
+
+
+def test_pattern_rest_after():
+    """
+    Test that rests after the last note are kept as silence at the end of the pattern
+    """
+    pattern = Pattern([Rest(QUARTER), Note(60, 100, QUARTER), Rest(EIGHTH), Rest(EIGHTH)])
+
+    assert pattern.rest_after == QUARTER
+    assert pattern.sequence[-1] == Rest(QUARTER)
+    assert pattern.track[-1].type == 'end_of_track'
+    assert sum(msg.time for msg in pattern.track) == 3 * QUARTER
+
+    silence = Pattern([Rest(WHOLE)], tempo=90)
+    assert list(silence.track) == [
+        MetaMessage('set_tempo', tempo=bpm2tempo(90)), MetaMessage('end_of_track', time=WHOLE)
+    ]
+
+
+def test_pattern_iter():
+    """
+    Test that iterating a pattern yields its notes and rests
+    """
+    sequence = [Rest(EIGHTH), Note(60, 100, QUARTER), Note(62, 90, EIGHTH), Rest(QUARTER)]
+    pattern = Pattern(sequence)
+
+    assert list(pattern) == sequence
+    assert pattern.ticks == 3 * QUARTER
+
+
+def test_pattern_transformations():
+    """
+    Test transpose, with_velocity, repeat, concat and slice against patterns built by hand
+    """
+    motif = Pattern([Rest(EIGHTH), Note(60, 100, QUARTER), Note(64, 90, EIGHTH), Rest(QUARTER)])
+
+    assert list(motif.transpose(2).transpose(-1)) == [
+        Rest(EIGHTH), Note(61, 100, QUARTER), Note(65, 90, EIGHTH), Rest(QUARTER)
+    ]
+    assert [n.velocity for n in motif.with_velocity(50) if isinstance(n, Note)] == [50, 50]
+
+    repeated = motif.repeat(3)
+    expected = Pattern(list(motif) * 3)
+    assert repeated.ticks == 3 * motif.ticks
+    assert repeated.to_bytes() == expected.to_bytes()
+    assert list(repeated.track) == list(expected.track)
+
+    other = Pattern([Note(67, 80, HALF)])
+    assert motif.concat(other).to_bytes() == Pattern(list(motif) + list(other)).to_bytes()
+
+    # The second note of the first repetition up to halfway the first note of the second
+    sliced = repeated.slice(QUARTER + EIGHTH, 4 * QUARTER)
+    assert list(sliced) == [
+        Note(64, 90, EIGHTH), Rest(QUARTER + EIGHTH), Note(60, 100, EIGHTH)
+    ]
+    assert sliced.ticks == 2 * QUARTER + EIGHTH
+    assert len(sliced.notes) == 2 and sliced.rest_after == 0
+    assert sliced.notes.materialize().pitch.tolist() == [64, 60]
+
+
+def test_pattern_repeat_shares_notes():
+    """
+    Test that repeating a pattern does not copy its notes
+    """
+    motif = generate(measures=4, seed=1)
+    looped = motif.repeat(1000)
+
+    assert looped.notes.base is motif.notes
+    assert len(looped.notes) == 1000 * len(motif.notes)
+    assert looped.ticks == 1000 * motif.ticks
+    assert looped._track is None
+
+
+def test_pattern_transformation_validation():
+    """
+    Test that derived patterns are validated
+    """
+    pattern = Pattern([Note(120, 100, QUARTER)])
+
+    with pytest.raises(RandsikValidationError):
+        pattern.transpose(8)
+    with pytest.raises(RandsikValidationError):
+        pattern.with_velocity(128)
+    with pytest.raises(ValueError):
+        pattern.repeat(-1)
+
+
+def test_note_view_is_abstract():
+    """
+    Test that a view has to implement every member before it can be created
+    """
+    class Incomplete(NoteView):
+        __slots__ = ()
+
+        def __len__(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_note_midi_map_literal():
+    """
+    Test that the precomputed note map matches the function it was generated with
+    """
+    assert const.NOTE_MIDI_MAP == const.note_midi_map()
+
+
+def test_generate_stream_matches_generate():
+    """
+    Test that the first pattern of a stream is the same as a pattern from `generate`
+    """
+    stream = generate_stream('C4', mode='dorian', measures=2, seed=5)
+
+    assert next(stream).sequence == generate('C4', mode='dorian', measures=2, seed=5).sequence
+
+
+def test_generate_stream_update():
+    """
+    Test that parameters changed between patterns apply to the following patterns
+    """
+    stream = generate_stream('C4', mode='ionian', seed=1)
+    first = next(stream)
+    stream.update(note='D4', mode='dorian', tempo=90)
+    second = next(stream)
+    dorian = SCALES.window('dorian', 62, 12)
+
+    assert first.tempo == 120 and second.tempo == 90
+    assert all(pitch in dorian for pitch in second.notes.pitch)
+    assert sum(second.notes.duration) == WHOLE
+
+    with pytest.raises(TypeError):
+        stream.update(colour='blue')
+
+
+def test_generate_stream_events():
+    """
+    Test that stream events only repeat the program change and tempo when they change
+    """
+    stream = generate_stream('C4', mode='ionian', seed=2)
+    events = list(stream.events(4))
+    stream.update(tempo=80)
+    more = list(stream.events(1))
+
+    assert sum(event[0] == 0xC0 for _, event in events) == 1
+    assert sum(event[:2] == b'\xff\x51' for _, event in events) == 1
+    assert events[-1][0] == 4 * WHOLE
+    assert more[0][1][0] == 0xC0 and more[1][1][:2] == b'\xff\x51'
+
+
+def test_generate_stream_memory():
+    """
+    Test that memory does not grow with the number of patterns generated
+    """
+    import tracemalloc
+
+    stream = generate_stream('C4', mode='ionian', seed=3)
+    for _ in range(100):
+        next(stream)
+    tracemalloc.start()
+    for _ in range(200):
+        next(stream)
+    short, _ = tracemalloc.get_traced_memory()
+    for _ in range(2000):
+        next(stream)
+    long, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert long - short < 20000
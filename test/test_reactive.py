@@ -0,0 +1,119 @@
+"""
+Tests for `randsik.reactive` module.
+"""
+from randsik import QUARTER, Pattern
+from randsik import scales
+from randsik.reactive import Responder, listen, simulated_input
+
+
+class FakePort:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+def c_major_phrase(tempo=100):
+    return Pattern.from_arrays([60, 64, 67, 72, 67, 65, 62, 60], 100, QUARTER, tempo=tempo)
+
+
+def test_tracks_key_and_tempo():
+    """
+    Test that the key and tempo of the input are picked up
+    """
+    responder = Responder(phrase_notes=8)
+    responses = []
+    listen(
+        simulated_input([c_major_phrase(tempo=100)]), responder,
+        on_response=lambda pattern, latency: responses.append(pattern),
+    )
+
+    assert responder.key == (0, 'ionian')
+    assert responder.tempo == 100
+    assert len(responses) == 1
+    assert responses[0].tempo == 100
+    assert {pitch % 12 for pitch in responses[0].notes.pitch} <= set(
+        scales.SCALES.notes('ionian', 0)[:12]
+    )
+
+
+def test_response_is_sent_to_output():
+    """
+    Test that the program change is sent once and every response plays all its notes
+    """
+    port = FakePort()
+    stats = listen(simulated_input([c_major_phrase()] * 3), Responder(seed=1), port)
+
+    # Every phrase of eight notes holds two phrases of four
+    assert stats.patterns == 6
+    assert port.sent[0].type == 'program_change'
+    assert sum(msg.type == 'program_change' for msg in port.sent) == 1
+    note_ons = sum(msg.type == 'note_on' for msg in port.sent)
+    assert note_ons == sum(msg.type == 'note_off' for msg in port.sent) > 0
+
+
+def test_fixed_parameters():
+    """
+    Test that a fixed note, mode and tempo are used instead of the tracked ones
+    """
+    responder = Responder(note='D3', mode='dorian', tempo=90, seed=2)
+    responses = []
+    listen(simulated_input([c_major_phrase()]), responder,
+           on_response=lambda pattern, latency: responses.append(pattern))
+
+    selection = scales.SCALES.window('dorian', 50, 12)
+    assert all(pitch in selection for pitch in responses[0].notes.pitch)
+    assert responses[0].tempo == 90
+
+
+def test_latency_under_load():
+    """
+    Test that responses to a long simulated performance stay within the budget
+    """
+    stats = listen(simulated_input([c_major_phrase()] * 200), Responder(seed=3), FakePort())
+
+    assert stats.patterns == 400
+    assert stats.percentile(50) < stats.budget
+    assert 'p99=' in str(stats)
+
+
+def test_latency_ends_at_first_note():
+    """
+    Test that the latency of a response is measured until its first note_on is sent
+    """
+    now = [0.0]
+
+    class SlowPort(FakePort):
+        def send(self, msg):
+            super().send(msg)
+            now[0] += 1.0 if msg.type == 'note_on' else 0.001
+
+    stats = listen(
+        simulated_input([c_major_phrase()]), Responder(seed=5), SlowPort(),
+        clock=lambda: now[0],
+    )
+
+    assert stats.patterns == 2
+    assert 1.0 <= stats.max_latency < 1.01
+
+
+def test_realtime_playback():
+    """
+    Test that a response played in the background is cut off by the next one and by
+    stopping, with a note_off for every held note
+    """
+    port = FakePort()
+    stats = listen(
+        simulated_input([c_major_phrase()]), Responder(tempo=3000, seed=4), port, realtime=True
+    )
+    held = set()
+    for msg in port.sent:
+        if msg.type == 'note_on':
+            held.add(msg.note)
+        elif msg.type == 'note_off':
+            held.discard(msg.note)
+
+    assert stats.patterns == 2
+    assert sum(msg.type == 'program_change' for msg in port.sent) == 1
+    assert not held
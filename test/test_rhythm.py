@@ -0,0 +1,92 @@
+"""
+Tests for `randsik.rhythm` module.
+"""
+import random
+from collections import Counter
+from itertools import accumulate
+
+import pytest
+
+from randsik import QUARTER, EIGHTH, SIXTEENTH, WHOLE, HALF, generate, generate_batch
+from randsik.randsik import time_sig_to_ppm
+from randsik.rhythm import RhythmIndex, rhythm_index
+
+
+def test_index_counts_fillings():
+    """
+    Test that the index counts every way to fill a measure
+    """
+    assert RhythmIndex(WHOLE, (QUARTER,)).count == 1
+    assert RhythmIndex(WHOLE, (QUARTER, EIGHTH)).count == 34
+    assert RhythmIndex(WHOLE, (QUARTER, SIXTEENTH, EIGHTH)).count == 4930
+    assert RhythmIndex(time_sig_to_ppm('3/4'), (WHOLE,)).count == 0
+
+    # Fillings are weighted like drawing the lengths one at a time: QUARTER, QUARTER
+    # is drawn with probability 1/4 and every filling with three notes with 1/8
+    index = RhythmIndex(HALF, (QUARTER, EIGHTH))
+    assert Counter(index.filling(rank) for rank in range(index.total)) == {
+        (EIGHTH, EIGHTH, EIGHTH, EIGHTH): 1, (EIGHTH, EIGHTH, QUARTER): 2,
+        (EIGHTH, QUARTER, EIGHTH): 2, (QUARTER, EIGHTH, EIGHTH): 2, (QUARTER, QUARTER): 4,
+    }
+
+
+def test_index_repeated_lengths():
+    """
+    Test that lengths given more than once are drawn more often
+    """
+    index = RhythmIndex(WHOLE, (QUARTER, QUARTER, WHOLE))
+    rng = random.Random(2)
+    counts = Counter(index.sample(rng) for _ in range(17000))
+
+    # QUARTER is drawn with probability 2/3 and WHOLE with 1/3, so the four quarters
+    # are drawn 16/81 / (16/81 + 1/3) = 16/43 of the time
+    assert index.count == 2
+    assert abs(counts[(QUARTER,) * 4] / 17000 - 16 / 43) < 0.02
+
+
+def test_index_draws_are_reproducible():
+    """
+    Test that draws only depend on the random number generator
+    """
+    lengths = (QUARTER, SIXTEENTH, EIGHTH)
+    used = RhythmIndex(WHOLE, lengths)
+    used.fill(100, random.Random(1))
+
+    fresh = RhythmIndex(WHOLE, lengths)
+    assert used.fill(10, random.Random(5)) == fresh.fill(10, random.Random(5))
+    assert rhythm_index(WHOLE, lengths) is rhythm_index(WHOLE, lengths)
+
+    with pytest.raises(ValueError):
+        RhythmIndex(WHOLE, (0,))
+
+
+def test_orderings_share_an_index():
+    """
+    Test that orderings of the same note lengths hit the same cached index
+    """
+    rhythm_index.cache_clear()
+    generate(measures=2, note_lengths=(QUARTER, QUARTER, EIGHTH), seed=1)
+    generate(measures=2, note_lengths=(EIGHTH, QUARTER, QUARTER), seed=1)
+    generate_batch(2, measures=2, note_lengths=[QUARTER, EIGHTH, QUARTER], seed=1)
+    info = rhythm_index.cache_info()
+
+    assert info.misses == 1
+    assert info.hits == 2
+
+
+def test_generate_fills_measures_exactly():
+    """
+    Test that every measure is filled without cutting off notes
+    """
+    lengths = (WHOLE, HALF, QUARTER)
+    pattern = generate(measures=8, note_lengths=lengths, seed=1)
+    batch = generate_batch(3, measures=8, note_lengths=lengths, seed=1)
+
+    for notes in [pattern.notes] + [p.notes for p in batch]:
+        assert set(notes.duration) <= set(lengths)
+        ends = set(accumulate(notes.duration))
+        assert all(measure * WHOLE in ends for measure in range(1, 9))
+
+    # Lengths that can not fill a measure are still cut off to fit
+    pattern = generate(measures=2, time_sig='3/4', note_lengths=(WHOLE,), seed=1)
+    assert list(pattern.notes.duration) == [WHOLE, HALF]
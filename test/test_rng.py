@@ -0,0 +1,36 @@
+"""
+Tests for `randsik.rng` module.
+"""
+import random
+
+from randsik.rng import derive_seed, get_rng, spawn
+
+
+def test_get_rng():
+    """
+    Test that an explicit generator wins over a seed and that the global module is the default
+    """
+    rng = random.Random(1)
+
+    assert get_rng(rng, seed=2) is rng
+    assert get_rng(seed=2).random() == random.Random(2).random()
+    assert get_rng() is random
+
+
+def test_derive_seed():
+    """
+    Test that derived seeds are stable and differ per key
+    """
+    assert derive_seed(1, 'drums') == derive_seed(1, 'drums')
+    assert derive_seed(1, 0, 1) != derive_seed(1, 1, 0)
+    assert derive_seed(1, 0) != derive_seed(2, 0)
+
+
+def test_spawn():
+    """
+    Test that spawned generators are independent and reproducible
+    """
+    streams = [rng.random() for rng in spawn(3, 4)]
+
+    assert len(set(streams)) == 4
+    assert streams == [rng.random() for rng in spawn(3, 4)]
@@ -0,0 +1,65 @@
+"""
+Tests for `randsik.scales` module.
+"""
+import pytest
+
+from randsik import constants as con
+from randsik import generate
+from randsik.randsik import get_mode_midi_notes
+from randsik.scales import ScaleIndex, SCALES
+
+
+@pytest.mark.parametrize('mode', tuple(con.MUSIC_MODES))
+def test_tables_are_sorted(mode):
+    """
+    Test that every table is sorted and only holds notes of the mode
+    """
+    for root in range(12):
+        notes = SCALES.notes(mode, root)
+        assert list(notes) == sorted(set(notes))
+        assert root in notes
+        assert notes[0] >= 0 and notes[-1] <= 127
+
+
+def test_get_mode_midi_notes():
+    """
+    Test that the notes above the start note come first, followed by the notes below it
+    """
+    notes = get_mode_midi_notes('ionian', con.NOTE_MIDI_MAP['C7'])
+
+    assert notes[:8] == [96, 98, 100, 101, 103, 105, 107, 108]
+    assert notes[-1] >= 20
+    assert len(notes) == len(set(notes))
+
+
+def test_window():
+    """
+    Test that a window wraps to the notes below the start note at the top of the range
+    """
+    assert SCALES.window('ionian', 60, 4) == [60, 62, 64, 65]
+    assert SCALES.window('ionian', 120, 6) == [120, 122, 124, 125, 127, 119]
+    assert SCALES.window('chromatic', 60, 3) == [60, 61, 62]
+
+
+def test_register_mode(monkeypatch):
+    """
+    Test that a custom mode can be registered and used with "generate"
+    """
+    index = ScaleIndex({})
+    index.register('pentatonic', (2, 2, 3, 2, 3))
+
+    assert index.modes == ('pentatonic',)
+    assert index.window('pentatonic', 60, 6) == [60, 62, 64, 67, 69, 72]
+
+    monkeypatch.setattr('randsik.scales.SCALES', index)
+    pattern = generate('C4', mode='pentatonic')
+    assert {note.value % 12 for note in pattern.sequence} <= {0, 2, 4, 7, 9}
+
+
+@pytest.mark.parametrize('steps', [(), (2, 2, 2), (0, 12), (2.5, 9.5)])
+def test_register_invalid_mode(steps):
+    """
+    Test that modes which do not add up to an octave are refused
+    """
+    with pytest.raises(ValueError):
+        ScaleIndex({}).register('invalid', steps)
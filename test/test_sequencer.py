@@ -0,0 +1,155 @@
+"""
+Tests for `randsik.sequencer` module.
+"""
+import asyncio
+import time
+
+import pytest
+
+from randsik import QUARTER, Pattern
+from randsik.sequencer import Sequencer, voice_events
+
+# At 6000 BPM a quarter note lasts 10 ms
+TEMPO = 6000
+
+
+class FakePort:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+class AsyncFakePort(FakePort):
+    async def send(self, msg):
+        self.sent.append(msg)
+
+
+def pattern(pitch, channel=0):
+    return Pattern.from_arrays(
+        [pitch, pitch + 2], 100, [QUARTER, QUARTER], tempo=TEMPO, channel=channel
+    )
+
+
+def test_voice_events_follow_tempo():
+    """
+    Test that message times are converted with the tempo set in the track
+    """
+    events = list(voice_events(pattern(60).track, offset=1.0))
+
+    assert [round(when, 6) for when, _ in events] == [1.0, 1.0, 1.01, 1.01, 1.02]
+    assert [msg.type for _, msg in events] == [
+        'program_change', 'note_on', 'note_off', 'note_on', 'note_off'
+    ]
+
+
+def test_sequencer_merges_voices():
+    """
+    Test that voices on several ports are played on one timeline
+    """
+    port_1, port_2 = FakePort(), AsyncFakePort()
+    sequencer = Sequencer()
+    sequencer.add(pattern(60, channel=0), port_1)
+    sequencer.add(pattern(70, channel=1), port_2)
+    sequencer.add(pattern(80, channel=2), port_1, offset=0.01)
+
+    stats = asyncio.run(sequencer.run())
+
+    assert [msg.note for msg in port_2.sent if msg.type == 'note_on'] == [70, 72]
+    notes_on = [msg.note for msg in port_1.sent if msg.type == 'note_on']
+    assert sorted(notes_on) == [60, 62, 80, 82]
+    assert notes_on.index(80) < notes_on.index(82)
+    assert stats.events == 15
+    assert not sequencer.voices
+
+
+def test_sequencer_add_and_remove_while_running():
+    """
+    Test that voices can be added and removed without stopping the clock
+    """
+    port = FakePort()
+    sequencer = Sequencer()
+    looping = sequencer.add(pattern(60), port, loop=True)
+
+    async def play():
+        task = asyncio.ensure_future(sequencer.run())
+        await asyncio.sleep(0.015)
+        sequencer.add(pattern(90, channel=1), port)
+        await asyncio.sleep(0.03)
+        sequencer.remove(looping)
+        return await task
+
+    stats = asyncio.run(play())
+
+    notes_on = [msg.note for msg in port.sent if msg.type == 'note_on']
+    assert 90 in notes_on and 92 in notes_on
+    assert notes_on.count(60) >= 2
+    assert stats.mean_overhead < 0.001
+
+    sounding = set()
+    for msg in port.sent:
+        if msg.type == 'note_on':
+            sounding.add((msg.channel, msg.note))
+        elif msg.type == 'note_off':
+            sounding.discard((msg.channel, msg.note))
+    assert not sounding
+
+
+def test_sequencer_stop_and_resume():
+    """
+    Test that stopping silences the sounding notes and running again resumes where
+    the sequencer stopped
+    """
+    class TimedPort(FakePort):
+        def send(self, msg):
+            self.sent.append((time.monotonic(), msg))
+
+    port = TimedPort()
+    sequencer = Sequencer()
+    sequencer.add(pattern(60), port, loop=True)
+
+    async def play():
+        task = asyncio.ensure_future(sequencer.run())
+        await asyncio.sleep(0.015)
+        sequencer.stop()
+        await task
+        stopped = len(port.sent)
+        await asyncio.sleep(0.05)
+        await sequencer.run(until=0.06)
+        return stopped
+
+    stopped = asyncio.run(play())
+
+    sounding = set()
+    for _, msg in port.sent[:stopped]:
+        if msg.type == 'note_on':
+            sounding.add(msg.note)
+        elif msg.type == 'note_off':
+            sounding.discard(msg.note)
+    assert not sounding
+
+    # The next event was due less than a quarter note after the stop
+    gap = port.sent[stopped][0] - port.sent[stopped - 1][0]
+    assert 0.05 <= gap < 0.05 + 0.025
+    assert any(msg.type == 'note_on' for _, msg in port.sent[stopped:])
+
+
+def test_sequencer_runs_once_at_a_time():
+    """
+    Test that a running sequencer can not be run a second time
+    """
+    sequencer = Sequencer()
+    sequencer.add(pattern(60), FakePort(), loop=True)
+
+    async def play():
+        task = asyncio.ensure_future(sequencer.run())
+        await asyncio.sleep(0.005)
+        try:
+            await sequencer.run()
+        finally:
+            sequencer.stop()
+            await task
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(play())
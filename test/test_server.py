@@ -0,0 +1,160 @@
+"""
+Tests for `randsik.server` module.
+"""
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import mido
+import pytest
+
+from randsik import generate
+from randsik.server import Client, Server, ServerError, ServerStats, load_test
+
+GENERATE_SPEC = {'generate': {'note': 'C4', 'mode': 'dorian', 'measures': 2}}
+SONG_SPEC = {'song': [
+    {'measures': 2, 'mode': 'ionian', 'tempo': 100, 'key': 'C3', 'octaves': 1,
+     'instruments': ['Bass.ACOUSTIC_BASS']},
+], 'seed': 4}
+
+
+def run_with_server(test, **kwargs):
+    """
+    Starts a server on a free port, runs `test(port, server)` and stops the server
+    """
+    async def main():
+        app = Server(**kwargs)
+        listener = await app.start(port=0)
+        try:
+            return await test(listener.sockets[0].getsockname()[1], app)
+        finally:
+            app.close()
+
+    return asyncio.run(main())
+
+
+def test_server_stats():
+    """
+    Test that every request is counted as an event with its size and latency
+    """
+    stats = ServerStats()
+    stats.record(0.002, 100, False)
+    stats.record(0.004, 50, True)
+
+    assert stats.requests == stats.events == 2
+    assert stats.bytes == 150
+    assert stats.reservoir_hits == 1
+    assert stats.mean_latency == pytest.approx(0.003)
+    assert stats.max_latency == 0.004
+    assert '2 requests' in str(stats)
+
+
+def test_generate_request():
+    """
+    Test that a seeded request returns the same file as generating it locally
+    """
+    async def test(port, app):
+        async with Client(port=port) as client:
+            return await client.request({**GENERATE_SPEC, 'seed': 9})
+
+    data = run_with_server(test, workers=2)
+
+    assert data == generate(**GENERATE_SPEC['generate'], seed=9).to_bytes()
+
+
+def test_song_request_over_unix_socket(tmp_path):
+    """
+    Test that songs can be requested over a Unix socket, which is removed on close
+    """
+    path = tmp_path / 'randsik.sock'
+
+    async def main():
+        app = Server(executor=ThreadPoolExecutor(2), workers=2)
+        await app.start(path=path)
+        try:
+            async with Client(path=path) as client:
+                return await client.request(SONG_SPEC), await client.request(SONG_SPEC)
+        finally:
+            app.close()
+
+    first, second = asyncio.run(main())
+    midi = mido.MidiFile(file=io.BytesIO(first))
+
+    assert first == second
+    assert len(midi.tracks) == 2
+    assert not path.exists()
+
+
+def test_errors_keep_connection_open():
+    """
+    Test that bad requests are reported and the connection can still be used
+    """
+    async def test(port, app):
+        async with Client(port=port) as client:
+            with pytest.raises(ServerError, match='either a "generate" or a "song"'):
+                await client.request({'seed': 1})
+            with pytest.raises(ServerError, match='TypeError'):
+                await client.request({'generate': {'colour': 'blue'}})
+            await client.request(GENERATE_SPEC)
+            return await client.metrics()
+
+    metrics = run_with_server(test, executor=ThreadPoolExecutor(1), workers=1)
+
+    assert metrics['errors'] == 2
+    assert metrics['requests'] == 1
+
+
+def test_reservoir_serves_frequent_requests():
+    """
+    Test that a request becomes hot and is then served from the reservoir
+    """
+    async def test(port, app):
+        async with Client(port=port) as client:
+            for _ in range(2):
+                await client.request(GENERATE_SPEC)
+            for _ in range(100):
+                if app.metrics()['reservoir'] == 4:
+                    break
+                await asyncio.sleep(0.01)
+            data, cached = await client._request(GENERATE_SPEC)
+            return data, cached, await client.metrics()
+
+    data, cached, metrics = run_with_server(
+        test, executor=ThreadPoolExecutor(2), workers=2, reservoir_size=4, hot_after=2
+    )
+
+    assert cached
+    assert mido.MidiFile(file=io.BytesIO(data)).tracks
+    assert metrics['reservoir_hits'] == 1
+    assert metrics['queue_depth'] >= 0
+
+
+def test_seeded_requests_skip_reservoir():
+    """
+    Test that seeded requests are always generated, since their result is fixed
+    """
+    async def test(port, app):
+        async with Client(port=port) as client:
+            for _ in range(5):
+                await client.request({**GENERATE_SPEC, 'seed': 1})
+        return app.metrics()
+
+    metrics = run_with_server(test, executor=ThreadPoolExecutor(1), workers=1, hot_after=1)
+
+    assert metrics['reservoir'] == 0
+    assert metrics['reservoir_hits'] == 0
+
+
+def test_load_test():
+    """
+    Test that the load test client counts every request over all connections
+    """
+    async def test(port, app):
+        return await load_test(GENERATE_SPEC, 20, concurrency=4, port=port)
+
+    result = run_with_server(test, executor=ThreadPoolExecutor(2), workers=2)
+
+    assert result.requests == 20
+    assert result.errors == 0
+    assert result.requests_per_second > 0
+    assert 'requests/s' in str(result)
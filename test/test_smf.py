@@ -0,0 +1,133 @@
+"""
+Tests for `randsik.smf` module.
+"""
+import io
+import random
+
+import pytest
+from mido import MidiFile
+
+from randsik import constants as con
+from randsik import Note, Pattern, QUARTER, SIXTEENTH, WHOLE, generate
+from randsik.smf import META_END_OF_TRACK, encode_varlen, merge_patterns
+from randsik.song_builder.song import SongSection, create_song, song_to_bytes
+
+
+def mido_bytes(midi_file: MidiFile) -> bytes:
+    buffer = io.BytesIO()
+    midi_file.save(file=buffer)
+
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('value,expected', [
+    (0, b'\x00'),
+    (0x7F, b'\x7f'),
+    (0x80, b'\x81\x00'),
+    (0x3FFF, b'\xff\x7f'),
+    (0x0FFFFFFF, b'\xff\xff\xff\x7f'),
+])
+def test_encode_varlen(value, expected):
+    """
+    Test encoding of variable length quantities
+    """
+    assert encode_varlen(value) == expected
+
+
+def test_pattern_to_bytes_matches_mido():
+    """
+    Test that the bytes of a pattern are the same as the ones written by mido
+    """
+    random.seed(1)
+    pattern = generate(measures=8, note_lengths=(WHOLE * 2, QUARTER, SIXTEENTH), channel=3)
+    pattern.notes.rest[2] = 200
+
+    midi_file = MidiFile()
+    midi_file.tracks.append(pattern.track)
+
+    assert pattern.to_bytes() == mido_bytes(midi_file)
+
+
+def test_long_delta_times_to_bytes_match_mido():
+    """
+    Test that delta times needing five bytes are written the same as mido writes them
+    """
+    long = 1 << 30
+    pattern = Pattern.from_arrays([60, 62], 100, [long, QUARTER], rest=[long, long])
+
+    for item in (pattern, pattern.repeat(3), Pattern([]).repeat(2).concat(pattern)):
+        midi_file = MidiFile()
+        midi_file.tracks.append(item.track)
+
+        assert item.to_bytes() == mido_bytes(midi_file)
+
+
+def test_empty_pattern_to_bytes_matches_mido():
+    """
+    Test that a pattern without notes is written the same as mido writes it
+    """
+    pattern = Pattern([])
+    midi_file = MidiFile()
+    midi_file.tracks.append(pattern.track)
+
+    assert pattern.to_bytes() == mido_bytes(midi_file)
+
+
+def test_song_to_bytes_matches_mido():
+    """
+    Test that a song written with `song_to_bytes` is the same as `create_song` saved by mido
+    """
+    sect_1 = SongSection(
+        measures=4, mode='dorian', tempo=92, key='D3', octaves=1,
+        instruments=(con.Bass.SYNTH_BASS_1, con.SynthPad.PAD_5_BOWED)
+    )
+    sect_2 = SongSection(
+        measures=8, mode='dorian', tempo=92, key='D3', octaves=2,
+        instruments=(con.Bass.SYNTH_BASS_1, con.Guitar.OVERDRIVEN_GUITAR)
+    )
+
+    random.seed(2)
+    expected = mido_bytes(create_song((sect_1, sect_2)))
+    random.seed(2)
+
+    assert song_to_bytes((sect_1, sect_2)) == expected
+
+
+def test_type_0_song_matches_mido_merge():
+    """
+    Test that a type 0 song is the same as the type 1 song merged by mido
+    """
+    from mido import merge_tracks
+
+    sections = (
+        SongSection(
+            measures=2, mode='dorian', tempo=92, key='D3', octaves=1,
+            instruments=(con.Bass.SYNTH_BASS_1, con.SynthPad.PAD_5_BOWED)
+        ),
+        SongSection(
+            measures=4, mode='ionian', tempo=120, key='D3', octaves=1,
+            instruments=(con.Guitar.OVERDRIVEN_GUITAR,)
+        ),
+    )
+    type_1 = create_song(sections, seed=4)
+    expected = MidiFile(type=0)
+    expected.tracks.append(merge_tracks(type_1.tracks))
+
+    assert song_to_bytes(sections, seed=4, midi_type=0) == mido_bytes(expected)
+    assert mido_bytes(create_song(sections, seed=4, midi_type=0)) == mido_bytes(expected)
+
+
+def test_merge_patterns_keeps_track_order():
+    """
+    Test that events are ordered by tick, ties in the order of the tracks, with one
+    end_of_track at the end of the longest track
+    """
+    first = Pattern([Note(60, 80, QUARTER)], channel=0)
+    second = Pattern([Note(64, 80, QUARTER), Note(67, 80, WHOLE)], channel=1)
+    events = list(merge_patterns([[first], [second]]))
+    ticks = [tick for tick, _ in events]
+
+    assert ticks == sorted(ticks)
+    assert [event[0] for tick, event in events if tick == 0][:2] == [0xC0, 0xFF]
+    assert events[-1] == (QUARTER + WHOLE, META_END_OF_TRACK)
+    assert sum(event == META_END_OF_TRACK for _, event in events) == 1
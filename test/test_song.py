@@ -0,0 +1,125 @@
+"""
+Tests for `randsik.song_builder.song` module.
+"""
+import io
+import pickle
+
+from mido import MidiFile, tempo2bpm
+
+from randsik import constants as con
+from randsik.song_builder.song import SongSection, create_song, song_to_bytes
+
+SECTIONS = (
+    SongSection(
+        measures=4, mode='dorian', tempo=92, key='D3', octaves=1,
+        instruments=(con.Bass.SYNTH_BASS_1, con.SynthPad.PAD_5_BOWED)
+    ),
+    SongSection(
+        measures=8, mode='dorian', tempo=92, key='D3', octaves=1,
+        instruments=(con.Bass.SYNTH_BASS_1, con.Guitar.OVERDRIVEN_GUITAR)
+    ),
+)
+
+
+def test_create_song_happy_path():
+    """
+    Test that a song has one track per instrument plus a drum track
+    """
+    song = create_song(SECTIONS)
+
+    assert len(song.tracks) == 4
+
+
+def test_tracks_end_once():
+    """
+    Test that the tracks of a song in memory only have an end_of_track at their end,
+    with the silence of the sections an instrument sits out carried to its next note
+    """
+    song = create_song(SECTIONS, seed=1)
+
+    for track in song.tracks:
+        assert [msg.type for msg in track].count('end_of_track') == 1
+        assert track[-1].type == 'end_of_track'
+        assert sum(msg.time for msg in track) >= 12 * con.WHOLE
+
+
+def test_song_section_pickles():
+    """
+    Test that song sections can be sent to worker processes
+    """
+    assert pickle.loads(pickle.dumps(SECTIONS[0])) == SECTIONS[0]
+
+
+def test_seeded_song_does_not_depend_on_workers():
+    """
+    Test that the same seed gives the same song whether or not it is generated in parallel
+    """
+    expected = song_to_bytes(SECTIONS, seed=42)
+
+    assert song_to_bytes(SECTIONS, seed=42, workers=2) == expected
+    assert song_to_bytes(SECTIONS, seed=42, workers=1) == expected
+    assert song_to_bytes(SECTIONS, seed=43) != expected
+
+
+def test_parallel_create_song():
+    """
+    Test that a song generated in parallel has its tracks in the same order
+    """
+    song = create_song(SECTIONS, seed=7, workers=2)
+    serial = create_song(SECTIONS, seed=7)
+
+    assert [list(track) for track in song.tracks] == [list(track) for track in serial.tracks]
+
+
+def test_inactive_instruments_are_silent():
+    """
+    Test that an instrument sitting out a section adds no notes for it, while all
+    tracks still line up in length
+    """
+    midi_file = MidiFile(file=io.BytesIO(song_to_bytes(SECTIONS, seed=1)))
+    pad, guitar = (
+        next(track for track in midi_file.tracks[:-1] if msg_program(track) == inst.value - 1)
+        for inst in (con.SynthPad.PAD_5_BOWED, con.Guitar.OVERDRIVEN_GUITAR)
+    )
+    song_ticks = 12 * con.WHOLE
+
+    for track in midi_file.tracks[:-1]:
+        assert sum(msg.time for msg in track) == song_ticks
+
+    # The guitar only plays in the second section, so its first event is delayed
+    first = next(msg for msg in guitar if not msg.is_meta)
+    assert first.time == 4 * con.WHOLE
+    assert all(msg.velocity > 1 for msg in guitar if msg.type == 'note_on')
+    assert pad[-1].type == 'end_of_track' and pad[-1].time == 8 * con.WHOLE
+
+
+def msg_program(track):
+    return next(msg.program for msg in track if msg.type == 'program_change')
+
+
+def test_drums_only_section_keeps_its_tempo():
+    """
+    Test that every track sets the tempo of a section no instrument plays in
+    """
+    bass = (con.Bass.SYNTH_BASS_1,)
+    sections = [
+        SongSection(4, 'dorian', 100, 'D3', 1, bass),
+        SongSection(4, 'dorian', 140, 'D3', 1, bass),
+        SongSection(2, 'dorian', 90, 'D3', 1, ()),
+        SongSection(4, 'dorian', 120, 'D3', 1, bass),
+    ]
+    expected = [(0, 100), (4 * con.WHOLE, 140), (8 * con.WHOLE, 90), (10 * con.WHOLE, 120)]
+
+    for midi_type in (0, 1):
+        for midi_file in (
+            MidiFile(file=io.BytesIO(song_to_bytes(sections, seed=1, midi_type=midi_type))),
+            create_song(sections, seed=1, midi_type=midi_type),
+        ):
+            for track in midi_file.tracks[:1]:
+                tempos = []
+                tick = 0
+                for msg in track:
+                    tick += msg.time
+                    if msg.type == 'set_tempo':
+                        tempos.append((tick, round(tempo2bpm(msg.tempo))))
+                assert sorted(set(tempos)) == expected
@@ -0,0 +1,106 @@
+"""
+Tests for `randsik.song_builder.stream` module.
+"""
+import io
+
+import pytest
+from mido import MidiFile
+
+from randsik import constants as con
+from randsik.song_builder.song import SongSection
+from randsik.song_builder.stream import SongWriter, write_song_stream
+
+SECTION_1 = SongSection(
+    measures=4, mode='dorian', tempo=92, key='D3', octaves=1,
+    instruments=(con.Bass.SYNTH_BASS_1, con.SynthPad.PAD_5_BOWED)
+)
+SECTION_2 = SongSection(
+    measures=2, mode='ionian', tempo=120, key='C3', octaves=1,
+    instruments=(con.Bass.SYNTH_BASS_1, con.Guitar.OVERDRIVEN_GUITAR)
+)
+
+
+def test_write_song_stream():
+    """
+    Test that a streamed song is a valid type 0 file covering every section
+    """
+    buffer = io.BytesIO()
+    sections = (section for section in (SECTION_1, SECTION_2, SECTION_1))
+
+    ticks = write_song_stream(sections, buffer, seed=1)
+
+    buffer.seek(0)
+    midi_file = MidiFile(file=buffer)
+    track = midi_file.tracks[0]
+
+    assert midi_file.type == 0
+    assert ticks == 10 * con.WHOLE
+    assert sum(msg.time for msg in track) == ticks
+    assert [msg.tempo for msg in track if msg.type == 'set_tempo'] == [652174, 500000, 652174]
+    assert {msg.channel for msg in track if msg.type == 'program_change'} == {0, 1, 2}
+
+
+def test_drum_notes_are_released_at_the_end():
+    """
+    Test that drum notes cut off by the end of the song get a note_off before the end
+    """
+    for seed in range(10):
+        buffer = io.BytesIO()
+        write_song_stream([SECTION_2], buffer, seed=seed)
+        buffer.seek(0)
+        held = {}
+        tick = 0
+        for msg in MidiFile(file=buffer).tracks[0]:
+            tick += msg.time
+            if msg.type == 'note_on' and msg.velocity:
+                held[msg.note] = held.get(msg.note, 0) + 1
+            elif msg.type in ('note_on', 'note_off'):
+                held[msg.note] -= 1
+
+        assert not any(held.values())
+        assert tick == SECTION_2.measures * con.WHOLE
+
+
+def test_write_song_stream_is_reproducible():
+    """
+    Test that the same seed gives the same file
+    """
+    first, second = io.BytesIO(), io.BytesIO()
+    write_song_stream([SECTION_1, SECTION_2], first, seed=3)
+    write_song_stream([SECTION_1, SECTION_2], second, seed=3)
+
+    assert first.getvalue() == second.getvalue()
+
+
+def test_song_writer_without_drums():
+    """
+    Test that instruments which sit out a section produce no events in it
+    """
+    buffer = io.BytesIO()
+    with SongWriter(buffer, seed=1, drums=False) as writer:
+        writer.write_section(SECTION_2)
+        writer.write_section(SECTION_1)
+
+    buffer.seek(0)
+    track = MidiFile(file=buffer).tracks[0]
+    tick = 0
+    guitar_ticks = []
+    for msg in track:
+        tick += msg.time
+        if msg.type == 'note_on' and msg.channel == 1:
+            guitar_ticks.append(tick)
+
+    assert guitar_ticks
+    assert max(guitar_ticks) < 2 * con.WHOLE
+
+
+def test_song_writer_needs_seekable_file():
+    """
+    Test that an error is raised for outputs that can not be patched at the end
+    """
+    class Unseekable(io.BytesIO):
+        def seekable(self):
+            return False
+
+    with pytest.raises(ValueError):
+        SongWriter(Unseekable())
@@ -0,0 +1,12 @@
+"""
+Tests for `randsik.utils` module.
+"""
+from randsik.utils import chunked
+
+
+def test_chunked():
+    """
+    Test that items are split into consecutive slices with a shorter last one
+    """
+    assert list(chunked(list(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked((), 3)) == []